@@ -0,0 +1,220 @@
+import argparse
+import time
+import numpy as np
+from jazz_env import JazzImprovisationEnv
+from numpy_policy import ACTION_MASK, MASKED_Q, sample_allowed, uses_action_masks
+
+# === DECODER CONFIGURATION ===
+BEAM_WIDTH = 4  # Continuations kept after every simulated step
+BEAM_DEPTH = 4  # Steps simulated ahead
+BRANCHING = 4  # Best-Q actions tried from every kept continuation
+GAMMA = 0.99  # Discount the models are trained with (DQN's default, see train.py)
+BUDGET_FRACTION = 0.5  # Share of the shortest (swung) 16th note one decision may take
+EPISODES = 32
+SEED = 1_000_000
+
+
+def q_values(model, obs):
+    """
+    Q-values of shape (batch, n_actions) for a batch of Dict observations, from a
+    NumpyDQNPolicy or a stable-baselines3 DQN (MASKED_Q for actions a masked model can't take)
+    """
+    if hasattr(model, "q_values"):
+        return model.q_values(obs)
+    import torch
+    obs_tensor, _ = model.policy.obs_to_tensor(obs)
+    with torch.no_grad():
+        return model.q_net(obs_tensor).cpu().numpy()
+
+
+def _stack(observations):
+    return {key: np.stack([np.asarray(obs[key]) for obs in observations]) for key in observations[0]}
+
+
+def _copy_obs(obs):
+    # Env observations live in reused buffers, so keep a private copy
+    return {key: value.copy() if hasattr(value, "copy") else value for key, value in obs.items()}
+
+
+class BeamSearchDecoder:
+    """
+    Chooses every action by simulating short continuations on a scratch clone of
+    the env, so the solo can steer around penalties a few steps away (phrase
+    loops, repeats, fatigue) that the greedy action walks into.
+
+    A continuation a_1..a_d from the current step scores
+
+        r_1 + g r_2 + ... + g^(d-1) r_d + g^d max Q(s_d)
+
+    with the env's own rewards along the way and the model's Q-values past the
+    horizon. At every depth each kept continuation tries its `branching` best
+    actions by Q-value, and the `width` best children are kept.
+
+    The search is anytime: when the time budget runs out it returns the first
+    action of the best continuation of the last completed depth (depth 0 being
+    the greedy action). predict() is a drop-in for model.predict on the env's
+    current observation.
+    """
+
+    def __init__(self, model, env, width=BEAM_WIDTH, depth=BEAM_DEPTH, branching=BRANCHING, budget=None,
+                 gamma=GAMMA, seed=None):
+        self.model = model
+        self.env = env
+        self.width = width
+        self.depth = depth
+        self.branching = branching
+        self.budget = budget  # Seconds per decision, None = unlimited
+        self.gamma = gamma
+        self.exploration_rate = float(getattr(model, "exploration_rate", 0.0))
+        self.n_actions = env.action_space.n
+        self.rng = np.random.default_rng(seed)
+        self._scratch = None
+
+        # Search statistics
+        self.decisions = 0
+        self.timeouts = 0  # Decisions cut short by the budget
+        self.depth_reached = 0  # Summed over decisions
+        self.seconds = 0.0
+
+    def use_model(self, model):
+        """
+        Searches with `model` from the next decision on (hot reload)
+        """
+        self.model = model
+        self.exploration_rate = float(getattr(model, "exploration_rate", 0.0))
+
+    def predict(self, obs, state=None, episode_start=None, deterministic=False):
+        """
+        Best action from the env's current step, or epsilon-greedy with the model's
+        exploration rate like model.predict
+        """
+        if not deterministic and self.rng.random() < self.exploration_rate:
+            if ACTION_MASK in obs:
+                return int(sample_allowed(obs[ACTION_MASK], self.rng)[0]), state
+            return int(self.rng.integers(0, self.n_actions)), state
+        return self.search(obs), state
+
+    def search(self, obs):
+        start = time.perf_counter()
+        deadline = None if self.budget is None else start + self.budget
+        root_q = q_values(self.model, _stack([obs]))[0]
+        best, completed = int(root_q.argmax()), 0
+
+        if self._scratch is None:
+            self._scratch = self.env.clone()
+        scratch = self._scratch
+        gamma = self.gamma
+        # Beam entries: (first action, discounted reward so far, env state, Q-values; None once the episode ended)
+        beam = [(None, 0.0, self.env.get_state(), root_q)]
+        discount = 1.0
+        timed_out = False
+        for depth in range(self.depth):
+            children, child_obs = [], []
+            for first, ret, state, q in beam:
+                if q is None:
+                    children.append((first, ret, state, None))
+                    continue
+                for action in np.argsort(q)[::-1][:self.branching].tolist():
+                    if q[action] <= MASKED_Q:
+                        break
+                    if deadline is not None and time.perf_counter() > deadline:
+                        timed_out = True
+                        break
+                    scratch.set_state(state)
+                    obs, reward, terminated, truncated, _ = scratch.step(action)
+                    # Jam mode steps the env on past the end of its progression
+                    done = (terminated or truncated) and not scratch.manual_mode
+                    children.append((action if first is None else first, ret + discount * reward,
+                                     scratch.get_state(), None if done else len(child_obs)))
+                    if not done:
+                        child_obs.append(_copy_obs(obs))
+                if timed_out:
+                    break
+            if timed_out:
+                break
+
+            # Value past the horizon from the model, one batched call per depth
+            child_q = q_values(self.model, _stack(child_obs)) if child_obs else None
+            discount *= gamma
+            scored = []
+            for first, ret, state, row in children:
+                q = None if row is None else child_q[row]
+                value = 0.0 if q is None else discount * float(q.max())
+                scored.append((ret + value, (first, ret, state, q)))
+            scored.sort(key=lambda item: item[0], reverse=True)
+            beam = [entry for _, entry in scored[:self.width]]
+            best, completed = int(beam[0][0]), depth + 1
+
+        self.decisions += 1
+        self.timeouts += timed_out
+        self.depth_reached += completed
+        self.seconds += time.perf_counter() - start
+        return best
+
+    def stats(self):
+        decisions = max(self.decisions, 1)
+        return {
+            "decisions": self.decisions,
+            "timeouts": self.timeouts,
+            "mean_depth": self.depth_reached / decisions,
+            "mean_ms": self.seconds / decisions * 1000
+        }
+
+
+def decode_episodes(model, episodes=EPISODES, seed=SEED, width=BEAM_WIDTH, depth=BEAM_DEPTH,
+                    branching=BRANCHING, budget=None):
+    """
+    Plays seeded episodes with the decoder (depth 0 = greedy) and returns evaluate.py's
+    metrics plus the search statistics
+    """
+    from evaluate import episode_counts, summarize
+    env = JazzImprovisationEnv(mask_actions=uses_action_masks(model))
+    decoder = BeamSearchDecoder(model, env, width, depth, branching, budget)
+    actions, chords, rewards = [], [], []
+    for i in range(episodes):
+        obs, _ = env.reset(seed=seed + i)
+        episode_actions, episode_chords, total, done = [], [], 0.0, False
+        while not done:
+            action, _ = decoder.predict(obs, deterministic=True)
+            episode_chords.append(env.current_chord)
+            episode_actions.append(action)
+            obs, reward, terminated, truncated, _ = env.step(action)
+            total += reward
+            done = terminated or truncated
+        actions.append(episode_actions)
+        chords.append(episode_chords)
+        rewards.append(total)
+
+    lengths = np.array([len(a) for a in actions])
+    action_matrix = np.full((episodes, lengths.max()), -1, dtype=np.int64)
+    chord_matrix = np.zeros((episodes, lengths.max()), dtype=np.int64)
+    for i, (a, c) in enumerate(zip(actions, chords)):
+        action_matrix[i, :len(a)] = a
+        chord_matrix[i, :len(c)] = c
+    metrics = summarize(episode_counts(action_matrix, chord_matrix, lengths), rewards)
+    metrics["search"] = decoder.stats()
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare greedy and beam-search decoding on seeded episodes")
+    parser.add_argument("--model", default="jazz_model", help="Model path (.npz or .zip, see evaluate.py)")
+    parser.add_argument("--episodes", type=int, default=EPISODES)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--width", type=int, default=BEAM_WIDTH)
+    parser.add_argument("--depth", type=int, default=BEAM_DEPTH)
+    parser.add_argument("--branching", type=int, default=BRANCHING)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Time limit per decision (default: none)")
+    args = parser.parse_args()
+
+    from evaluate import load_policy
+    model = load_policy(args.model)
+    budget = None if args.budget_ms is None else args.budget_ms / 1000
+    print(f"{'decoder':>16s} {'reward':>9s} {'loops':>7s} {'repeats':>8s} {'hits':>6s} {'ms/step':>8s} "
+          f"{'depth':>6s} {'timeouts':>9s}")
+    for name, depth in (("greedy", 0), (f"beam {args.width}x{args.depth}", args.depth)):
+        metrics = decode_episodes(model, args.episodes, args.seed, args.width, depth, args.branching, budget)
+        search = metrics["search"]
+        print(f"{name:>16s} {metrics['reward']['mean']:9.1f} {metrics['phrase_loop_rate']:7.3f} "
+              f"{metrics['exact_repeat_rate']:8.3f} {metrics['chord_tone_hit_rate']:6.3f} {search['mean_ms']:8.2f} "
+              f"{search['mean_depth']:6.2f} {search['timeouts']:9d}")
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import numpy as np
+from jazz_env import JazzImprovisationEnv
+from numpy_policy import NumpyDQNPolicy, export_policy
+
+# === BENCHMARK CONFIGURATION ===
+SEED = 0
+REPEATS = 5  # Best of N runs is reported to filter out scheduler noise
+BATCH_SIZE = 64  # Batch size for the batched predict benchmark
+MODEL_PATH = "jazz_model"
+TOLERANCE = 0.10  # Slowdown vs baseline that counts as a regression
+
+
+def _best_rate(fn, ops, repeats):
+    """
+    Runs fn() `repeats` times and returns the best ops/sec
+    """
+    best = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = max(best, ops / elapsed)
+    return best
+
+
+def _random_actions(n, seed=SEED):
+    return np.random.default_rng(seed).integers(0, 38, n).tolist()
+
+
+def bench_env_reset(n=20000, repeats=REPEATS):
+    env = JazzImprovisationEnv(seed=SEED)
+
+    def run():
+        for _ in range(n):
+            env.reset()
+
+    return _best_rate(run, n, repeats)
+
+
+def bench_env_step(n=100000, repeats=REPEATS):
+    actions = _random_actions(n)
+    env = JazzImprovisationEnv(seed=SEED)
+
+    def run():
+        env.reset()
+        for action in actions:
+            _, _, done, _, _ = env.step(action)
+            if done:
+                env.reset()
+
+    return _best_rate(run, n, repeats)
+
+
+def bench_calculate_reward(n=100000, repeats=REPEATS):
+    env = JazzImprovisationEnv(seed=SEED)
+    env.reset()
+    # Put the env in a mid-episode state with some history
+    for action in _random_actions(40, seed=SEED + 1):
+        env.step(action)
+    actions = _random_actions(n)
+
+    def run():
+        # _calculate_reward does not change env state, so it can be called repeatedly
+        for action in actions:
+            env._calculate_reward(action)
+
+    return _best_rate(run, n, repeats)
+
+
+def load_model(model_path=MODEL_PATH):
+    """
+    Loads the trained model, or builds an untrained one with the same network so
+    the suite also runs offline on a fresh checkout
+    """
+    from stable_baselines3 import DQN
+    if os.path.exists(f"{model_path}.zip"):
+        return DQN.load(model_path)
+    return DQN("MultiInputPolicy", JazzImprovisationEnv(), seed=SEED)
+
+
+def bench_predict(model, batch_size, n=2000, repeats=REPEATS):
+    """
+    Returns DQN.predict calls/sec for a batch of `batch_size` observations
+    """
+    from jazz_vec_env import BatchJazzEnv
+    if batch_size == 1:
+        env = JazzImprovisationEnv(seed=SEED)
+        obs, _ = env.reset()
+    else:
+        obs, _ = BatchJazzEnv(batch_size, seed=SEED).reset()
+
+    def run():
+        for _ in range(n):
+            model.predict(obs, deterministic=True)
+
+    return _best_rate(run, n, repeats)
+
+
+def bench_session_loop(model, n=4096, repeats=REPEATS):
+    """
+    Steps/sec of the play_jazz main loop without a MIDI port, so nothing sleeps or prints
+    """
+    from play_jazz import JazzSession
+    rates = []
+    for style in ('SIMPLE', 'ARPEGGIO'):
+        random.seed(SEED)
+
+        def run():
+            session = JazzSession(JazzImprovisationEnv(seed=SEED), model, out_port=None, style=style)
+            session.run(n)
+            session.stop()
+
+        rates.append(_best_rate(run, n, repeats))
+    return min(rates)
+
+
+def run_suite(model_path=MODEL_PATH, batch_size=BATCH_SIZE, repeats=REPEATS):
+    results = {}
+
+    def record(name, ops_per_sec):
+        results[name] = {"ops_per_sec": ops_per_sec, "us_per_op": 1e6 / ops_per_sec}
+        print(f"{name:24s} {ops_per_sec:14,.0f} ops/sec {1e6 / ops_per_sec:10.2f} us/op")
+
+    record("env_reset", bench_env_reset(repeats=repeats))
+    record("env_step", bench_env_step(repeats=repeats))
+    record("calculate_reward", bench_calculate_reward(repeats=repeats))
+
+    model = load_model(model_path)
+    record("predict_batch_1", bench_predict(model, 1, repeats=repeats))
+    record(f"predict_batch_{batch_size}", bench_predict(model, batch_size, repeats=repeats))
+
+    # Same network through the NumPy-only inference engine used at play time
+    with tempfile.TemporaryDirectory() as tmp:
+        export_policy(model, os.path.join(tmp, "policy.npz"))
+        numpy_model = NumpyDQNPolicy.load(os.path.join(tmp, "policy.npz"))
+    record("numpy_predict_batch_1", bench_predict(numpy_model, 1, repeats=repeats))
+    record(f"numpy_predict_batch_{batch_size}", bench_predict(numpy_model, batch_size, repeats=repeats))
+    record("session_loop", bench_session_loop(model, repeats=repeats))
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Prints the speed ratio of every benchmark against the baseline and
+    returns the names of those that got slower than the tolerance
+    """
+    print("\n--- COMPARISON WITH BASELINE ---")
+    regressions = []
+    for name, metrics in results.items():
+        if name not in baseline:
+            print(f"{name:24s} (not in baseline)")
+            continue
+        ratio = metrics["ops_per_sec"] / baseline[name]["ops_per_sec"]
+        flag = ""
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+            flag = "  ❌ REGRESSION"
+        print(f"{name:24s} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the JazzMate hot paths")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previous JSON results file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Relative slowdown that counts as a regression")
+    parser.add_argument("--model", default=MODEL_PATH, help="Model to benchmark predict with")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = run_suite(args.model, args.batch_size, args.repeats)
+
+    if args.output:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "results": results
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import time
+from collections import deque, namedtuple
+import numpy as np
+
+# === QUEUE CONFIGURATION ===
+QUEUE_SIZE = 64  # Only the latest chord matters, so older events past this are simply dropped
+
+# A chord change (ID or name) requested from the MIDI input, stamped with the time it arrived
+ChordEvent = namedtuple("ChordEvent", ["chord", "time"])
+
+
+class ChordQueue:
+    """
+    Bounded queue of timestamped chord changes. The MIDI input thread puts
+    events, the playback loop drains them at step boundaries, so the env is
+    only ever touched by one thread. deque append/popleft are atomic, so
+    neither side takes a lock.
+    """
+
+    def __init__(self, maxlen=QUEUE_SIZE, clock=time.perf_counter):
+        self.clock = clock
+        self._events = deque(maxlen=maxlen)
+        self.received = 0  # Written by the putting thread only
+
+    def put(self, chord, timestamp=None):
+        self._events.append(ChordEvent(chord, self.clock() if timestamp is None else timestamp))
+        self.received += 1
+
+    def drain(self, resolve=None):
+        """
+        Empties the queue and returns the latest event, or None. With `resolve`, returns the
+        latest event whose chord it maps to something other than None, carrying the mapped
+        chord, so an invalid change at the end of a burst doesn't discard the valid ones before it.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self._events.popleft())
+            except IndexError:
+                break
+        for event in reversed(events):
+            if resolve is None:
+                return event
+            chord = resolve(event.chord)
+            if chord is not None:
+                return event._replace(chord=chord)
+        return None
+
+
+def chord_report(events_received, latencies):
+    """
+    Jam mode input statistics: events received, chord changes heard and their
+    input-to-sound latency (ms)
+    """
+    report = {"chord_events": events_received, "chord_changes": len(latencies)}
+    if latencies:
+        latency_ms = np.array(latencies) * 1000
+        report["chord_latency_p50_ms"] = float(np.percentile(latency_ms, 50))
+        report["chord_latency_p99_ms"] = float(np.percentile(latency_ms, 99))
+        report["chord_latency_max_ms"] = float(latency_ms.max())
+    return report
+
+
+def print_chord_report(report):
+    line = f"\n🎹 Chords: {report['chord_changes']} changes heard from {report['chord_events']} input events"
+    if report["chord_changes"]:
+        line += (f", input-to-sound p50 {report['chord_latency_p50_ms']:.1f} ms / "
+                 f"p99 {report['chord_latency_p99_ms']:.1f} ms / max {report['chord_latency_max_ms']:.1f} ms")
+    print(line)
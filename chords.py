@@ -0,0 +1,113 @@
+import json
+import os
+import numpy as np
+
+# === CHORD DATA ===
+# Chord qualities, voicings and the default vocabulary live in chords.json;
+# add a quality there and all 12 transpositions of it become available.
+CHORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chords.json")
+
+# Sharp spellings accepted for the flat roots in the data file
+ENHARMONICS = {"C#": "Db", "D#": "Eb", "F#": "Gb", "G#": "Ab", "A#": "Bb"}
+
+
+class ChordRegistry:
+    """
+    Interned chord IDs for every quality x root in the data file. Chord ID
+    `quality * 12 + root` indexes every table:
+
+    - names[id]: canonical name ("BbMaj7")
+    - masks[id]: 12-bit pitch-class mask (bit 0 = C)
+    - tones[id]: the same as a 12-element int8 vector (the "chord_tones" observation)
+    - voicings[id]: MIDI notes of the piano backing voicing
+
+    Names, aliases and sharp spellings are only resolved at the edges (input,
+    config); everything per-step works on IDs.
+    """
+
+    def __init__(self, roots, qualities, voicing_low=27, voicings=None, aliases=None, vocabulary=None,
+                 jam_roots=None):
+        if len(roots) != 12:
+            raise ValueError(f"Expected 12 roots, got {len(roots)}")
+        self.roots = list(roots)
+        self.qualities = [q["name"] for q in qualities]
+        self.names = []
+        masks, voicing_list = [], []
+        for quality in qualities:
+            for root in range(12):
+                self.names.append(f"{roots[root]}{quality['name']}")
+                masks.append(sum(1 << ((root + i) % 12) for i in set(quality["intervals"])))
+                # The root sits in the 12 notes from voicing_low up, the rest stack on it
+                low = voicing_low + (root - voicing_low) % 12
+                voicing_list.append([low + i for i in quality.get("voicing", quality["intervals"])])
+
+        self.index = {name: i for i, name in enumerate(self.names)}
+        for sharp, flat in ENHARMONICS.items():
+            for quality in self.qualities:
+                if f"{flat}{quality}" in self.index:
+                    self.index.setdefault(f"{sharp}{quality}", self.index[f"{flat}{quality}"])
+        for alias, name in (aliases or {}).items():
+            self.index[alias] = self.id(name)
+
+        for name, notes in (voicings or {}).items():
+            voicing_list[self.id(name)] = list(notes)
+        self.voicings = voicing_list
+
+        self.masks = np.array(masks, dtype=np.uint16)
+        self.tones = ((self.masks[:, None] >> np.arange(12)) & 1).astype(np.int8)
+        self.masks.setflags(write=False)
+        self.tones.setflags(write=False)
+
+        self.vocabulary = self.ids(vocabulary) if vocabulary else list(range(len(self.names)))
+        self.jam_roots = self.ids(jam_roots) if jam_roots else [self.id(f"{r}{self.qualities[0]}") for r in roots]
+
+    @classmethod
+    def load(cls, path=CHORDS_FILE):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["roots"], data["qualities"], data.get("voicing_low", 27), data.get("voicings"),
+                   data.get("aliases"), data.get("vocabulary"), data.get("jam_roots"))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, chord):
+        return self.get(chord) is not None
+
+    def get(self, chord, default=None):
+        """
+        ID of a chord given by ID, name, alias or sharp spelling; `default` if unknown
+        """
+        if isinstance(chord, (int, np.integer)):
+            return int(chord) if 0 <= chord < len(self.names) else default
+        return self.index.get(chord, default)
+
+    def id(self, chord):
+        chord_id = self.get(chord)
+        if chord_id is None:
+            raise KeyError(f"Unknown chord: {chord}")
+        return chord_id
+
+    def ids(self, chords):
+        """
+        IDs for a list of chords; "all" stands for every registered chord
+        """
+        if list(chords) == ["all"]:
+            return list(range(len(self.names)))
+        unknown = [chord for chord in chords if chord not in self]
+        if unknown:
+            raise ValueError(f"Unknown chords: {unknown}")
+        return [self.get(chord) for chord in chords]
+
+    def root(self, chord_id):
+        return chord_id % 12
+
+    def quality(self, chord_id):
+        return self.qualities[chord_id // 12]
+
+    def transpose(self, chord_id, semitones):
+        return chord_id - chord_id % 12 + (chord_id + semitones) % 12
+
+
+# Shared by the env, the vectorised env and the player
+REGISTRY = ChordRegistry.load()
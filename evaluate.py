@@ -0,0 +1,335 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from multiprocessing import Pool
+import numpy as np
+from jazz_env import IN_CHORD, PHRASE_LOOP_PENALTIES, JazzImprovisationEnv
+from jazz_vec_env import BatchJazzEnv
+from numpy_policy import ACTION_MASK, NumpyDQNPolicy, export_policy, sample_allowed, uses_action_masks
+from progressions import Corpus
+
+# === EVALUATION CONFIGURATION ===
+EPISODES = 1024
+BATCH_SIZE = 256  # Episodes stepped in lockstep, one batched predict per step
+SEED = 1_000_000  # Held out: training runs use small seeds
+RESULTS_PATH = "evaluation.json"
+LOOP_LENGTHS = sorted(PHRASE_LOOP_PENALTIES)
+FATIGUE_NOTES = 8  # Notes in a row after which the reward starts charging fatigue
+# Interval bands of the reward's melodic flow score (semitones)
+INTERVAL_BANDS = {"unison": (0, 0), "step": (1, 2), "skip": (3, 5), "leap": (6, 9), "large_leap": (10, 35)}
+
+
+def load_policy(path):
+    """
+    A model to evaluate: .npz (NumPy policy) or .zip (stable-baselines3); without an
+    extension the .npz is preferred, like play_jazz.load_model
+    """
+    if path.endswith(".npz"):
+        return NumpyDQNPolicy.load(path)
+    if not path.endswith(".zip") and os.path.exists(f"{path}.npz"):
+        return NumpyDQNPolicy.load(f"{path}.npz")
+    from gymnasium import spaces
+    from stable_baselines3 import DQN
+    model = DQN.load(path, device="cpu")
+    if not isinstance(model.observation_space, spaces.Dict):
+        # Packed-observation models are run through their NumPy export, which reads Dict observations
+        with tempfile.TemporaryDirectory() as tmp:
+            export_policy(model, os.path.join(tmp, "policy.npz"))
+            return NumpyDQNPolicy.load(os.path.join(tmp, "policy.npz"))
+    return model
+
+
+def rollout(model, start, count, seed=SEED, chords=None, corpus=None, epsilon=0.0):
+    """
+    Plays episodes start .. start+count-1 in lockstep. Episode i runs on an env reset
+    with seed + i (epsilon draws come from seed + start), so results only depend on
+    the seed and the batch boundaries, not on how batches are spread over processes.
+    Models trained with action masks get masked observations (and explore among allowed actions).
+
+    Returns (actions, chords, lengths, rewards): actions and chords are (count, steps)
+    arrays padded with -1, rewards the total per episode.
+    """
+    mask_actions = uses_action_masks(model)
+    if corpus is None and epsilon == 0:
+        return _rollout_batched(model, start, count, seed, chords, mask_actions)
+
+    progressions = Corpus(corpus) if isinstance(corpus, str) else corpus
+    envs, obs = [], []
+    for i in range(start, start + count):
+        env = JazzImprovisationEnv(chords=chords, progressions=progressions, mask_actions=mask_actions)
+        obs.append(env.reset(seed=seed + i)[0])
+        envs.append(env)
+    rng = np.random.default_rng(seed + start)
+
+    actions, played_chords = [[] for _ in envs], [[] for _ in envs]
+    totals = np.zeros(count)
+    active = list(range(count))
+    while active:
+        batch = {key: np.stack([np.asarray(obs[i][key]) for i in active]) for key in obs[active[0]]}
+        batch_actions, _ = model.predict(batch, deterministic=True)
+        if epsilon > 0:
+            explore = rng.random(len(active)) < epsilon
+            random_actions = (sample_allowed(batch[ACTION_MASK], rng) if mask_actions
+                              else rng.integers(0, 38, len(active)))
+            batch_actions = np.where(explore, random_actions, batch_actions)
+
+        still_active = []
+        for i, action in zip(active, batch_actions.tolist()):
+            env = envs[i]
+            played_chords[i].append(env.current_chord)
+            actions[i].append(action)
+            obs[i], reward, terminated, truncated, _ = env.step(action)
+            totals[i] += reward
+            if not (terminated or truncated):
+                still_active.append(i)
+        active = still_active
+
+    lengths = np.array([len(a) for a in actions])
+    action_matrix = np.full((count, lengths.max()), -1, dtype=np.int64)
+    chord_matrix = np.zeros((count, lengths.max()), dtype=np.int64)
+    for i, (a, c) in enumerate(zip(actions, played_chords)):
+        action_matrix[i, :len(a)] = a
+        chord_matrix[i, :len(c)] = c
+    return action_matrix, chord_matrix, lengths, totals
+
+
+def _rollout_batched(model, start, count, seed, chords, mask_actions=False):
+    """
+    rollout() on BatchJazzEnv, which matches the lockstep scalar envs exactly for
+    the default random progressions
+    """
+    batch = BatchJazzEnv(count, chords=chords, mask_actions=mask_actions)
+    obs, _ = batch.reset(seed=seed + start)
+
+    steps = batch.steps_per_episode
+    actions = np.empty((count, steps), dtype=np.int64)
+    played_chords = np.empty((count, steps), dtype=np.int64)
+    totals = np.zeros(count)
+    for t in range(steps):
+        actions[:, t], _ = model.predict(obs, deterministic=True)
+        played_chords[:, t] = batch.current_chord
+        obs, rewards, _, _, _ = batch.step(actions[:, t])
+        totals += rewards
+    return actions, played_chords, np.full(count, steps), totals
+
+
+def episode_counts(actions, chords, lengths):
+    """
+    Counts behind the musical metrics, in the reward's own categories. `actions` is
+    padded with -1 past each episode's length.
+    """
+    steps = actions.shape[1]
+    t = np.arange(steps)
+    valid = t < lengths[:, None]
+    notes = (actions >= 0) & (actions < 36)
+    rows = np.arange(len(actions))[:, None]
+
+    # Chord tones: the pitch class is in the chord sounding when the note is played
+    hits = notes & IN_CHORD[chords, actions % 12]
+
+    # Exact repeats: a note equal to the last note played, even across rests (like exact_note_repeats)
+    last_note_at = np.maximum.accumulate(np.where(notes, t, -1), axis=1)
+    prev_note_at = np.concatenate([np.full((len(actions), 1), -1), last_note_at[:, :-1]], axis=1)
+    prev_note = actions[rows, np.maximum(prev_note_at, 0)]
+    has_prev = notes & (prev_note_at >= 0)
+    repeats = has_prev & (actions == prev_note)
+    # Two or more in a row without a break: the -10 penalty
+    double_repeats = repeats & np.concatenate([np.zeros((len(actions), 1), bool), repeats[:, :-1]], axis=1)
+
+    # Melodic intervals between successive notes, rests and holds skipped
+    intervals = np.bincount(np.abs(actions - prev_note)[has_prev], minlength=36)
+
+    # Fatigue: notes played after more than FATIGUE_NOTES notes in a row (consecutive_notes before the step)
+    note_count = np.cumsum(notes, axis=1)
+    run = note_count - np.maximum.accumulate(np.where(notes, 0, note_count), axis=1)
+    fatigue = notes & (run - 1 > FATIGUE_NOTES)
+
+    # Phrase loops: the last w actions repeat the w before them. Like the reward, a step
+    # checks the history before its own action is appended, i.e. up to the previous step.
+    # The history starts as rests, like ActionHistory, so the padding is rests too.
+    pad = 2 * max(LOOP_LENGTHS)
+    padded = np.concatenate([np.full((len(actions), pad), 36), actions], axis=1)
+    any_loop = np.zeros_like(valid)
+    loops = {}
+    for w in LOOP_LENGTHS:
+        equal = np.zeros(padded.shape, dtype=np.int64)
+        equal[:, w:] = padded[:, w:] == padded[:, :-w]
+        window = np.cumsum(equal, axis=1)
+        window[:, w:] -= window[:, :-w].copy()
+        loop = (window[:, pad - 1:-1] == w) & valid
+        loops[str(w)] = int(loop.sum())
+        any_loop |= loop
+
+    return {
+        "steps": int(valid.sum()),
+        "notes": int(notes.sum()),
+        "rests": int((actions == 36).sum()),
+        "holds": int((actions == 37).sum()),
+        "chord_tone_hits": int(hits.sum()),
+        "exact_repeats": int(repeats.sum()),
+        "double_repeats": int(double_repeats.sum()),
+        "fatigue_notes": int(fatigue.sum()),
+        "loop_steps": int(any_loop.sum()),
+        "loops": loops,
+        "intervals": intervals.tolist()
+    }
+
+
+def merge_counts(a, b):
+    merged = {}
+    for key, value in a.items():
+        if isinstance(value, dict):
+            merged[key] = {k: value[k] + b[key][k] for k in value}
+        elif isinstance(value, list):
+            merged[key] = [x + y for x, y in zip(value, b[key])]
+        else:
+            merged[key] = value + b[key]
+    return merged
+
+
+def summarize(counts, rewards):
+    """
+    Metrics JSON from merged counts and the per-episode rewards
+    """
+    steps, notes = counts["steps"], max(counts["notes"], 1)
+    intervals = np.array(counts["intervals"])
+    total_intervals = max(int(intervals.sum()), 1)
+    rewards = np.asarray(rewards)
+    return {
+        "episodes": len(rewards),
+        "steps": steps,
+        "reward": {
+            "mean": float(rewards.mean()),
+            "std": float(rewards.std()),
+            "min": float(rewards.min()),
+            "p5": float(np.percentile(rewards, 5)),
+            "p50": float(np.percentile(rewards, 50)),
+            "p95": float(np.percentile(rewards, 95)),
+            "max": float(rewards.max()),
+            "per_step": float(rewards.sum() / steps)
+        },
+        "chord_tone_hit_rate": counts["chord_tone_hits"] / notes,
+        "exact_repeat_rate": counts["exact_repeats"] / notes,
+        "double_repeat_rate": counts["double_repeats"] / notes,
+        "fatigue_rate": counts["fatigue_notes"] / notes,
+        "phrase_loop_rate": counts["loop_steps"] / steps,
+        "phrase_loop_rates": {w: n / steps for w, n in counts["loops"].items()},
+        "note_ratio": counts["notes"] / steps,
+        "rest_ratio": counts["rests"] / steps,
+        "hold_ratio": counts["holds"] / steps,
+        "interval_histogram": counts["intervals"],
+        "interval_bands": {band: int(intervals[low:high + 1].sum()) / total_intervals
+                           for band, (low, high) in INTERVAL_BANDS.items()}
+    }
+
+
+def evaluate_batch(model, start, count, seed=SEED, chords=None, corpus=None, epsilon=0.0):
+    actions, played_chords, lengths, rewards = rollout(model, start, count, seed, chords, corpus, epsilon)
+    return episode_counts(actions, played_chords, lengths), rewards.tolist()
+
+
+def evaluate_model(model, episodes=EPISODES, seed=SEED, chords=None, corpus=None, epsilon=0.0,
+                   batch_size=BATCH_SIZE):
+    """
+    Evaluates an in-memory model in this process (e.g. a checkpoint during training)
+    """
+    counts, rewards = None, []
+    for start in range(0, episodes, batch_size):
+        batch_counts, batch_rewards = evaluate_batch(model, start, min(batch_size, episodes - start), seed,
+                                                     chords, corpus, epsilon)
+        counts = batch_counts if counts is None else merge_counts(counts, batch_counts)
+        rewards.extend(batch_rewards)
+    return summarize(counts, rewards)
+
+
+# Loaded once per worker process, by path
+_models = {}
+_pool_worker = False  # One process per core already, so torch models run single-threaded
+
+
+def _init_worker():
+    global _pool_worker
+    _pool_worker = True
+
+
+def _evaluate_job(job):
+    path, start, count, seed, chords, corpus, epsilon = job
+    if path not in _models:
+        _models[path] = load_policy(path)
+        if _pool_worker and not isinstance(_models[path], NumpyDQNPolicy):
+            # Only the .zip path has imported torch, so NumPy policies never pay for it
+            import torch
+            torch.set_num_threads(1)
+    return path, start, evaluate_batch(_models[path], start, count, seed, chords, corpus, epsilon)
+
+
+def evaluate(paths, episodes=EPISODES, workers=None, seed=SEED, chords=None, corpus=None, epsilon=0.0,
+             batch_size=BATCH_SIZE):
+    """
+    Evaluates every model in `paths` on the same seeded episodes, with the batches
+    of all models spread over a process pool. Returns {path: metrics}.
+    """
+    workers = workers or os.cpu_count()
+    jobs = [(path, start, min(batch_size, episodes - start), seed, chords, corpus, epsilon)
+            for path in paths for start in range(0, episodes, batch_size)]
+    results = {path: {} for path in paths}
+    if workers == 1:
+        for job in jobs:
+            path, start, result = _evaluate_job(job)
+            results[path][start] = result
+    else:
+        with Pool(workers, initializer=_init_worker) as pool:
+            for path, start, result in pool.imap_unordered(_evaluate_job, jobs):
+                results[path][start] = result
+
+    metrics = {}
+    for path, batches in results.items():
+        counts, rewards = None, []
+        for start in sorted(batches):
+            batch_counts, batch_rewards = batches[start]
+            counts = batch_counts if counts is None else merge_counts(counts, batch_counts)
+            rewards.extend(batch_rewards)
+        metrics[path] = summarize(counts, rewards)
+    return metrics
+
+
+def print_comparison(metrics):
+    print(f"\n{'MODEL':32s} {'REWARD':>9s} {'±':>7s} {'HIT':>6s} {'REPEAT':>7s} {'LOOP':>6s} "
+          f"{'FATIGUE':>8s} {'REST':>6s} {'HOLD':>6s} {'STEP':>6s} {'LEAP10+':>8s}")
+    for path, m in metrics.items():
+        print(f"{os.path.basename(path)[-32:]:32s} {m['reward']['mean']:9.1f} {m['reward']['std']:7.1f} "
+              f"{m['chord_tone_hit_rate']:6.1%} {m['exact_repeat_rate']:7.1%} {m['phrase_loop_rate']:6.1%} "
+              f"{m['fatigue_rate']:8.1%} {m['rest_ratio']:6.1%} {m['hold_ratio']:6.1%} "
+              f"{m['interval_bands']['step']:6.1%} {m['interval_bands']['large_leap']:8.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate trained models on seeded episodes with musical metrics")
+    parser.add_argument("models", nargs="+", help="Models to compare (.npz, .zip or path without extension), "
+                                                  "e.g. checkpoints/*.zip")
+    parser.add_argument("--episodes", type=int, default=EPISODES)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Episodes per batched predict")
+    parser.add_argument("--seed", type=int, default=SEED, help="Episode i is seeded with seed + i")
+    parser.add_argument("--epsilon", type=float, default=0.0, help="Per-step exploration (default: greedy)")
+    parser.add_argument("--chords", type=lambda value: value.split(","), default=None,
+                        help="Comma-separated chord vocabulary (default: the chords.json vocabulary)")
+    parser.add_argument("--corpus", help="Evaluate on tunes from a corpus index instead of random progressions")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    metrics = evaluate(args.models, args.episodes, args.workers, args.seed, args.chords, args.corpus,
+                       args.epsilon, args.batch_size)
+    elapsed = time.perf_counter() - start
+    print_comparison(metrics)
+
+    with open(args.out, "w") as f:
+        json.dump({"seed": args.seed, "episodes": args.episodes, "batch_size": args.batch_size,
+                   "epsilon": args.epsilon, "chords": args.chords, "corpus": args.corpus,
+                   "models": metrics}, f, indent=2)
+    total_steps = sum(m["steps"] for m in metrics.values())
+    print(f"\n✅ Results in {args.out} ({total_steps:,} steps in {elapsed:.1f}s, "
+          f"{total_steps / elapsed:,.0f} steps/sec)")
@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import time
+from multiprocessing import Pool
+import numpy as np
+from play_jazz import MODEL_PATH, SOUNDFONT, STEPS_TO_PLAY, JazzSession, load_model, make_env
+from render import render_many
+
+# === GENERATION CONFIGURATION ===
+OUTPUT_DIR = "output/generated"
+SESSIONS = 100
+STYLES = ['SIMPLE', 'ARPEGGIO']
+
+# Loaded once per worker process
+_model = None
+
+
+def _init_worker(model_path):
+    global _model
+    _model = load_model(model_path)
+
+
+def seed_session(seed, model):
+    """
+    Seeds everything a session draws from besides the env (seeded on its own):
+    the velocities (`random`) and the model's exploration
+    """
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    if hasattr(model, "rng"):
+        model.rng = np.random.default_rng(seed)
+    else:
+        model.action_space.seed(seed)
+
+
+def generate_session(index, seed, steps, style, out_dir, model=None):
+    """
+    Renders one headless session (no port, no sleeping) to <out_dir>/session_<index>.mid
+    """
+    model = model or _model
+    seed_session(seed, model)
+    if style == 'RANDOM':
+        style = random.choice(STYLES)
+
+    session = JazzSession(make_env(model, seed=seed), model, out_port=None, style=style)
+    session.run(steps)
+    session.stop()
+
+    path = os.path.join(out_dir, f"session_{index:05d}.mid")
+    session.save(path)
+    return path
+
+
+def _generate(job):
+    return generate_session(*job)
+
+
+def generate(sessions=SESSIONS, workers=None, steps=STEPS_TO_PLAY, style='RANDOM', seed=0,
+             out_dir=OUTPUT_DIR, model_path=MODEL_PATH):
+    """
+    Renders `sessions` clips over a process pool. Session i uses seed + i, so any
+    clip can be regenerated on its own.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    jobs = [(i, seed + i, steps, style, out_dir) for i in range(sessions)]
+
+    paths = []
+    with Pool(workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        for path in pool.imap_unordered(_generate, jobs, chunksize=max(1, sessions // (workers * 4))):
+            paths.append(path)
+    return sorted(paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render many backing-plus-solo MIDI clips offline")
+    parser.add_argument("--sessions", type=int, default=SESSIONS)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--steps", type=int, default=STEPS_TO_PLAY, help="16th-note steps per session")
+    parser.add_argument("--style", choices=["simple", "arpeggio", "random"], default="random")
+    parser.add_argument("--seed", type=int, default=0, help="Session i is seeded with seed + i")
+    parser.add_argument("--out-dir", default=OUTPUT_DIR)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--render", action="store_true", help="Also render every clip to MP3")
+    parser.add_argument("--soundfont", default=SOUNDFONT)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = generate(args.sessions, args.workers, args.steps, args.style.upper(), args.seed,
+                     args.out_dir, args.model)
+    elapsed = time.perf_counter() - start
+    total_steps = args.sessions * args.steps
+    print(f"✅ {len(paths)} sessions written to {args.out_dir} in {elapsed:.1f}s "
+          f"({total_steps / elapsed:,.0f} steps/sec)")
+
+    if args.render:
+        start = time.perf_counter()
+        jobs = [(path, os.path.splitext(path)[0] + ".mp3") for path in paths]
+        rendered, cached, failed = render_many(jobs, args.workers, args.soundfont)
+        print(f"✅ {rendered} rendered, {cached} from cache, {failed} failed "
+              f"in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,123 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from numpy_policy import NumpyDQNPolicy
+
+# === HOT RELOAD CONFIGURATION ===
+POLL_INTERVAL = 1.0  # Seconds between checks for a new model
+EXPORT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "numpy_policy.py")
+
+
+def newest_checkpoint(checkpoint_dir):
+    """
+    Model file of the newest checkpoint train.py finished in `checkpoint_dir` (its
+    JSON record is written last), the exported .npz when there is one. None if there is none.
+    """
+    records = []
+    for path in glob.glob(os.path.join(checkpoint_dir, "*_steps.json")):
+        try:
+            with open(path) as f:
+                records.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    if not records:
+        return None
+    record = max(records, key=lambda record: record["num_timesteps"])
+    # The record holds the path as train.py saw it, so look next to the record instead
+    prefix = os.path.join(checkpoint_dir, os.path.basename(record["model"])[:-4])
+    return f"{prefix}.npz" if os.path.exists(f"{prefix}.npz") else f"{prefix}.zip"
+
+
+def _lowest_priority():
+    os.nice(19)
+
+
+def load_policy(path):
+    """
+    NumpyDQNPolicy for a .npz or a stable-baselines3 .zip. A .zip is exported in a
+    child process at the lowest CPU priority, so torch is never imported next to
+    the playback thread and the export doesn't compete with it for the CPU.
+    """
+    if not path.endswith(".zip"):
+        return NumpyDQNPolicy.load(path)
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "policy.npz")
+        subprocess.run([sys.executable, EXPORT_SCRIPT, path, out_path], check=True, capture_output=True,
+                       preexec_fn=_lowest_priority if hasattr(os, "nice") else None)
+        return NumpyDQNPolicy.load(out_path)
+
+
+class ModelWatcher:
+    """
+    Polls a model path (<model>.npz or .zip, like play_jazz.load_model) or a train.py
+    checkpoint directory from a background thread. Every new model is loaded there
+    and handed to `on_model(model, info)`; the model present at start() is not.
+
+    A model file is only loaded once it looked the same on two polls in a row, so
+    a file that is still being written isn't picked up half-way. One that fails to
+    load is skipped until it changes again.
+    """
+
+    def __init__(self, path, on_model, poll_interval=POLL_INTERVAL):
+        self.path = path
+        self.on_model = on_model
+        self.poll_interval = poll_interval
+        self.reloads = 0
+        self._seen = None
+        self._pending = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._seen = self._current()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="jazz-model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _current(self):
+        """
+        (model file, size, mtime) of what would be loaded now, None if there is nothing
+        """
+        if os.path.isdir(self.path):
+            model_path = newest_checkpoint(self.path)
+        else:
+            base = self.path[:-4] if self.path.endswith((".npz", ".zip")) else self.path
+            model_path = f"{base}.npz" if os.path.exists(f"{base}.npz") else f"{base}.zip"
+        if model_path is None:
+            return None
+        try:
+            stat = os.stat(model_path)
+        except OSError:
+            return None
+        return model_path, stat.st_size, stat.st_mtime_ns
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            current = self._current()
+            if current is None or current == self._seen:
+                continue
+            if current != self._pending:
+                # Changed since the last poll: may still be being written
+                self._pending = current
+                continue
+            self._seen, self._pending = current, None
+
+            model_path = current[0]
+            start = time.perf_counter()
+            try:
+                model = load_policy(model_path)
+            except Exception as e:
+                print(f"⚠️  Could not load {model_path}: {e}")
+                continue
+            self.reloads += 1
+            self.on_model(model, {"path": model_path, "load_seconds": time.perf_counter() - start})
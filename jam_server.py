@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import namedtuple
+import numpy as np
+from numpy_policy import ACTION_MASK, sample_allowed
+from play_jazz import BPM, MODEL_PATH, STEPS_TO_PLAY, JazzSession, load_model, make_env, make_midi_callback
+from scheduler import StepScheduler
+from chord_queue import chord_report
+
+# === SERVER CONFIGURATION ===
+OUTPUT_DIR = "output/server"
+SESSIONS = 4
+STYLES = ['SIMPLE', 'ARPEGGIO']
+
+# One jam session: MIDI ports by name (None = local stand-in / no controller)
+SessionConfig = namedtuple("SessionConfig", ["name", "input_port", "output_port", "style", "bpm", "steps"])
+
+
+class LocalPort:
+    """
+    Stand-in for a MIDI output port: counts what would have been sent
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.sent = 0
+
+    def send(self, msg):
+        self.sent += 1
+
+    def close(self):
+        pass
+
+
+class BatchPredictor:
+    """
+    Shares one loaded model between all sessions on the event loop. Every
+    predict request made in the same loop iteration (sessions whose step
+    deadlines line up wake together) is answered by one batched predict.
+
+    Exploration is drawn per request, so sessions explore independently of
+    the batch they land in.
+    """
+
+    def __init__(self, model, seed=None):
+        self.model = model
+        self.exploration_rate = float(getattr(model, "exploration_rate", 0.0))
+        self.n_actions = int(getattr(model, "n_actions", None) or model.action_space.n)
+        self.rng = np.random.default_rng(seed)
+        self._pending = []
+        self.batches = 0
+        self.requests = 0
+
+    def predict(self, obs):
+        """
+        Returns a future with the action for `obs`
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            # Runs after every task already woken in this iteration had its turn
+            loop.call_soon(self._flush)
+        self._pending.append((obs, future))
+        return future
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        try:
+            batch = {key: np.stack([np.asarray(obs[key]) for obs, _ in pending]) for key in pending[0][0]}
+            actions, _ = self.model.predict(batch, deterministic=True)
+            explore = self.rng.random(len(pending)) < self.exploration_rate
+            if explore.any():
+                random_actions = (sample_allowed(batch[ACTION_MASK], self.rng) if ACTION_MASK in batch
+                                  else self.rng.integers(0, self.n_actions, len(pending)))
+                actions = np.where(explore, random_actions, actions)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.requests += len(pending)
+        for (_, future), action in zip(pending, actions):
+            if not future.done():
+                future.set_result(int(action))
+
+
+class ServerSession:
+    """
+    One jam session served as an asyncio task: its own env, ports, MIDI file and
+    scheduler around a JazzSession, with predictions from the shared BatchPredictor
+    """
+
+    def __init__(self, config, predictor, seed=None):
+        self.config = config
+        self.predictor = predictor
+        self.out_port = self._open_output(config.output_port)
+        self.session = JazzSession(make_env(predictor.model, seed=seed), predictor.model, self.out_port, style=config.style,
+                                   manual_control=config.input_port is not None, bpm=config.bpm, verbose=False)
+        self.scheduler = StepScheduler(config.bpm)
+        self.in_port = None
+        if config.input_port:
+            import mido
+            try:
+                self.in_port = mido.open_input(config.input_port, callback=make_midi_callback(self.session.set_chord))
+            except Exception as e:
+                print(f"❌ [{config.name}] Failed to open input {config.input_port}: {e}")
+
+    def _open_output(self, port_name):
+        if not port_name:
+            return LocalPort(self.config.name)
+        import mido
+        try:
+            return mido.open_output(port_name)
+        except Exception as e:
+            print(f"❌ [{self.config.name}] Failed to open output {port_name}: {e} (using a local stand-in)")
+            return LocalPort(port_name)
+
+    async def run(self, start_time):
+        session = self.session
+        scheduler = self.scheduler
+        scheduler.start(start_time=start_time)
+        for step in range(self.config.steps):
+            session.apply_chord_events()
+            action = await self.predictor.predict(session.obs)
+            await scheduler.wait_async(step)
+            session.play_step(step, action)
+            session.advance(action)
+            session.steps_played = step + 1
+        # Let the last step ring for its full duration
+        await scheduler.wait_async(self.config.steps)
+
+    def close(self, out_dir):
+        session = self.session
+        session.stop()
+        timing = self.scheduler.report()
+        if timing and session.manual_control:
+            timing.update(chord_report(session.chord_events.received, session.chord_latencies))
+        session.timing = timing
+        if self.in_port: self.in_port.close()
+        self.out_port.close()
+        path = os.path.join(out_dir, f"{self.config.name}.mid")
+        session.save(path)
+        return path
+
+
+def print_session_stats(sessions, predictor, elapsed):
+    print(f"\n{'SESSION':16s} {'STYLE':9s} {'STEPS':>6s} {'BPM':>8s} {'JIT p50':>8s} {'p99':>7s} {'max':>7s} "
+          f"{'LATE':>5s} {'CHORD ms':>9s}")
+    for server_session in sessions:
+        timing = server_session.session.timing
+        if not timing:
+            continue
+        chord_ms = f"{timing['chord_latency_p50_ms']:9.1f}" if "chord_latency_p50_ms" in timing else f"{'-':>9s}"
+        print(f"{server_session.config.name:16s} {server_session.config.style:9s} {timing['steps']:6d} "
+              f"{timing['effective_bpm']:8.2f} {timing['jitter_p50_ms']:8.2f} {timing['jitter_p99_ms']:7.2f} "
+              f"{timing['jitter_max_ms']:7.2f} {timing['late_steps']:5d} {chord_ms}")
+    if predictor.batches:
+        print(f"\n🧠 {predictor.requests:,} predictions in {predictor.batches:,} batches "
+              f"(mean batch {predictor.requests / predictor.batches:.1f}) over {elapsed:.1f}s")
+
+
+async def serve(configs, model, out_dir=OUTPUT_DIR, start_delay=0.5, seed=None):
+    """
+    Runs every configured session concurrently on one event loop and one model.
+    Returns the ServerSessions (their .session.timing holds the per-session stats).
+    """
+    predictor = BatchPredictor(model, seed=seed)
+    sessions = [ServerSession(config, predictor, None if seed is None else seed + i)
+                for i, config in enumerate(configs)]
+    os.makedirs(out_dir, exist_ok=True)
+
+    # A common start time gives sessions at the same tempo identical deadlines, so they batch
+    start = time.perf_counter()
+    start_time = start + start_delay
+    tasks = [asyncio.create_task(s.run(start_time), name=s.config.name) for s in sessions]
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for server_session, result in zip(sessions, results):
+            if isinstance(result, Exception):
+                print(f"❌ [{server_session.config.name}] {result!r}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        for server_session in sessions:
+            server_session.close(out_dir)
+        print_session_stats(sessions, predictor, time.perf_counter() - start)
+    return sessions
+
+
+def load_configs(path):
+    """
+    Reads a JSON list of sessions, e.g.
+    [{"name": "alice", "input_port": "VMPK Output", "output_port": "FLUID Synth", "style": "simple"}]
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    configs = []
+    for i, entry in enumerate(entries):
+        configs.append(SessionConfig(
+            name=entry.get("name", f"session_{i:03d}"),
+            input_port=entry.get("input_port"),
+            output_port=entry.get("output_port"),
+            style=entry.get("style", "simple").upper(),
+            bpm=float(entry.get("bpm", BPM)),
+            steps=int(entry.get("steps", STEPS_TO_PLAY))
+        ))
+    return configs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve several JazzMate jam sessions from one process")
+    parser.add_argument("--config", help="JSON list of sessions (name, input_port, output_port, style, bpm, steps)")
+    parser.add_argument("--sessions", type=int, default=SESSIONS,
+                        help="Without --config: this many auto sessions on local stand-in ports")
+    parser.add_argument("--style", choices=["simple", "arpeggio", "random"], default="random")
+    parser.add_argument("--bpm", type=float, default=BPM)
+    parser.add_argument("--steps", type=int, default=STEPS_TO_PLAY)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--out-dir", default=OUTPUT_DIR)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.config:
+        configs = load_configs(args.config)
+    else:
+        configs = [SessionConfig(f"session_{i:03d}", None, None,
+                                 random.choice(STYLES) if args.style == "random" else args.style.upper(),
+                                 args.bpm, args.steps) for i in range(args.sessions)]
+
+    model = load_model(args.model)
+    print(f"🚀 Serving {len(configs)} sessions...")
+    try:
+        asyncio.run(serve(configs, model, args.out_dir, seed=args.seed))
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    print(f"✅ MIDI files saved to {args.out_dir}")
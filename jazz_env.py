@@ -1,44 +1,171 @@
+import copy
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 import random
+from chords import REGISTRY
+from progressions import PROGRESS_WINDOW, RandomProgressions
 
-# Map chord names to their constituent notes (in chromatic scale 0-11)
-CHORD_MAPPING = {
-    "Cm7": [0, 3, 7, 10], "F7": [5, 9, 0, 3],
-    "BbMaj7": [10, 2, 5, 9], "EbMaj7": [3, 7, 10, 2],
-    "Am7b5": [9, 0, 3, 7], "D7": [2, 6, 9, 0],
-    "Gm": [7, 10, 2, 5], "Dm7": [2, 5, 9, 0],
-    "G7": [7, 11, 2, 5], "CMaj7": [0, 4, 7, 11],
-    "C7b9": [0, 4, 7, 10, 1], "Fdim7": [5, 8, 11, 2],
-    "Bb6": [10, 2, 5, 7], "E7alt": [4, 8, 0, 2]
-}
+# === PRECOMPUTED TABLES ===
+# Chords are integer IDs from the chord registry (chords.py / chords.json).
+# Everything chord-dependent in the reward and observation is built once here,
+# so step() only does table lookups
+CHORD_NAMES = REGISTRY.names
+CHORD_INDEX = REGISTRY.index  # Also holds aliases and sharp spellings
+DEFAULT_CHORDS = REGISTRY.vocabulary  # IDs the random progressions are drawn from
+
+# 12-element chord-tone vector for each chord (the "chord_tones" observation)
+CHORD_TONE_VECTORS = REGISTRY.tones
+IN_CHORD = CHORD_TONE_VECTORS.astype(bool)
+
+# Harmony reward for every chord x action: chord tones +1.0, other notes -0.6, rest/hold 0
+HARMONY_REWARD = np.zeros((len(CHORD_NAMES), 38), dtype=np.float64)
+HARMONY_REWARD[:, :36] = np.where(IN_CHORD[:, np.arange(36) % 12], 1.0, -0.6)
+
+# Melodic flow score indexed by the absolute interval between two notes
+INTERVAL_SCORE = np.zeros(36, dtype=np.float64)
+INTERVAL_SCORE[1:3] = 0.8
+INTERVAL_SCORE[3:6] = 0.4
+INTERVAL_SCORE[10:] = -1.5
+
+# Action masks: notes allowed after each note the melodic flow term compares against,
+# i.e. every note but the leaps it always charges for (row 36: no note to compare against)
+LEAP_ALLOWED = np.ones((37, 38), dtype=bool)
+LEAP_ALLOWED[:36, :36] = INTERVAL_SCORE[np.abs(np.arange(36)[:, None] - np.arange(36))] >= 0
+
+# Plain-list copies for the scalar env, where list indexing beats NumPy scalar access
+_IN_CHORD = IN_CHORD.tolist()
+_HARMONY_REWARD = HARMONY_REWARD.tolist()
+_INTERVAL_SCORE = INTERVAL_SCORE.tolist()
+
+# Phrase-loop penalties: loop length in steps -> penalty when the last N actions repeat the N before them
+PHRASE_LOOP_PENALTIES = {2: 5.0, 3: 10.0, 4: 15.0}
+HISTORY_LENGTH = 16
+
+
+class ActionHistory:
+    """
+    Fixed-size ring buffer of the most recent actions with constant-cost
+    phrase-loop detection.
+
+    For every loop length w we keep the run of consecutive appends that
+    matched the action w steps earlier. The last w actions repeat the w
+    before them exactly when that run is at least w, so the check costs
+    the same for 2-step and 16-step motifs.
+    """
+
+    def __init__(self, size=HISTORY_LENGTH, loop_lengths=(2, 3, 4), fill=36):
+        loop_lengths = sorted(loop_lengths)
+        if loop_lengths and size < 2 * loop_lengths[-1]:
+            raise ValueError(f"History of {size} steps is too short for {loop_lengths[-1]}-step loops")
+        self.size = size
+        self.loop_lengths = loop_lengths
+        self.fill = fill
+        self.reset()
+
+    def reset(self):
+        self._buf = [self.fill] * self.size
+        self._pos = 0  # Slot of the oldest action, where the next one is written
+        self._count = self.size
+        # The buffer starts uniform, so every comparison that fits in it matches
+        self._runs = [self.size - w for w in self.loop_lengths]
+        # (time, action) of the two most recent notes, for hold lookups
+        self._last_note = (-1, -1)
+        self._prev_note = (-1, -1)
+
+    def append(self, action):
+        buf = self._buf
+        size = self.size
+        pos = self._pos
+        for i, w in enumerate(self.loop_lengths):
+            if buf[(pos - w) % size] == action:
+                self._runs[i] += 1
+            else:
+                self._runs[i] = 0
+        buf[pos] = action
+        self._pos = (pos + 1) % size
+        if action < 36:
+            self._prev_note = self._last_note
+            self._last_note = (self._count, action)
+        self._count += 1
+
+    def loops(self):
+        """Loop lengths whose last two repetitions are identical"""
+        return [w for w, run in zip(self.loop_lengths, self._runs) if run >= w]
+
+    def last_note_before_latest(self):
+        """Most recent note in the buffer excluding the newest entry, or -1"""
+        time, note = self._last_note
+        if time == self._count - 1:
+            time, note = self._prev_note
+        return note if time >= self._count - self.size else -1
+
+    def get_state(self):
+        return (self._buf[:], self._pos, self._count, self._runs[:], self._last_note, self._prev_note)
+
+    def set_state(self, state):
+        buf, self._pos, self._count, runs, self._last_note, self._prev_note = state
+        self._buf = buf[:]
+        self._runs = runs[:]
+
+    def __getitem__(self, index):
+        if not -self.size <= index < self.size:
+            raise IndexError("history index out of range")
+        return self._buf[(self._pos + index) % self.size]
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        pos = self._pos
+        return iter(self._buf[pos:] + self._buf[:pos])
 
 
 class JazzImprovisationEnv(gym.Env):
     metadata = {'render_modes': ['console']}
 
-    def __init__(self):
+    def __init__(self, history_length=HISTORY_LENGTH, loop_penalties=None, chords=None, progressions=None,
+                 seed=None, mask_actions=False):
         super(JazzImprovisationEnv, self).__init__()
         # Actions: 0-35 are notes (3 octaves), 36 is rest, 37 is hold
         self.action_space = spaces.Discrete(38)
 
-        self.observation_space = spaces.Dict({
+        obs_spaces = {
             "chord_tones": spaces.Box(low=0, high=1, shape=(12,), dtype=np.int8),
             "step_progress": spaces.Box(low=0, high=1, shape=(1,), dtype=np.float32),
             "last_action": spaces.Discrete(38),
             "held_duration": spaces.Box(low=0, high=128, shape=(1,), dtype=np.float32),
             "style_seed": spaces.Box(low=0, high=1, shape=(1,), dtype=np.float32)
-        })
+        }
+        # Optionally the action_masks() of every step, in the observation and the info
+        self.mask_actions = mask_actions
+        if mask_actions:
+            obs_spaces["action_mask"] = spaces.Box(low=0, high=1, shape=(38,), dtype=np.int8)
+        self.observation_space = spaces.Dict(obs_spaces)
 
-        self.progression = []
-        self.steps_per_episode = 0
+        self.progression = None  # Progression: (chord ID, duration) segments
+        self.steps_per_episode = 0  # Episode length, or the step_progress window of an endless progression
+        self._endless = False
+        self._segment = 0  # Index of the current segment
+        self._segment_end = 0  # Step at which it ends
+        self._episode_end = 0  # Step at which the progression ends (inf while a stream runs)
         self.current_step = 0
-        self.current_chord_name = "Cm7"
+        self._chord_idx = REGISTRY.id("Cm7")
         self.last_action = 36
         self.current_action_duration = 0
-        self.history = [36] * 16
+        self.loop_penalties = dict(PHRASE_LOOP_PENALTIES if loop_penalties is None else loop_penalties)
+        self.history = ActionHistory(history_length, self.loop_penalties.keys())
         self.current_style = 0.5
+        # Progressions and style seeds are drawn from the env's own RNG, so a snapshot or
+        # clone replays them exactly; reset(seed=...) reseeds it
+        self.rng = random.Random(seed)
+
+        # Chord vocabulary (IDs) the random progressions are drawn from; names are accepted too
+        self.chords = list(DEFAULT_CHORDS) if chords is None else REGISTRY.ids(chords)
+        if not self.chords:
+            raise ValueError("Empty chord vocabulary")
+        # Anything with sample(rng) -> Progression: random bars (default), a stream or a Corpus
+        self.progressions = RandomProgressions(self.chords) if progressions is None else progressions
 
         # Track note patterns to prevent spam and encourage variety
         self.consecutive_notes = 0
@@ -47,21 +174,86 @@ class JazzImprovisationEnv(gym.Env):
         self.consecutive_varied_notes = 0
 
         self.manual_mode = False
+        self._alloc_obs_buffers()
+
+    @property
+    def current_chord(self):
+        return self._chord_idx
 
-    def set_manual_chord(self, chord_name):
-        if chord_name in CHORD_MAPPING:
-            self.current_chord_name = chord_name
+    @property
+    def current_chord_name(self):
+        return CHORD_NAMES[self._chord_idx]
+
+    @current_chord_name.setter
+    def current_chord_name(self, chord_name):
+        self._chord_idx = REGISTRY.id(chord_name)
+
+    def _alloc_obs_buffers(self):
+        # Observation arrays are reused by every step() until the next reset()
+        self._chord_buf = np.zeros(12, dtype=np.int8)
+        self._progress_buf = np.zeros(1, dtype=np.float32)
+        self._duration_buf = np.zeros(1, dtype=np.float32)
+        self._style_buf = np.zeros(1, dtype=np.float32)
+        self._mask_buf = np.ones(38, dtype=np.int8)
+        self._buf_chord_idx = -1
+
+    def set_manual_chord(self, chord):
+        """
+        Holds the env on `chord` (ID or name) until the next reset; unknown chords are ignored
+        """
+        chord_id = REGISTRY.get(chord)
+        if chord_id is not None:
+            self._chord_idx = chord_id
             self.manual_mode = True
 
+    # Everything step() reads or writes (besides the history and the RNG), so an episode can be rewound
+    _STATE_FIELDS = ("progression", "steps_per_episode", "_endless", "_segment", "_segment_end", "_episode_end",
+                     "current_step", "_chord_idx", "last_action",
+                     "current_action_duration", "current_style", "consecutive_notes", "exact_note_repeats",
+                     "last_note_played", "consecutive_varied_notes", "manual_mode")
+
+    def get_state(self):
+        """
+        Snapshot of the episode state, RNG included: restoring it replays the same episode
+        """
+        state = {name: getattr(self, name) for name in self._STATE_FIELDS}
+        state["history"] = self.history.get_state()
+        state["rng"] = self.rng.getstate()
+        return state
+
+    def set_state(self, state):
+        for name in self._STATE_FIELDS:
+            setattr(self, name, state[name])
+        self.history.set_state(state["history"])
+        self.rng.setstate(state["rng"])
+
+    def clone(self):
+        """
+        Independent copy of the env at its current step, for simulating ahead.
+        The progression is shared: a stream's segments never change once pulled.
+        """
+        env = copy.copy(self)
+        env.history = copy.copy(self.history)
+        env.history.set_state(self.history.get_state())
+        env.rng = random.Random()
+        env.rng.setstate(self.rng.getstate())
+        env._alloc_obs_buffers()
+        return env
+
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
-        # Generate a random chord progression (8 chords, each lasting 16 steps)
-        available_chords = list(CHORD_MAPPING.keys())
-        self.progression = []
-        for _ in range(8):
-            chord = random.choice(available_chords)
-            self.progression.extend([chord] * 16)
-        self.steps_per_episode = len(self.progression)
+        if seed is not None:
+            self.rng.seed(seed)
+        # Draw a progression (by default 8 random chords, each lasting 16 steps)
+        self.progression = self.progressions.sample(self.rng)
+        first = self.progression.segment(0)
+        if first is None:
+            raise ValueError("Empty chord progression")
+        self._endless = self.progression.length is None
+        self.steps_per_episode = PROGRESS_WINDOW if self._endless else self.progression.length
+        self._episode_end = float("inf") if self._endless else self.progression.length
+        self._segment = 0
+        self._segment_end = first[1]
 
         self.current_step = 0
         self.last_action = 36
@@ -70,34 +262,76 @@ class JazzImprovisationEnv(gym.Env):
         self.last_note_played = 36
         self.consecutive_varied_notes = 0
         self.current_action_duration = 0
-        self.history = [36] * 16
-        self.current_chord_name = self.progression[0]
-        self.current_style = random.random()
+        self.history.reset()
+        self._chord_idx = first[0]
+        self.current_style = self.rng.random()
         self.manual_mode = False
-        return self._get_obs(), {}
+        # Fresh buffers so an observation returned before the reset is left untouched
+        self._alloc_obs_buffers()
+        obs = self._get_obs()
+        return obs, ({"action_mask": self._mask_buf} if self.mask_actions else {})
+
+    @property
+    def progress_step(self):
+        """
+        Step the step_progress observation counts: endless progressions go round a PROGRESS_WINDOW
+        """
+        return self.current_step % self.steps_per_episode if self._endless else self.current_step
+
+    def _next_segment(self):
+        segment = self.progression.segment(self._segment + 1)
+        if segment is None:
+            # A stream ran out: the episode ends here and the last chord stays
+            self._episode_end = self.current_step
+            return
+        self._segment += 1
+        chord, duration = segment
+        self._segment_end += duration
+        # Change style seed when we hit a new chord to encourage variation
+        if chord != self._chord_idx:
+            self._chord_idx = chord
+            self.current_style = self.rng.random()
 
     def _get_obs(self):
-        if not self.manual_mode:
-            if self.current_step < len(self.progression):
-                prev_chord = self.current_chord_name
-                self.current_chord_name = self.progression[self.current_step]
-                # Change style seed when we hit a new chord to encourage variation
-                if self.current_chord_name != prev_chord:
-                    self.current_style = random.random()
-
-        chord_vector = np.zeros(12, dtype=np.int8)
-        current_notes = CHORD_MAPPING[self.current_chord_name]
-        for note in current_notes:
-            chord_vector[note % 12] = 1
-
-        progress = np.array([self.current_step / self.steps_per_episode], dtype=np.float32)
-        duration = np.array([self.current_action_duration], dtype=np.float32)
-        style = np.array([self.current_style], dtype=np.float32)
-
-        return {
-            "chord_tones": chord_vector, "step_progress": progress,
-            "last_action": self.last_action, "held_duration": duration, "style_seed": style
+        """
+        Writes the observation into the preallocated buffers. The arrays are
+        shared between steps, so copy them to keep an observation around.
+        """
+        if not self.manual_mode and self.current_step >= self._segment_end:
+            self._next_segment()
+
+        if self._chord_idx != self._buf_chord_idx:
+            self._chord_buf[:] = CHORD_TONE_VECTORS[self._chord_idx]
+            self._buf_chord_idx = self._chord_idx
+        step = self.current_step % self.steps_per_episode if self._endless else self.current_step
+        self._progress_buf[0] = step / self.steps_per_episode
+        self._duration_buf[0] = self.current_action_duration
+        self._style_buf[0] = self.current_style
+
+        obs = {
+            "chord_tones": self._chord_buf, "step_progress": self._progress_buf,
+            "last_action": self.last_action, "held_duration": self._duration_buf, "style_seed": self._style_buf
         }
+        if self.mask_actions:
+            self._mask_buf[:] = self.action_masks()
+            obs["action_mask"] = self._mask_buf
+        return obs
+
+    def action_masks(self):
+        """
+        Actions worth trying at this step (True). Masked out are:
+        - notes leaping 10+ semitones from the note the melodic flow term compares against
+          (its leap penalty, which chord-tone and riff bonuses can still outweigh)
+        - the previous action when it was a note: an immediate exact repeat
+        - a hold when the history has no note for the dynamic hold term to sustain
+        Rest is always allowed.
+        """
+        mask = LEAP_ALLOWED[min(self.history[-2], 36)].copy()
+        if self.last_action < 36:
+            mask[self.last_action] = False
+        if self.history.last_note_before_latest() == -1:
+            mask[37] = False
+        return mask
 
     def step(self, action):
         # Track how long the current action has been held
@@ -128,17 +362,19 @@ class JazzImprovisationEnv(gym.Env):
             self.consecutive_varied_notes = 0  # Reset variety on break
 
         self.history.append(action)
-        if len(self.history) > 16: self.history.pop(0)
 
         self.last_action = action
         self.current_step += 1
-        terminated = self.current_step >= self.steps_per_episode
-        return self._get_obs(), reward, terminated, False, {"chord": self.current_chord_name}
+        obs = self._get_obs()
+        terminated = self.current_step >= self._episode_end
+        info = {"chord": self.current_chord_name}
+        if self.mask_actions:
+            info["action_mask"] = self._mask_buf
+        return obs, reward, terminated, False, info
 
     def _calculate_reward(self, action):
         reward = 0.0
-        chord_notes = CHORD_MAPPING[self.current_chord_name]
-        chord_notes_set = set(n % 12 for n in chord_notes)
+        in_chord = _IN_CHORD[self._chord_idx]
         is_note = action < 36
         is_rest = action == 36
         is_hold = action == 37
@@ -147,21 +383,12 @@ class JazzImprovisationEnv(gym.Env):
         # === HARMONY ===
         # Playing chord tones sounds good, non-chord tones sound bad
         if is_note:
-            if (action % 12) in chord_notes_set:
-                reward += 1.0
-            else:
-                reward -= 0.6
+            reward += _HARMONY_REWARD[self._chord_idx][action]
 
         # === MELODIC FLOW ===
         # Stepwise motion sounds smooth, big jumps sound awkward
         if is_note and prev1 < 36:
-            interval = abs(action - prev1)
-            if 1 <= interval <= 2:
-                reward += 0.8
-            elif 3 <= interval <= 5:
-                reward += 0.4
-            elif interval > 9:
-                reward -= 1.5
+            reward += _INTERVAL_SCORE[abs(action - prev1)]
 
         # === ANTI-SPAM ===
         # Repeating the exact same note over and over is boring
@@ -173,12 +400,8 @@ class JazzImprovisationEnv(gym.Env):
 
         # === PHRASE LOOPS ===
         # Short repeating patterns get old fast
-        if len(self.history) >= 4 and self.history[-2:] == self.history[-4:-2]:
-            reward -= 5.0
-        if len(self.history) >= 6 and self.history[-3:] == self.history[-6:-3]:
-            reward -= 10.0
-        if len(self.history) >= 8 and self.history[-4:] == self.history[-8:-4]:
-            reward -= 15.0
+        for loop_length in self.history.loops():
+            reward -= self.loop_penalties[loop_length]
 
         # === FATIGUE ===
         # Playing too many notes in a row without a break gets tiring
@@ -189,8 +412,8 @@ class JazzImprovisationEnv(gym.Env):
         # === DYNAMIC HOLD ===
         # Holding a note can add expression, but not forever
         if is_hold:
-            last_played = next((a for a in reversed(self.history[:-1]) if a < 36), -1)
-            if last_played != -1 and (last_played % 12) in chord_notes_set:
+            last_played = self.history.last_note_before_latest()
+            if last_played != -1 and in_chord[last_played % 12]:
                 if self.current_action_duration <= 4:
                     reward += 1.2
                 elif self.current_action_duration <= 8:
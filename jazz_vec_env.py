@@ -0,0 +1,254 @@
+import numpy as np
+import random
+from jazz_env import (CHORD_NAMES, CHORD_TONE_VECTORS, HARMONY_REWARD, HISTORY_LENGTH, IN_CHORD, INTERVAL_SCORE,
+                      LEAP_ALLOWED, JazzImprovisationEnv)
+
+BARS_PER_EPISODE = 8
+STEPS_PER_CHORD = 16
+
+# Per-env state by its JazzImprovisationEnv name -> the BatchJazzEnv attribute holding it
+# for all envs (one entry per env). Everything else on the batch is shared by all envs.
+PER_ENV_ATTRS = {
+    "progression": "progression",
+    "current_step": "current_step",
+    "current_chord": "current_chord",
+    "current_chord_name": "current_chord_names",
+    "last_action": "last_action",
+    "current_action_duration": "current_action_duration",
+    "history": "ordered_history",
+    "current_style": "current_style",
+    "consecutive_notes": "consecutive_notes",
+    "exact_note_repeats": "exact_note_repeats",
+    "last_note_played": "last_note_played",
+    "consecutive_varied_notes": "consecutive_varied_notes",
+    "rng": "rngs"
+}
+# Derived views that can be read but not assigned
+READ_ONLY_ATTRS = ("current_chord_name", "history")
+
+
+class BatchJazzEnv:
+    """
+    Holds the state of N JazzImprovisationEnv episodes in arrays and advances
+    all of them with a single step(actions) call.
+
+    Rewards and observations match N scalar envs with the default random
+    progressions stepped in lockstep exactly: env i has its own RNG, and
+    reset(seed) seeds it with seed + i like a seeded SB3 VecEnv does.
+    """
+
+    metadata = JazzImprovisationEnv.metadata
+    render_mode = None
+
+    def __init__(self, num_envs, history_length=HISTORY_LENGTH, loop_penalties=None, chords=None, seed=None,
+                 mask_actions=False):
+        self.num_envs = num_envs
+        self.mask_actions = mask_actions
+        template = JazzImprovisationEnv(history_length, loop_penalties, chords, mask_actions=mask_actions)
+        self.chords = template.chords
+        self.observation_space = template.observation_space
+        self.action_space = template.action_space
+        self.steps_per_episode = BARS_PER_EPISODE * STEPS_PER_CHORD
+
+        n = num_envs
+        self.progression = np.zeros((n, self.steps_per_episode), dtype=np.int64)
+        self.current_step = np.zeros(n, dtype=np.int64)
+        self.current_chord = np.zeros(n, dtype=np.int64)
+        self.last_action = np.full(n, 36, dtype=np.int64)
+        self.current_action_duration = np.zeros(n, dtype=np.int64)
+        # Ring buffer of recent actions shared by all envs (they all append every step),
+        # with the same constant-cost loop runs as ActionHistory
+        self.history_length = history_length
+        self.history = np.full((n, history_length), 36, dtype=np.int64)
+        self._pos = 0
+        self._count = history_length
+        self.loop_lengths = template.history.loop_lengths
+        self.loop_penalties = np.array([template.loop_penalties[w] for w in self.loop_lengths])
+        self._runs = np.zeros((n, len(self.loop_lengths)), dtype=np.int64)
+        self._last_note_time = np.full(n, -1, dtype=np.int64)
+        self._last_note = np.full(n, -1, dtype=np.int64)
+        self._prev_note_time = np.full(n, -1, dtype=np.int64)
+        self._prev_note = np.full(n, -1, dtype=np.int64)
+        self.current_style = np.zeros(n, dtype=np.float64)
+        self.consecutive_notes = np.zeros(n, dtype=np.int64)
+        self.exact_note_repeats = np.zeros(n, dtype=np.int64)
+        self.last_note_played = np.full(n, 36, dtype=np.int64)
+        self.consecutive_varied_notes = np.zeros(n, dtype=np.int64)
+        self.rngs = [random.Random(None if seed is None else seed + i) for i in range(n)]
+
+    @property
+    def current_chord_names(self):
+        return [CHORD_NAMES[c] for c in self.current_chord]
+
+    @property
+    def ordered_history(self):
+        """
+        Every env's recent actions oldest first, shape (num_envs, history_length)
+        """
+        return np.roll(self.history, -self._pos, axis=1)
+
+    def reset(self, seed=None, indices=None):
+        indices = np.arange(self.num_envs) if indices is None else np.asarray(indices)
+        available_chords = self.chords
+        for i in indices:
+            rng = self.rngs[i]
+            if seed is not None:
+                rng.seed(seed + int(i))
+            # Same draw order as JazzImprovisationEnv.reset
+            for bar in range(BARS_PER_EPISODE):
+                chord = rng.choice(available_chords)
+                self.progression[i, bar * STEPS_PER_CHORD:(bar + 1) * STEPS_PER_CHORD] = chord
+            self.current_style[i] = rng.random()
+
+        self.current_step[indices] = 0
+        self.last_action[indices] = 36
+        self.consecutive_notes[indices] = 0
+        self.exact_note_repeats[indices] = 0
+        self.last_note_played[indices] = 36
+        self.consecutive_varied_notes[indices] = 0
+        self.current_action_duration[indices] = 0
+        self.history[indices] = 36
+        self._runs[indices] = self.history_length - np.array(self.loop_lengths, dtype=np.int64)
+        self._last_note_time[indices] = -1
+        self._prev_note_time[indices] = -1
+        self.current_chord[indices] = self.progression[indices, 0]
+        return self._get_obs(), {}
+
+    def _get_obs(self):
+        in_progress = np.flatnonzero(self.current_step < self.steps_per_episode)
+        if len(in_progress):
+            prev_chord = self.current_chord[in_progress]
+            new_chord = self.progression[in_progress, self.current_step[in_progress]]
+            self.current_chord[in_progress] = new_chord
+            # Change style seed when we hit a new chord
+            for i in in_progress[new_chord != prev_chord]:
+                self.current_style[i] = self.rngs[i].random()
+
+        obs = {
+            "chord_tones": CHORD_TONE_VECTORS[self.current_chord],
+            "step_progress": (self.current_step / self.steps_per_episode).astype(np.float32)[:, None],
+            "last_action": self.last_action.copy(),
+            "held_duration": self.current_action_duration.astype(np.float32)[:, None],
+            "style_seed": self.current_style.astype(np.float32)[:, None]
+        }
+        if self.mask_actions:
+            obs["action_mask"] = self.action_masks().astype(np.int8)
+        return obs
+
+    def action_masks(self):
+        """
+        JazzImprovisationEnv.action_masks for every env, shape (num_envs, 38)
+        """
+        prev = self.history[:, (self._pos - 2) % self.history_length]
+        masks = LEAP_ALLOWED[np.minimum(prev, 36)]
+        repeat = np.flatnonzero(self.last_action < 36)
+        masks[repeat, self.last_action[repeat]] = False
+        # Same note lookup as the dynamic hold term
+        latest = self._last_note_time == self._count - 1
+        note_time = np.where(latest, self._prev_note_time, self._last_note_time)
+        masks[:, 37] &= note_time >= self._count - self.history_length
+        return masks
+
+    def step(self, actions):
+        # A copy: last_action keeps it, and reset() must not write into the caller's array
+        actions = np.array(actions, dtype=np.int64).reshape(self.num_envs)
+        is_note = actions < 36
+        is_rest = actions == 36
+        is_hold = actions == 37
+
+        # Track how long the current action has been held
+        extend = is_hold | (is_rest & (self.last_action == 36))
+        self.current_action_duration = np.where(extend, self.current_action_duration + 1, 1)
+
+        rewards = self._calculate_reward(actions, is_note, is_rest, is_hold)
+
+        # Update counters for the next state
+        repeat = is_note & (actions == self.last_note_played)
+        varied = is_note & ~repeat
+        self.consecutive_notes = np.where(is_note, self.consecutive_notes + 1, 0)
+        self.exact_note_repeats = np.where(repeat, self.exact_note_repeats + 1, 0)
+        self.consecutive_varied_notes = np.where(
+            repeat, 1, np.where(varied, self.consecutive_varied_notes + 1, 0))
+        self.last_note_played = np.where(is_note, actions, self.last_note_played)
+
+        self._append_history(actions, is_note)
+
+        self.last_action = actions
+        self.current_step += 1
+        terminated = self.current_step >= self.steps_per_episode
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        return self._get_obs(), rewards, terminated, truncated, {"chord": self.current_chord.copy()}
+
+    def _append_history(self, actions, is_note):
+        size = self.history_length
+        for i, w in enumerate(self.loop_lengths):
+            match = self.history[:, (self._pos - w) % size] == actions
+            self._runs[:, i] = np.where(match, self._runs[:, i] + 1, 0)
+        self.history[:, self._pos] = actions
+        self._pos = (self._pos + 1) % size
+
+        self._prev_note_time = np.where(is_note, self._last_note_time, self._prev_note_time)
+        self._prev_note = np.where(is_note, self._last_note, self._prev_note)
+        self._last_note_time = np.where(is_note, self._count, self._last_note_time)
+        self._last_note = np.where(is_note, actions, self._last_note)
+        self._count += 1
+
+    def _calculate_reward(self, actions, is_note, is_rest, is_hold):
+        # Terms are added in the same order as the scalar env so the sums are bit-identical
+        reward = np.zeros(self.num_envs, dtype=np.float64)
+        in_chord = IN_CHORD[self.current_chord]
+        prev1 = self.history[:, (self._pos - 2) % self.history_length]
+
+        # === HARMONY ===
+        reward += HARMONY_REWARD[self.current_chord, actions]
+
+        # === MELODIC FLOW ===
+        flow = INTERVAL_SCORE[np.minimum(np.abs(actions - prev1), 35)]
+        reward += np.where(is_note & (prev1 < 36), flow, 0.0)
+
+        # === ANTI-SPAM ===
+        spam = np.where(self.exact_note_repeats == 1, 2.0,
+                        np.where(self.exact_note_repeats >= 2, 10.0, 0.0))
+        reward -= np.where(is_note, spam, 0.0)
+
+        # === PHRASE LOOPS ===
+        loops = self._runs >= np.array(self.loop_lengths)
+        for i in range(len(self.loop_lengths)):
+            reward -= np.where(loops[:, i], self.loop_penalties[i], 0.0)
+
+        # === FATIGUE ===
+        reward -= np.where(is_note & (self.consecutive_notes > 8), self.consecutive_notes * 0.4, 0.0)
+
+        # === DYNAMIC HOLD ===
+        if is_hold.any():
+            # Most recent note excluding the newest history entry
+            latest = self._last_note_time == self._count - 1
+            note_time = np.where(latest, self._prev_note_time, self._last_note_time)
+            last_played = np.where(latest, self._prev_note, self._last_note)
+            found = note_time >= self._count - self.history_length
+            on_chord = found & in_chord[np.arange(self.num_envs), last_played % 12]
+            duration = self.current_action_duration
+            hold = np.where(on_chord, np.where(duration <= 4, 1.2, np.where(duration <= 8, 0.5, -1.0)), -1.0)
+            reward += np.where(is_hold, hold, 0.0)
+
+        # === REST ===
+        rest = np.where(self.consecutive_varied_notes >= 4, 3.0,
+                        np.where(self.consecutive_notes >= 4, 2.0,
+                                 np.where(self.consecutive_notes == 1, -0.8,
+                                          np.where(self.current_action_duration > 6, -1.0, -0.1))))
+        reward += np.where(is_rest, rest, 0.0)
+
+        # === RIFF BONUS ===
+        reward += np.where(self.consecutive_varied_notes == 4, 2.5,
+                           np.where(self.consecutive_varied_notes >= 5, 4.0, 0.0))
+
+        return reward
+
+
+def __getattr__(name):
+    # JazzVecEnv lives in sb3_vec_env.py: stable-baselines3 imports torch, which
+    # BatchJazzEnv users (evaluate.py's pool workers) shouldn't pay for
+    if name == "JazzVecEnv":
+        from sb3_vec_env import JazzVecEnv
+        return JazzVecEnv
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,121 @@
+import json
+import time
+import numpy as np
+
+# === PHASES ===
+# Columns of the per-step timing buffer, in the order they happen within a step
+PREDICT = 0
+BACKING = 1
+SOLO_SEND = 2
+PRINT = 3
+FILE_WRITE = 4
+ENV_STEP = 5
+PHASES = ["predict", "backing", "solo_send", "print", "file_write", "env_step"]
+
+# Histogram bin edges in microseconds
+BIN_EDGES_US = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, np.inf]
+MAX_CHORD_CHANGES = 4096
+
+
+class LatencyProfiler:
+    """
+    Times every phase of every step of a live session into a buffer allocated
+    up front, so recording is a clock read and an array write. Also keeps the
+    input-to-sound latency of every chord change the session applied.
+
+    The session holds None instead of a profiler when profiling is off, and
+    every hook is behind an `if prof:` check.
+    """
+
+    def __init__(self, steps, clock=time.perf_counter):
+        self.clock = clock
+        self.steps = steps
+        self.timings = np.zeros((steps, len(PHASES)), dtype=np.float64)
+        self.chord_latency = np.zeros(MAX_CHORD_CHANGES, dtype=np.float64)
+        self.chord_changes = 0
+        self._row = 0
+        self._last = 0.0
+
+    # --- Playback thread ---
+    def begin(self, step):
+        self._row = step if step < self.steps else -1
+        self._last = self.clock()
+
+    def lap(self, phase):
+        """
+        Adds the time since the previous lap (or begin/skip) to `phase` of the current step
+        """
+        now = self.clock()
+        if self._row >= 0:
+            self.timings[self._row, phase] += now - self._last
+        self._last = now
+
+    def skip(self):
+        """
+        Restarts the lap clock without recording, e.g. after waiting for a deadline
+        """
+        self._last = self.clock()
+
+    # --- Any thread ---
+    def record(self, step, phase, seconds):
+        """
+        Sets one phase of a step directly; used by the inference worker, where a
+        step recomputed after a chord change replaces the discarded one
+        """
+        if step < self.steps:
+            self.timings[step, phase] = seconds
+
+    def chord_change(self, seconds):
+        if self.chord_changes < MAX_CHORD_CHANGES:
+            self.chord_latency[self.chord_changes] = seconds
+            self.chord_changes += 1
+
+    # --- Reporting ---
+    def _series(self, played_steps):
+        series = {name: self.timings[:played_steps, i] for i, name in enumerate(PHASES)}
+        series["step_total"] = self.timings[:played_steps].sum(axis=1)
+        series["chord_change"] = self.chord_latency[:self.chord_changes]
+        return series
+
+    def summary(self, played_steps=None):
+        """
+        Per-metric statistics (microseconds) and histogram counts over BIN_EDGES_US
+        """
+        played_steps = self.steps if played_steps is None else min(played_steps, self.steps)
+        summary = {}
+        for name, seconds in self._series(played_steps).items():
+            us = seconds * 1e6
+            stats = {"count": int(len(us))}
+            if len(us):
+                stats.update({
+                    "mean_us": float(us.mean()),
+                    "p50_us": float(np.percentile(us, 50)),
+                    "p99_us": float(np.percentile(us, 99)),
+                    "max_us": float(us.max())
+                })
+            stats["histogram"] = np.histogram(us, bins=BIN_EDGES_US)[0].tolist()
+            summary[name] = stats
+        return summary
+
+    def save(self, prefix, played_steps=None):
+        """
+        Writes <prefix>.json (statistics and histograms) and <prefix>.csv (one row per histogram bin)
+        """
+        summary = self.summary(played_steps)
+        with open(f"{prefix}.json", "w") as f:
+            json.dump({"bin_edges_us": [str(e) if np.isinf(e) else e for e in BIN_EDGES_US],
+                       "metrics": summary}, f, indent=2)
+        with open(f"{prefix}.csv", "w") as f:
+            f.write("metric,bin_low_us,bin_high_us,count\n")
+            for name, stats in summary.items():
+                for low, high, count in zip(BIN_EDGES_US[:-1], BIN_EDGES_US[1:], stats["histogram"]):
+                    f.write(f"{name},{low},{high},{count}\n")
+        return f"{prefix}.json", f"{prefix}.csv"
+
+
+def print_summary(summary):
+    print("\n📊 Step latency (us)      p50      p99      max")
+    for name, stats in summary.items():
+        if stats["count"]:
+            print(f"   {name:18s} {stats['p50_us']:8.1f} {stats['p99_us']:8.1f} {stats['max_us']:8.1f}"
+                  + (f"   ({stats['count']} changes)" if name == "chord_change" else ""))
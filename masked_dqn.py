@@ -0,0 +1,49 @@
+import numpy as np
+from stable_baselines3 import DQN
+from stable_baselines3.dqn.policies import MultiInputPolicy, QNetwork
+from numpy_policy import ACTION_MASK, MASKED_Q, sample_allowed
+
+# === MASKED DQN ===
+# Trained on JazzImprovisationEnv(mask_actions=True): the mask is both an input
+# feature and a filter on the Q-values, so the greedy action, the TD target's
+# max and the exploration all range over the allowed actions only.
+
+
+class MaskedQNetwork(QNetwork):
+    """
+    Q-network that gives masked actions MASKED_Q. Taken actions are always
+    allowed, so the loss never sees a masked value.
+    """
+
+    def forward(self, obs):
+        return super().forward(obs).masked_fill(obs[ACTION_MASK] == 0, MASKED_Q)
+
+
+class MaskedDQNPolicy(MultiInputPolicy):
+    def make_q_net(self):
+        # Separate features extractors for the online and target networks, like DQNPolicy
+        net_args = self._update_features_extractor(self.net_args, features_extractor=None)
+        return MaskedQNetwork(**net_args).to(self.device)
+
+
+class MaskedDQN(DQN):
+    """
+    DQN whose random warm-up steps and epsilon-greedy exploration draw from the
+    allowed actions. Without a mask in the observation it behaves like DQN, so
+    it loads plain models too.
+    """
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=False):
+        if not isinstance(observation, dict) or ACTION_MASK not in observation:
+            return super().predict(observation, state, episode_start, deterministic)
+        if not deterministic and np.random.rand() < self.exploration_rate:
+            masks = np.asarray(observation[ACTION_MASK])
+            actions = sample_allowed(masks, np.random)
+            return (actions if masks.ndim > 1 else actions[0]), state
+        return self.policy.predict(observation, state, episode_start, deterministic)
+
+    def _sample_action(self, learning_starts, action_noise=None, n_envs=1):
+        if self.num_timesteps < learning_starts and isinstance(self._last_obs, dict) and ACTION_MASK in self._last_obs:
+            actions = sample_allowed(self._last_obs[ACTION_MASK], np.random)
+            return actions, actions
+        return super()._sample_action(learning_starts, action_noise, n_envs)
@@ -0,0 +1,92 @@
+import struct
+from array import array
+import numpy as np
+
+# Event kinds, in the order they are written when they share a tick: program
+# changes first, then note-offs, so a note can end and restart on the same tick
+PROGRAM_CHANGE = 0
+NOTE_OFF = 1
+NOTE_ON = 2
+
+_FIELDS = 6  # track, tick, kind, channel, data1, data2
+
+
+def _var_len(value):
+    """MIDI variable-length quantity"""
+    out = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        out.insert(0, (value & 0x7F) | 0x80)
+        value >>= 7
+    return out
+
+
+class CompactMidiWriter:
+    """
+    Collects note events at absolute tick positions in one flat integer array
+    and serialises a type-1 MIDI file in a single pass at save time.
+
+    Unlike appending mido messages, nothing is needed to advance time: rests
+    and held steps cost no events, and delta times are computed when saving.
+    Events are written with running status to keep the file small.
+    """
+
+    def __init__(self, n_tracks=2, ticks_per_beat=480, tempo=500000):
+        self.n_tracks = n_tracks
+        self.ticks_per_beat = ticks_per_beat
+        self.tempo = tempo
+        self._events = array('i')
+        self._end_ticks = [0] * n_tracks
+
+    def __len__(self):
+        return len(self._events) // _FIELDS
+
+    def program_change(self, track, channel, program, tick=0):
+        self._events.extend((track, tick, PROGRAM_CHANGE, channel, program, 0))
+
+    def note_on(self, track, channel, note, velocity, tick):
+        self._events.extend((track, tick, NOTE_ON, channel, note, velocity))
+
+    def note_off(self, track, channel, note, tick):
+        self._events.extend((track, tick, NOTE_OFF, channel, note, 0))
+
+    def note(self, track, channel, note, velocity, tick, duration):
+        self._events.extend((track, tick, NOTE_ON, channel, note, velocity,
+                             track, tick + duration, NOTE_OFF, channel, note, 0))
+
+    def end_track(self, track, tick):
+        """Makes the track last at least until `tick`, even if it ends in silence"""
+        self._end_ticks[track] = max(self._end_ticks[track], tick)
+
+    def to_bytes(self):
+        events = np.frombuffer(self._events, dtype=np.int32).reshape(-1, _FIELDS)
+        # Stable sort by (track, tick, kind); equal keys keep insertion order
+        order = np.lexsort((events[:, 2], events[:, 1], events[:, 0]))
+        events = events[order]
+        bounds = np.searchsorted(events[:, 0], np.arange(self.n_tracks + 1))
+
+        out = bytearray(b"MThd" + struct.pack(">IHHH", 6, 1, self.n_tracks, self.ticks_per_beat))
+        tempo = b"\x00\xff\x51\x03" + self.tempo.to_bytes(3, "big")
+        for track in range(self.n_tracks):
+            body = bytearray(tempo)
+            last_tick = 0
+            running = None
+            for _, tick, kind, channel, data1, data2 in events[bounds[track]:bounds[track + 1]].tolist():
+                body += _var_len(tick - last_tick)
+                last_tick = tick
+                if kind == PROGRAM_CHANGE:
+                    status, data = 0xC0 | channel, (data1,)
+                else:
+                    # Note-offs are written as velocity-0 note-ons so they share the running status
+                    status, data = 0x90 | channel, (data1, data2)
+                if status != running:
+                    body.append(status)
+                    running = status
+                body += bytes(data)
+            body += _var_len(max(0, self._end_ticks[track] - last_tick)) + b"\xff\x2f\x00"
+            out += b"MTrk" + struct.pack(">I", len(body)) + body
+        return bytes(out)
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            f.write(self.to_bytes())
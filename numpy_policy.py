@@ -0,0 +1,179 @@
+import argparse
+import numpy as np
+
+# === EXPORT FORMAT ===
+# A trained DQN is stored as plain arrays: the Q-network's Linear layers in order
+# (W0, b0, W1, b1, ...) plus the layout of the Dict observation, so playback only needs NumPy.
+FORMAT_VERSION = 1
+
+# Models trained with action masks (train.py --mask-actions) read them from this observation key
+# and never choose a masked action: its Q-value is replaced by MASKED_Q
+ACTION_MASK = "action_mask"
+MASKED_Q = -1e9
+
+
+def uses_action_masks(model):
+    """
+    Whether a NumpyDQNPolicy or stable-baselines3 model expects masked observations
+    """
+    keys = getattr(model, "obs_keys", None)
+    if keys is None:
+        keys = getattr(model.observation_space, "spaces", {})
+    return ACTION_MASK in keys
+
+
+def sample_allowed(masks, rng):
+    """
+    A uniformly random allowed action for every row of `masks` (batch, n_actions)
+    """
+    masks = np.asarray(masks).reshape(-1, np.shape(masks)[-1]) > 0
+    return np.where(masks, rng.random(masks.shape), -1.0).argmax(axis=1)
+
+
+def export_policy(model, out_path):
+    """
+    Writes the Q-network of a stable-baselines3 DQN (or the path of a saved one)
+    to a compact .npz file for NumpyDQNPolicy
+    """
+    import torch.nn as nn
+    from gymnasium import spaces
+    from stable_baselines3 import DQN
+
+    if isinstance(model, str):
+        model = DQN.load(model, device="cpu")
+
+    q_net = model.policy.q_net
+    layers = [m for m in q_net.q_net if isinstance(m, nn.Linear)]
+    activations = {type(m).__name__ for m in q_net.q_net if not isinstance(m, nn.Linear)}
+    if activations - {"ReLU"}:
+        raise ValueError(f"Only ReLU Q-networks can be exported, got {sorted(activations)}")
+
+    # CombinedExtractor concatenates the keys in observation-space order. A packed-observation
+    # model rebuilds the same features from the Dict layout it unpacks to.
+    obs_space = getattr(q_net.features_extractor, "unpacked_space", model.observation_space)
+    keys, sizes, ndims, discrete = [], [], [], []
+    for key, space in obs_space.spaces.items():
+        keys.append(key)
+        ndims.append(len(space.shape))
+        if isinstance(space, spaces.Discrete):
+            sizes.append(int(space.n))
+            discrete.append(True)
+        elif isinstance(space, spaces.Box):
+            sizes.append(int(np.prod(space.shape)))
+            discrete.append(False)
+        else:
+            raise ValueError(f"Unsupported observation space for '{key}': {space}")
+
+    arrays = {}
+    for i, layer in enumerate(layers):
+        arrays[f"W{i}"] = layer.weight.detach().cpu().numpy().astype(np.float32)
+        arrays[f"b{i}"] = layer.bias.detach().cpu().numpy().astype(np.float32)
+
+    np.savez(
+        out_path,
+        format_version=FORMAT_VERSION,
+        n_layers=len(layers),
+        obs_keys=np.array(keys),
+        obs_sizes=np.array(sizes),
+        obs_ndims=np.array(ndims),
+        obs_discrete=np.array(discrete),
+        n_actions=int(model.action_space.n),
+        exploration_rate=float(model.exploration_rate),
+        **arrays
+    )
+
+
+class NumpyDQNPolicy:
+    """
+    Pure-NumPy forward pass of an exported DQN. Reproduces MultiInputPolicy's
+    preprocessing (Box keys as float, Discrete keys one-hot, concatenated in
+    observation-space order) and exposes the same predict() as DQN. Q-values equal
+    SB3's within float32 rounding (tests/test_numpy_policy.py).
+    """
+
+    def __init__(self, path, seed=None):
+        with np.load(path) as data:
+            if int(data["format_version"]) != FORMAT_VERSION:
+                raise ValueError(f"Unsupported policy format in {path}")
+            n_layers = int(data["n_layers"])
+            self.weights = [data[f"W{i}"].T.copy() for i in range(n_layers)]
+            self.biases = [data[f"b{i}"] for i in range(n_layers)]
+            self.obs_keys = [str(k) for k in data["obs_keys"]]
+            self.obs_sizes = [int(s) for s in data["obs_sizes"]]
+            self.obs_ndims = [int(n) for n in data["obs_ndims"]]
+            self.obs_discrete = [bool(d) for d in data["obs_discrete"]]
+            self.n_actions = int(data["n_actions"])
+            self.exploration_rate = float(data["exploration_rate"])
+
+        self.n_features = sum(self.obs_sizes)
+        self.masked = ACTION_MASK in self.obs_keys
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def load(cls, path, seed=None):
+        return cls(path, seed=seed)
+
+    def _features(self, obs, batch):
+        features = np.empty((batch, self.n_features), dtype=np.float32)
+        col = 0
+        for key, size, is_discrete in zip(self.obs_keys, self.obs_sizes, self.obs_discrete):
+            value = obs[key]
+            if is_discrete:
+                features[:, col:col + size] = 0.0
+                features[np.arange(batch), col + np.asarray(value, dtype=np.int64).reshape(batch)] = 1.0
+            else:
+                features[:, col:col + size] = np.asarray(value).reshape(batch, size)
+            col += size
+        return features
+
+    def _batch_size(self, obs):
+        # Same rule as SB3: an extra leading dimension beyond the space's shape means a batch
+        key = self.obs_keys[0]
+        value = np.asarray(obs[key])
+        if value.ndim > self.obs_ndims[0]:
+            return value.shape[0], True
+        return 1, False
+
+    def q_values(self, obs):
+        """
+        Q-values of shape (batch, n_actions), MASKED_Q for masked actions
+        """
+        batch, _ = self._batch_size(obs)
+        x = self._features(obs, batch)
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = x @ w + b
+            if i < last:
+                np.maximum(x, 0.0, out=x)
+        if self.masked:
+            x[np.asarray(obs[ACTION_MASK]).reshape(batch, self.n_actions) == 0] = MASKED_Q
+        return x
+
+    def predict(self, obs, state=None, episode_start=None, deterministic=False):
+        """
+        Greedy action, or epsilon-greedy with the model's final exploration rate (like DQN.predict).
+        Masked models only ever pick allowed actions.
+        """
+        batch, vectorized = self._batch_size(obs)
+        if not deterministic and self.rng.random() < self.exploration_rate:
+            if self.masked:
+                actions = sample_allowed(obs[ACTION_MASK], self.rng)
+            else:
+                actions = self.rng.integers(0, self.n_actions, batch)
+        else:
+            actions = self.q_values(obs).argmax(axis=1)
+        if not vectorized:
+            return actions[0], state
+        return actions, state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a trained DQN for NumPy-only playback")
+    parser.add_argument("model", nargs="?", default="jazz_model", help="Saved stable-baselines3 model")
+    parser.add_argument("output", nargs="?", default=None, help="Output .npz (default: <model>.npz)")
+    args = parser.parse_args()
+
+    model_path = args.model[:-4] if args.model.endswith(".zip") else args.model
+    out_path = args.output or f"{model_path}.npz"
+    export_policy(model_path, out_path)
+    print(f"✅ Exported {model_path} to {out_path}")
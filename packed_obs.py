@@ -0,0 +1,93 @@
+import gymnasium as gym
+import numpy as np
+import torch as th
+import torch.nn.functional as F
+from gymnasium import spaces
+from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
+from jazz_env import JazzImprovisationEnv
+
+# === PACKED LAYOUT ===
+# One uint16 vector per observation instead of five Dict entries. Every field
+# round-trips exactly: the chord mask as 12 bits, progress as step / episode
+# length, and the float32 style seed split into its two 16-bit halves.
+CHORD_MASK = 0
+LAST_ACTION = 1
+HELD_DURATION = 2
+STEP = 3
+EPISODE_STEPS = 4
+STYLE_LO = 5
+STYLE_HI = 6
+PACKED_SIZE = 7
+
+_BITS = 1 << np.arange(12, dtype=np.uint16)
+
+
+def pack_obs(obs, step, episode_steps, out=None):
+    """
+    Packs a Dict observation into the uint16 layout above. `step` and
+    `episode_steps` are the integers step_progress was computed from.
+    """
+    packed = np.empty(PACKED_SIZE, dtype=np.uint16) if out is None else out
+    packed[CHORD_MASK] = _BITS[np.asarray(obs["chord_tones"]) != 0].sum()
+    packed[LAST_ACTION] = obs["last_action"]
+    packed[HELD_DURATION] = obs["held_duration"][0]
+    packed[STEP] = step
+    packed[EPISODE_STEPS] = episode_steps
+    packed[STYLE_LO:STYLE_HI + 1] = np.asarray(obs["style_seed"], dtype=np.float32).view(np.uint16)
+    return packed
+
+
+def unpack_obs(packed):
+    """
+    Inverse of pack_obs: the exact Dict observation the env returned
+    """
+    packed = np.asarray(packed, dtype=np.uint16)
+    return {
+        "chord_tones": ((packed[CHORD_MASK] & _BITS) != 0).astype(np.int8),
+        "held_duration": np.array([packed[HELD_DURATION]], dtype=np.float32),
+        "last_action": int(packed[LAST_ACTION]),
+        "step_progress": np.array([np.float32(packed[STEP]) / np.float32(packed[EPISODE_STEPS])], dtype=np.float32),
+        "style_seed": packed[STYLE_LO:STYLE_HI + 1].copy().view(np.float32)
+    }
+
+
+class PackedObservation(gym.ObservationWrapper):
+    """
+    Serves JazzImprovisationEnv observations in the packed layout, so the
+    replay buffer stores 14 bytes per observation
+    """
+
+    def __init__(self, env):
+        super(PackedObservation, self).__init__(env)
+        self.observation_space = spaces.Box(low=0, high=np.iinfo(np.uint16).max, shape=(PACKED_SIZE,),
+                                            dtype=np.uint16)
+
+    def observation(self, obs):
+        env = self.env.unwrapped
+        return pack_obs(obs, env.progress_step, env.steps_per_episode)
+
+
+class PackedObsExtractor(BaseFeaturesExtractor):
+    """
+    Unpacks the packed observation inside the network into the same 53 features
+    MultiInputPolicy builds from the Dict observation (keys in sorted order,
+    last_action one-hot). The Q-network therefore has the same layers and can
+    be exported with export_policy and played with Dict observations.
+    """
+
+    def __init__(self, observation_space):
+        self.unpacked_space = JazzImprovisationEnv().observation_space
+        self.n_actions = int(self.unpacked_space["last_action"].n)
+        super(PackedObsExtractor, self).__init__(observation_space, features_dim=12 + 1 + self.n_actions + 1 + 1)
+        self.register_buffer("bits", 1 << th.arange(12), persistent=False)
+
+    def forward(self, observations):
+        # The policy hands over the uint16 fields as exact floats
+        fields = observations.long()
+        chord_tones = ((fields[:, CHORD_MASK:CHORD_MASK + 1] & self.bits) != 0).float()
+        last_action = F.one_hot(fields[:, LAST_ACTION], num_classes=self.n_actions).float()
+        held = observations[:, HELD_DURATION:HELD_DURATION + 1]
+        progress = observations[:, STEP:STEP + 1] / observations[:, EPISODE_STEPS:EPISODE_STEPS + 1]
+        style_bits = (fields[:, STYLE_HI:STYLE_HI + 1] << 16) | fields[:, STYLE_LO:STYLE_LO + 1]
+        style = style_bits.int().view(th.float32)
+        return th.cat([chord_tones, held, last_action, progress, style], dim=1)
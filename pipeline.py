@@ -0,0 +1,137 @@
+import threading
+from collections import deque, namedtuple
+from latency import ENV_STEP, PREDICT
+
+# === PIPELINE CONFIGURATION ===
+LOOKAHEAD = 2  # Steps computed ahead of playback: more absorbs slow predictions, fewer reacts faster
+
+# One step ready for playback, as computed by the worker
+StepEvent = namedtuple("StepEvent", ["step", "action", "chord"])
+
+# Where the worker has to rewind to when queued steps are thrown away
+_RestorePoint = namedtuple("_RestorePoint", ["step", "env_state", "obs"])
+
+
+def _copy_obs(obs):
+    # Env observations live in reused buffers, so keep a private copy
+    return {key: value.copy() if hasattr(value, "copy") else value for key, value in obs.items()}
+
+
+class InferencePipeline:
+    """
+    Runs model.predict and env.step for a JazzSession in a worker thread, up to
+    `lookahead` steps ahead of playback, so the playback thread only dequeues
+    events and sends MIDI.
+
+    The worker is the only thread touching the env. A chord change flushes the
+    queue: the worker rewinds the env to the first step not yet played, applies
+    the new chord and recomputes from there.
+    """
+
+    def __init__(self, session, lookahead=LOOKAHEAD, deterministic=False):
+        self.session = session
+        self.lookahead = max(1, lookahead)
+        self.deterministic = deterministic
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._next_step = 0
+        self._generation = 0
+        self._flush_pending = False
+        self._restore = None
+        self._pending_chord = None
+        self._running = False
+        self._error = None
+        self._thread = None
+
+    def start(self, first_step=0):
+        self._next_step = first_step
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name="jazz-inference", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+
+    def get(self, timeout=None):
+        """
+        Next step to play, blocking until the worker has produced it
+        """
+        with self._cond:
+            while not self._queue:
+                if self._error:
+                    raise self._error
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("Inference worker fell behind playback")
+            event, _ = self._queue.popleft()
+            self._cond.notify_all()
+            return event
+
+    def change_chord(self, chord):
+        """
+        Thread-safe: discard queued steps and recompute them over `chord` (ID)
+        """
+        with self._cond:
+            if self._queue:
+                self._restore = self._queue[0][1]
+            self._queue.clear()
+            self._pending_chord = chord
+            self._generation += 1
+            self._flush_pending = True
+            self._cond.notify_all()
+
+    def _worker(self):
+        session = self.session
+        env = session.env
+        try:
+            while True:
+                with self._cond:
+                    while self._running and len(self._queue) >= self.lookahead and not self._flush_pending:
+                        self._cond.wait()
+                    if not self._running:
+                        return
+                    if self._flush_pending:
+                        if self._restore is not None:
+                            env.set_state(self._restore.env_state)
+                            session.obs = _copy_obs(self._restore.obs)
+                            self._next_step = self._restore.step
+                        if self._pending_chord is not None:
+                            env.set_manual_chord(self._pending_chord)
+                            # Re-read the observation so the next prediction already sees the new chord
+                            session.obs = env._get_obs()
+                        self._flush_pending = False
+                        self._restore = None
+                        self._pending_chord = None
+                    generation = self._generation
+                    step = self._next_step
+                    restore = _RestorePoint(step, env.get_state(), _copy_obs(session.obs))
+
+                # Compute outside the lock so playback can keep dequeuing
+                session.swap_model(step)
+                prof = session.profiler
+                if prof: start = prof.clock()
+                action, _ = session.policy.predict(session.obs, deterministic=self.deterministic)
+                if prof: predicted = prof.clock()
+                chord = env.current_chord
+                session.advance(action)
+                if prof:
+                    prof.record(step, PREDICT, predicted - start)
+                    prof.record(step, ENV_STEP, prof.clock() - predicted)
+
+                with self._cond:
+                    if generation != self._generation:
+                        # Flushed mid-computation: roll this step back too if nothing older was queued
+                        if self._restore is None:
+                            self._restore = restore
+                        continue
+                    self._queue.append((StepEvent(step, action, chord), restore))
+                    self._next_step = step + 1
+                    self._cond.notify_all()
+        except Exception as e:
+            with self._cond:
+                self._error = e
+                self._cond.notify_all()
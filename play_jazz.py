@@ -1,18 +1,30 @@
-import gymnasium as gym
-from stable_baselines3 import DQN
-from jazz_env import JazzImprovisationEnv
-import mido
-from mido import Message, MidiFile, MidiTrack
 import time
+_START = time.perf_counter()  # Startup time is measured from here
+
+from jazz_env import DEFAULT_CHORDS, JazzImprovisationEnv
+from chords import REGISTRY
+from progressions import STEPS_PER_BAR, Corpus, StreamProgressions, random_stream
+import mido
+from mido import Message
+import argparse
 import sys
 import random
-import subprocess
 import os
+import threading
+from scheduler import StepScheduler, print_report
+from chord_queue import ChordQueue, chord_report, print_chord_report
+from pipeline import LOOKAHEAD, InferencePipeline
+from numpy_policy import NumpyDQNPolicy, uses_action_masks
+from beam_search import BEAM_DEPTH, BUDGET_FRACTION, BeamSearchDecoder
+from hot_reload import ModelWatcher
+from midi_writer import CompactMidiWriter
+from render import render_mp3
+from latency import BACKING, ENV_STEP, FILE_WRITE, PREDICT, PRINT, SOLO_SEND, LatencyProfiler
+from latency import print_summary as print_latency_summary
 
 # === CONFIGURATION ===
 MODEL_PATH = "jazz_model"
 MIDI_FILENAME = "output/jam_session.mid"
-WAV_FILENAME = "output/jam_session.wav"
 MP3_FILENAME = "output/jam_session.mp3"
 SOUNDFONT = "/usr/share/soundfonts/FluidR3_GM.sf2"
 
@@ -21,352 +33,658 @@ BPM = 90
 STEPS_TO_PLAY = 128 * 4  # Total steps (32 bars at 16 steps per bar)
 BASE_STEP_DURATION = 60 / BPM / 4  # Duration of each 16th note in seconds
 TICKS_PER_STEP = 120  # MIDI ticks per step
+TRACK_SOLO = 0
+TRACK_BACKING = 1
+
+# Piano voicings for the left hand accompaniment and the chord each MIDI note
+# root selects in jam mode come from the chord registry (chords.json)
+
+
+def load_model(model_path=MODEL_PATH):
+    """
+    Loads the exported NumPy policy (<model>.npz) when there is one, so playback
+    doesn't need torch; otherwise falls back to the stable-baselines3 model.
+    Both only choose allowed actions when the model was trained with action masks.
+    """
+    if os.path.exists(f"{model_path}.npz"):
+        return NumpyDQNPolicy.load(f"{model_path}.npz")
+    from masked_dqn import MaskedDQN
+    return MaskedDQN.load(model_path)
+
+
+def make_env(model, progressions=None, seed=None):
+    """
+    A playback env for `model`: with action masks in the observation if it was trained on them
+    """
+    return JazzImprovisationEnv(progressions=progressions, seed=seed, mask_actions=uses_action_masks(model))
+
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+
+class JazzSession:
+    """
+    One improvisation session: the agent's solo (channel 0) over a piano backing
+    (channel 1), sent live to `out_port` when there is one and recorded to a MIDI file.
+    """
+
+    def __init__(self, env, model, out_port=None, style='SIMPLE', manual_control=False, bpm=BPM, lookahead=0,
+                 profile=False, verbose=True, beam=0, beam_depth=BEAM_DEPTH):
+        self.env = env
+        self.model = model
+        self.out_port = out_port
+        self.style = style
+        self.manual_control = manual_control
+        self.bpm = bpm
+        self.lookahead = lookahead  # Steps predicted ahead in a worker thread (0 = inline)
+        self.pipeline = None
+        self.profile = profile  # Time every step's phases (see latency.py)
+        self.verbose = verbose  # Print every played step
+        self.profiler = None
+        self.steps_played = 0
+        self.base_step_duration = 60 / bpm / 4  # Duration of each 16th note in seconds
+
+        # Actions come from the model directly, or from a beam search over simulated
+        # continuations that must finish within the shortest (swung) 16th note
+        self.policy = model
+        if beam > 0:
+            self.policy = BeamSearchDecoder(model, env, width=beam, depth=beam_depth,
+                                            budget=BUDGET_FRACTION * self.base_step_duration * 0.7)
+
+        # --- SETUP MIDI FILE ---
+        # Notes are recorded at absolute ticks and serialised on save()
+        self.midi = CompactMidiWriter(n_tracks=2, ticks_per_beat=480, tempo=mido.bpm2tempo(bpm))
+        # Set both tracks to piano (program 0)
+        self.midi.program_change(TRACK_SOLO, channel=0, program=0)
+        self.midi.program_change(TRACK_BACKING, channel=1, program=0)
+        self.tick = 0  # File position of the current step
 
-# Piano chord voicings for left hand accompaniment
-PIANO_VOICINGS = {
-    "Cm7": [36, 39, 43, 46], "F7": [29, 33, 39, 42],
-    "BbMaj7": [34, 38, 41, 45], "EbMaj7": [27, 31, 38, 43],
-    "Am7b5": [33, 36, 39, 43], "D7": [38, 42, 45, 48],
-    "Gm": [31, 34, 38, 41], "Dm7": [38, 41, 45, 48],
-    "G7": [31, 35, 38, 41], "CMaj7": [36, 40, 43, 47],
-    "C7b9": [36, 40, 46, 49], "Fdim7": [29, 32, 35, 38],
-    "Bb6": [34, 38, 41, 43], "E7alt": [28, 32, 38, 40]
-}
-
-# Map MIDI note roots to chord names for jam mode
-ROOT_TO_CHORD = {
-    0: "Cm7", 1: "C7b9", 2: "D7", 3: "EbMaj7",
-    4: "E7alt", 5: "F7", 6: "Fdim7", 7: "Gm",
-    8: "Am7b5", 9: "Am7b5", 10: "BbMaj7", 11: "G7"
-}
-
-# --- SETUP ---
-print(f"Loading Model: {MODEL_PATH}...")
-try:
-    env = JazzImprovisationEnv()
-    model = DQN.load(MODEL_PATH)
-except Exception as e:
-    print(f"Error: {e}")
-    sys.exit(1)
-
-# ==========================================
-# --- 1. AUDIO OUTPUT AUTO-SELECT ---
-# ==========================================
-print("\n--- 🎛️ SYSTEM CONFIG ---")
-try:
-    outputs = mido.get_output_names()
-except:
-    outputs = []
-
-# Look for FluidSynth or other software synth automatically
-output_port_name = next((n for n in outputs if "FLUID" in n or "Synth" in n), outputs[0] if outputs else None)
-out_port = mido.open_output(output_port_name) if output_port_name else None
-
-if out_port:
-    print(f"🔊 Audio Output: {output_port_name}")
-else:
-    print("❌ ERROR: No FluidSynth/Audio Output found!")
-
-# ==========================================
-# --- 2. MIDI INPUT PRIORITY LOGIC ---
-# ==========================================
-try:
-    inputs = mido.get_input_names()
-except:
-    inputs = []
-
-print("\n🎹 Scanning for MIDI Controllers...")
-input_port_name = None
-
-# Priority: Hardware controllers > VMPK (virtual keyboard) > Fallback
-hw_keywords = ["LPD8", "Keystation", "Arturia", "Akai", "USB", "MIDI 1"]
-
-# 1. Hardware Search - collect all hardware devices
-hardware_devices = []
-for name in inputs:
-    # Skip VMPK and Through ports during hardware detection
-    if any(kw in name for kw in hw_keywords) and "VMPK" not in name and "Midi Through" not in name:
-        hardware_devices.append(name)
-
-# If hardware found, let user choose
-if hardware_devices:
-    print(f"\n🎛️  Found {len(hardware_devices)} hardware device(s):")
-    for i, device in enumerate(hardware_devices, 1):
-        print(f"   {i}. {device}")
-
-    if len(hardware_devices) == 1:
-        print(f"\nUse this device? (y/n): ", end="")
-        choice = input().strip().lower()
-        if choice == 'y' or choice == 'yes' or choice == '':
-            input_port_name = hardware_devices[0]
-            print(f"✅ Selected: {input_port_name}")
-        else:
-            print("⏭️  Skipping hardware...")
-    else:
-        print(f"\nSelect device (1-{len(hardware_devices)}) or 0 to skip: ", end="")
-        try:
-            choice = int(input().strip())
-            if 1 <= choice <= len(hardware_devices):
-                input_port_name = hardware_devices[choice - 1]
-                print(f"✅ Selected: {input_port_name}")
-            else:
-                print("⏭️  Skipping hardware...")
-        except ValueError:
-            print("⏭️  Invalid input, skipping hardware...")
-
-# 2. VMPK Search
-if not input_port_name:
-    input_port_name = next((n for n in inputs if "VMPK" in n), None)
-    if input_port_name: print(f"   -> VMPK Found: {input_port_name}")
-
-# 3. Fallback
-if not input_port_name and inputs:
-    input_port_name = next((n for n in inputs if "Midi Through" in n), inputs[0])
-    print(f"   -> Fallback: {input_port_name}")
-
-
-# --- CONNECT INPUT ---
-# Callback function for Jam Mode - translates incoming MIDI notes to chord changes
-def midi_callback(msg):
-    if msg.type == 'note_on' and msg.velocity > 0:
-        root = msg.note % 12
-        new_chord = ROOT_TO_CHORD.get(root, "Cm7")
+        if out_port:
+            out_port.send(Message('program_change', channel=0, program=0))
+            out_port.send(Message('program_change', channel=1, program=0))
+
+        self.obs, _ = env.reset()
+        if manual_control:
+            # The chord only changes on user input, so the env must not follow its own progression
+            env.set_manual_chord(env.current_chord)
+            self.obs = env._get_obs()
+        self.active_note = None
+        self.active_chord_notes = []
+        self.active_arp_note = None
+        self.current_chord = None  # ID of the chord the backing last played
+        self.file_note = None  # (note, start tick) of the solo note sounding in the file
+        self.file_chord_notes = []
+        self.timing = {}
+
+        # Jam mode chord changes, applied by the playback loop between steps
+        self.chord_events = ChordQueue()
+        self.pending_chord = None  # Applied ChordEvent no note has sounded over yet
+        self.chord_latencies = []  # Input-to-sound seconds per applied chord change
+
+        # Hot reload: a loaded model waits here until the next bar starts
+        self._model_lock = threading.Lock()
+        self._next_model = None
+        self.model_swaps = []  # Timing of every swap (see swap_model)
+
+    def run(self, steps=STEPS_TO_PLAY):
+        # Real-time playback runs off absolute step deadlines; without a port there is nothing to wait for
+        scheduler = StepScheduler(self.bpm) if self.out_port else None
+        prof = self.profiler = LatencyProfiler(steps) if self.profile else None
+        if self.lookahead > 0:
+            self.pipeline = InferencePipeline(self, self.lookahead)
+            self.pipeline.start()
         try:
-            env.set_manual_chord(new_chord)
-            print(f"🎹 USER: {msg.note} -> \033[93m{new_chord}\033[0m")
-        except AttributeError:
-            pass  # In case env hasn't been updated yet
-
-
-in_port = None
-if input_port_name:
-    try:
-        # Open with callback for immediate response
-        in_port = mido.open_input(input_port_name, callback=midi_callback)
-        print(f"✅ CONNECTED INPUT: \033[92m{input_port_name}\033[0m")
-    except Exception as e:
-        print(f"❌ Failed to open input: {e}")
-else:
-    print("⚠️  No MIDI Input found.")
-
-# ==========================================
-# --- 3. MENU INTERFACE ---
-# ==========================================
-print("\n" + "=" * 30)
-print("      JAZZMATE SESSION")
-print("=" * 30)
-
-# Question 1: Who controls the chord progression?
-print("\n[1/2] Who selects the chords?")
-print("  1. System (Random automatic progression)")
-print("  2. User (Jam Mode with MIDI)")
-mode_choice = input(">> Choice (1 or 2): ").strip()
-
-MANUAL_CONTROL = (mode_choice == '2')
-
-if MANUAL_CONTROL and not in_port:
-    print("\n⚠️  WARNING: You chose Jam Mode but no controller was found!")
-    print("   Chords will stay stuck on the initial one (Cm7).")
-
-# Question 2: What backing style?
-print("\n[2/2] What backing style (Piano) do you want?")
-print("  1. Simple (Block Chords)")
-print("  2. Arpeggio (Rhythmic Arpeggios)")
-style_choice = input(">> Choice (1 or 2): ").strip()
-
-STYLE = 'ARPEGGIO' if style_choice == '2' else 'SIMPLE'
-
-print("\n🚀 STARTING SESSION...")
-if MANUAL_CONTROL:
-    print("🎹 Play notes on your controller now!")
-
-# ==========================================
-# --- SETUP MIDI FILE ---
-# ==========================================
-mid = MidiFile(ticks_per_beat=480)
-track_solo = MidiTrack()
-mid.tracks.append(track_solo)
-track_backing = MidiTrack()
-mid.tracks.append(track_backing)
-meta_tempo = mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(BPM))
-track_solo.append(meta_tempo)
-track_backing.append(meta_tempo)
-# Set both tracks to piano (program 0)
-track_solo.append(Message('program_change', channel=0, program=0))
-track_backing.append(Message('program_change', channel=1, program=0))
-
-if out_port:
-    out_port.send(Message('program_change', channel=0, program=0))
-    out_port.send(Message('program_change', channel=1, program=0))
-
-# ==========================================
-# --- MAIN LOOP ---
-# ==========================================
-obs, _ = env.reset()
-active_note = None
-active_chord_notes = []
-active_arp_note = None
-current_chord_name = "Cm7"
-file_chord_notes = []
-steps_since_chord_change = 0
-
-try:
-    for step in range(STEPS_TO_PLAY):
-        # 1. AGENT PREDICTION
-        action, _ = model.predict(obs, deterministic=False)
+            if scheduler: scheduler.start()
+            for step in range(steps):
+                self.apply_chord_events()
+                if not self.pipeline:
+                    self.swap_model(step)
+
+                # 1. AGENT PREDICTION (ahead of the step's deadline)
+                if prof: prof.begin(step)
+                if self.pipeline:
+                    event = self.pipeline.get()
+                    action, chord = event.action, event.chord
+                else:
+                    action, _ = self.policy.predict(self.obs, deterministic=False)
+                    chord = None
+                    if prof: prof.lap(PREDICT)
+
+                if scheduler: scheduler.wait(step)
+                if prof: prof.skip()
+                self.play_step(step, action, chord)
+
+                # 5. STEP ENVIRONMENT (the pipeline worker already did it)
+                if not self.pipeline:
+                    self.advance(action)
+                    if prof: prof.lap(ENV_STEP)
+                self.steps_played = step + 1
+
+            # Let the last step ring for its full duration
+            if scheduler: scheduler.wait(steps)
+
+        except KeyboardInterrupt:
+            print("\nStopping...")
+        finally:
+            if self.pipeline:
+                self.pipeline.stop()
+                self.pipeline = None
+
+        if scheduler:
+            self.timing = scheduler.report()
+            print_report(self.timing)
+        if self.manual_control:
+            chords = chord_report(self.chord_events.received, self.chord_latencies)
+            self.timing.update(chords)
+            print_chord_report(chords)
+        if prof:
+            print_latency_summary(prof.summary(self.steps_played))
+        if isinstance(self.policy, BeamSearchDecoder):
+            search = self.policy.stats()
+            print(f"🔎 Beam search: {search['mean_ms']:.2f} ms and depth {search['mean_depth']:.1f} per decision, "
+                  f"{search['timeouts']} of {search['decisions']} cut short by the time budget")
+        if self.model_swaps:
+            load_ms = max(swap["load_seconds"] for swap in self.model_swaps) * 1000
+            swap_us = max(swap["swap_seconds"] for swap in self.model_swaps) * 1e6
+            print(f"🔁 {len(self.model_swaps)} model swaps: loading took up to {load_ms:.0f} ms off the playback "
+                  f"thread, swapping up to {swap_us:.0f} µs")
+
+    def offer_model(self, model, info):
+        """
+        Thread-safe: plays `model` from the next bar on. Called by a ModelWatcher with
+        `info` about the load; a newer offer replaces one that wasn't swapped in yet.
+        """
+        if uses_action_masks(model) != self.env.mask_actions:
+            print(f"⚠️  Ignoring {info['path']}: its action masks don't match the playing model's")
+            return
+        # The first predict is the slowest, so it happens here rather than on a deadline
+        model.predict(self.env.observation_space.sample(), deterministic=True)
+        info["ready"] = time.perf_counter()
+        print(f"🔄 Loaded {info['path']} in {info['load_seconds'] * 1000:.0f} ms, playing it from the next bar")
+        with self._model_lock:
+            self._next_model = (model, info)
+
+    def swap_model(self, step):
+        """
+        Switches to the offered model if `step` starts a bar. Runs on the thread that
+        predicts (playback, or the pipeline worker) between two predictions, and only
+        swaps references, so no step waits for it.
+        """
+        if self._next_model is None or step % STEPS_PER_BAR:
+            return
+        start = time.perf_counter()
+        with self._model_lock:
+            (model, info), self._next_model = self._next_model, None
+        self.model = model
+        if isinstance(self.policy, BeamSearchDecoder):
+            self.policy.use_model(model)
+        else:
+            self.policy = model
+        swapped = time.perf_counter()
+        info.update(step=step, wait_seconds=start - info["ready"], swap_seconds=swapped - start)
+        self.model_swaps.append(info)
+        if self.verbose:
+            print(f"🔁 Swapped to {os.path.basename(info['path'])} at bar {step // STEPS_PER_BAR + 1} "
+                  f"({info['wait_seconds'] * 1000:.0f} ms after it was ready, swap {info['swap_seconds'] * 1e6:.0f} µs)")
+
+    def set_chord(self, chord):
+        """
+        Jam mode chord change (ID or name). Safe to call from any thread: the change
+        is queued with its arrival time and applied at the next step boundary.
+        """
+        self.chord_events.put(chord)
+
+    def apply_chord_events(self):
+        """
+        Applies the latest queued chord change; a burst of changes collapses into its last
+        known chord (unknown names are skipped). With the pipeline, steps computed over the old chord are recomputed.
+        """
+        event = self.chord_events.drain(REGISTRY.get)
+        if event is None:
+            return
+
+        chord = event.chord
+        self.pending_chord = event
+        if self.pipeline:
+            self.pipeline.change_chord(chord)
+        else:
+            self.env.set_manual_chord(chord)
+            # Re-read the observation so the next prediction already sees the new chord
+            self.obs = self.env._get_obs()
+
+    def play_step(self, step, action, chord=None):
+        """
+        Plays one 16th-note step (backing, solo and file output) and returns its swung duration in seconds.
+        `chord` is the ID of the chord the action was computed over, the env's current chord by default.
+        """
+        out_port = self.out_port
+        prof = self.profiler
 
         # Apply swing timing - long on beats 1 and 3, short on 2 and 4
         is_swing_long = (step % 2 == 0)
         swing_factor = 1.3 if is_swing_long else 0.7
         current_step_ticks = int(TICKS_PER_STEP * swing_factor)
-        current_step_time = BASE_STEP_DURATION * swing_factor
+        current_step_time = self.base_step_duration * swing_factor
 
         is_note = action < 36
         is_rest = action == 36
         is_hold = action == 37
         note_val = 48 + int(action) if is_note else None
 
-        env_chord = env.current_chord_name
-        chord_notes = PIANO_VOICINGS.get(env_chord, [36, 40, 43])
+        env_chord = self.env.current_chord if chord is None else chord
+        chord_notes = REGISTRY.voicings[env_chord]
+        backing_started = False
 
         # 2. LEFT HAND (BACKING) LOGIC
-        if STYLE == 'SIMPLE':
+        if self.style == 'SIMPLE':
             # --- BLOCK CHORDS ---
             # Play a new chord only when the chord name changes (from auto or manual input)
             # or if it's the first step
-            if env_chord != current_chord_name or step == 0:
+            if env_chord != self.current_chord or step == 0:
                 if out_port:
-                    for n in active_chord_notes:
+                    for n in self.active_chord_notes:
                         out_port.send(Message('note_off', channel=1, note=n, velocity=0))
                     for n in chord_notes:
                         vel = random.randint(80, 95)
                         out_port.send(Message('note_on', channel=1, note=n, velocity=vel))
-                    active_chord_notes = chord_notes
+                    self.active_chord_notes = chord_notes
+                if prof: prof.lap(BACKING)
 
                 # File Logic
-                if file_chord_notes:
-                    duration_ticks = steps_since_chord_change * TICKS_PER_STEP
-                    track_backing.append(
-                        Message('note_off', channel=1, note=file_chord_notes[0], velocity=0, time=duration_ticks))
-                    for n in file_chord_notes[1:]:
-                        track_backing.append(Message('note_off', channel=1, note=n, velocity=0, time=0))
-
+                self._close_file_chord()
                 for n in chord_notes:
-                    track_backing.append(Message('note_on', channel=1, note=n, velocity=90, time=0))
-
-                file_chord_notes = chord_notes
-                steps_since_chord_change = 0
-                current_chord_name = env_chord
+                    self.midi.note_on(TRACK_BACKING, 1, n, 90, self.tick)
 
-            steps_since_chord_change += 1
+                self.file_chord_notes = chord_notes
+                self.current_chord = env_chord
+                backing_started = True
+                if prof: prof.lap(FILE_WRITE)
 
-        elif STYLE == 'ARPEGGIO':
+        elif self.style == 'ARPEGGIO':
             # --- ARPEGGIATOR ---
-            current_chord_name = env_chord
+            self.current_chord = env_chord
 
             # Stop previous arp note
-            if active_arp_note is not None:
-                if out_port: out_port.send(Message('note_off', channel=1, note=active_arp_note, velocity=0))
-                track_backing.append(
-                    Message('note_off', channel=1, note=active_arp_note, velocity=0, time=current_step_ticks))
-                active_arp_note = None
-            else:
-                track_backing.append(Message('note_off', channel=1, note=0, velocity=0, time=current_step_ticks))
+            if self.active_arp_note is not None:
+                if out_port: out_port.send(Message('note_off', channel=1, note=self.active_arp_note, velocity=0))
+                self.active_arp_note = None
 
-            # Play new note every 2 steps (8th notes)
+            # Play new note every 2 steps (8th notes); it sounds for this step only
             if step % 2 == 0:
                 note_idx = (step // 2) % len(chord_notes)
                 arp_note_val = chord_notes[note_idx]
                 vel = random.randint(85, 100)
                 if out_port: out_port.send(Message('note_on', channel=1, note=arp_note_val, velocity=vel))
-                track_backing.append(Message('note_on', channel=1, note=arp_note_val, velocity=vel, time=0))
-                active_arp_note = arp_note_val
-            else:
-                track_backing.append(Message('note_off', channel=1, note=0, velocity=0, time=0))
+                if prof: prof.lap(BACKING)
+                self.midi.note(TRACK_BACKING, 1, arp_note_val, vel, self.tick, current_step_ticks)
+                self.active_arp_note = arp_note_val
+                backing_started = True
+                if prof: prof.lap(FILE_WRITE)
+
+        if prof: prof.lap(BACKING)
 
         # 3. RIGHT HAND (SOLO) LOGIC
         if out_port:
-            if active_note is not None and not is_hold:
-                out_port.send(Message('note_off', channel=0, note=active_note, velocity=0))
-                active_note = None
+            if self.active_note is not None and not is_hold:
+                out_port.send(Message('note_off', channel=0, note=self.active_note, velocity=0))
+                self.active_note = None
 
+            prefix = "🎷 AGENT:" if self.manual_control else "Melody:"
+            bar = (step // 16) + 1
             if is_note:
                 # Adjust velocity based on pitch (higher notes = louder for clarity)
                 pitch_boost = (note_val - 60) // 2
                 base_vel = random.randint(110, 127)
                 final_vel = min(127, max(1, base_vel + pitch_boost))
                 out_port.send(Message('note_on', channel=0, note=note_val, velocity=final_vel))
-                active_note = note_val
+                self.active_note = note_val
 
-                note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
                 octave = (action // 12) + 3
-                name = note_names[action % 12]
-                bar = (step // 16) + 1
-
-                # Always display what the agent is playing
-                prefix = "🎷 AGENT:" if MANUAL_CONTROL else "Melody:"
-                print(f"Bar {bar} | Chord: {current_chord_name:7s} | {prefix} \033[96m{name}{octave}\033[0m")
-
+                name = NOTE_NAMES[action % 12]
+                played = f"\033[96m{name}{octave}\033[0m"
             elif is_rest:
-                prefix = "🎷 AGENT:" if MANUAL_CONTROL else "Melody:"
-                print(f"Bar {(step // 16) + 1} | Chord: {current_chord_name:7s} | {prefix} ---")
-            elif is_hold:
-                prefix = "🎷 AGENT:" if MANUAL_CONTROL else "Melody:"
-                print(f"Bar {(step // 16) + 1} | Chord: {current_chord_name:7s} | {prefix} ...")
+                played = "---"
+            else:
+                played = "..."
+            if prof: prof.lap(SOLO_SEND)
+
+            # Display what the agent is playing
+            if self.verbose:
+                print(f"Bar {bar} | Chord: {REGISTRY.names[self.current_chord]:7s} | {prefix} {played}")
+            if prof: prof.lap(PRINT)
 
         # 4. FILE SOLO LOGIC
+        # A note lasts through any hold steps after it, so a held note is written as one longer note
+        if not is_hold:
+            self._close_file_note()
         if is_note:
-            track_solo.append(Message('note_on', channel=0, note=note_val, velocity=110, time=0))
-            track_solo.append(Message('note_off', channel=0, note=note_val, velocity=0, time=current_step_ticks))
+            self.file_note = (note_val, self.tick)
+
+        self.tick += current_step_ticks
+        if prof: prof.lap(FILE_WRITE)
+
+        # The first note over a newly applied chord is when the player hears the change
+        pending = self.pending_chord
+        if pending and (is_note or backing_started) and env_chord == pending.chord:
+            latency = time.perf_counter() - pending.time
+            self.chord_latencies.append(latency)
+            self.pending_chord = None
+            if prof: prof.chord_change(latency)
+        return current_step_time
+
+    def advance(self, action):
+        env = self.env
+        if self.manual_control:
+            # In manual mode, the chord only changes via set_chord (the env is in manual mode)
+            # We step to advance time/history, but keep the user's chord selection
+            self.obs, _, _, _, _ = env.step(action)
         else:
-            track_solo.append(Message('note_off', channel=0, note=0, velocity=0, time=current_step_ticks))
+            # In auto mode, let the environment change chords
+            self.obs, _, done, _, _ = env.step(action)
+            if done: self.obs, _ = env.reset()
+
+    def _close_file_note(self):
+        if self.file_note:
+            note, start = self.file_note
+            self.midi.note(TRACK_SOLO, 0, note, 110, start, self.tick - start)
+            self.file_note = None
+
+    def _close_file_chord(self):
+        for n in self.file_chord_notes:
+            self.midi.note_off(TRACK_BACKING, 1, n, self.tick)
+
+    def stop(self):
+        # Cleanup - stop all playing notes
+        out_port = self.out_port
+        if out_port:
+            if self.active_note: out_port.send(Message('note_off', channel=0, note=self.active_note, velocity=0))
+            for n in self.active_chord_notes: out_port.send(Message('note_off', channel=1, note=n, velocity=0))
+            if self.active_arp_note: out_port.send(Message('note_off', channel=1, note=self.active_arp_note, velocity=0))
 
-        if out_port: time.sleep(current_step_time)
+        # Close file buffers
+        self._close_file_note()
+        self._close_file_chord()
+        self.file_chord_notes = []
+        self.midi.end_track(TRACK_SOLO, self.tick)
+        self.midi.end_track(TRACK_BACKING, self.tick)
 
-        # 5. STEP ENVIRONMENT
-        if MANUAL_CONTROL:
-            # In manual mode, the chord only changes via the callback
-            # We step to advance time/history, but keep the user's chord selection
-            saved_chord = env.current_chord_name
-            obs, _, _, _, _ = env.step(action)
-            env.current_chord_name = saved_chord  # Restore user's chord choice
+    def save(self, filename=MIDI_FILENAME):
+        self.midi.save(filename)
+
+
+# ==========================================
+# --- 1. AUDIO OUTPUT AUTO-SELECT ---
+# ==========================================
+def open_output_port(output_port_name=None):
+    print("\n--- 🎛️ SYSTEM CONFIG ---")
+    if not output_port_name:
+        try:
+            outputs = mido.get_output_names()
+        except:
+            outputs = []
+
+        # Look for FluidSynth or other software synth automatically
+        output_port_name = next((n for n in outputs if "FLUID" in n or "Synth" in n), outputs[0] if outputs else None)
+
+    try:
+        out_port = mido.open_output(output_port_name) if output_port_name else None
+    except Exception as e:
+        print(f"❌ Failed to open output: {e}")
+        out_port = None
+
+    if out_port:
+        print(f"🔊 Audio Output: {output_port_name}")
+    else:
+        print("❌ ERROR: No FluidSynth/Audio Output found!")
+    return out_port
+
+
+# ==========================================
+# --- 2. MIDI INPUT PRIORITY LOGIC ---
+# ==========================================
+def find_input_port_name(interactive=True):
+    try:
+        inputs = mido.get_input_names()
+    except:
+        inputs = []
+
+    print("\n🎹 Scanning for MIDI Controllers...")
+    input_port_name = None
+
+    # Priority: Hardware controllers > VMPK (virtual keyboard) > Fallback
+    hw_keywords = ["LPD8", "Keystation", "Arturia", "Akai", "USB", "MIDI 1"]
+
+    # 1. Hardware Search - collect all hardware devices
+    hardware_devices = []
+    for name in inputs:
+        # Skip VMPK and Through ports during hardware detection
+        if any(kw in name for kw in hw_keywords) and "VMPK" not in name and "Midi Through" not in name:
+            hardware_devices.append(name)
+
+    # Non-interactive runs take the first hardware device
+    if hardware_devices and not interactive:
+        input_port_name = hardware_devices[0]
+        print(f"✅ Selected: {input_port_name}")
+
+    # If hardware found, let user choose
+    elif hardware_devices:
+        print(f"\n🎛️  Found {len(hardware_devices)} hardware device(s):")
+        for i, device in enumerate(hardware_devices, 1):
+            print(f"   {i}. {device}")
+
+        if len(hardware_devices) == 1:
+            print(f"\nUse this device? (y/n): ", end="")
+            choice = input().strip().lower()
+            if choice == 'y' or choice == 'yes' or choice == '':
+                input_port_name = hardware_devices[0]
+                print(f"✅ Selected: {input_port_name}")
+            else:
+                print("⏭️  Skipping hardware...")
         else:
-            # In auto mode, let the environment change chords
-            obs, _, done, _, _ = env.step(action)
-            if done: obs, _ = env.reset()
-
-except KeyboardInterrupt:
-    print("\nStopping...")
-
-# Cleanup - stop all playing notes
-if out_port:
-    if active_note: out_port.send(Message('note_off', channel=0, note=active_note, velocity=0))
-    for n in active_chord_notes: out_port.send(Message('note_off', channel=1, note=n, velocity=0))
-    if active_arp_note: out_port.send(Message('note_off', channel=1, note=active_arp_note, velocity=0))
-    out_port.close()
-if in_port: in_port.close()
-
-# Close file buffers
-if file_chord_notes:
-    duration_ticks = steps_since_chord_change * TICKS_PER_STEP
-    track_backing.append(Message('note_off', channel=1, note=file_chord_notes[0], velocity=0, time=duration_ticks))
-    for n in file_chord_notes[1:]:
-        track_backing.append(Message('note_off', channel=1, note=n, velocity=0, time=0))
-
-mid.save(MIDI_FILENAME)
-print(f"\n✅ MIDI saved to {MIDI_FILENAME}")
-
-print("\n--- RENDERING AUDIO ---")
-if os.path.exists(SOUNDFONT):
+            print(f"\nSelect device (1-{len(hardware_devices)}) or 0 to skip: ", end="")
+            try:
+                choice = int(input().strip())
+                if 1 <= choice <= len(hardware_devices):
+                    input_port_name = hardware_devices[choice - 1]
+                    print(f"✅ Selected: {input_port_name}")
+                else:
+                    print("⏭️  Skipping hardware...")
+            except ValueError:
+                print("⏭️  Invalid input, skipping hardware...")
+
+    # 2. VMPK Search
+    if not input_port_name:
+        input_port_name = next((n for n in inputs if "VMPK" in n), None)
+        if input_port_name: print(f"   -> VMPK Found: {input_port_name}")
+
+    # 3. Fallback
+    if not input_port_name and inputs:
+        input_port_name = next((n for n in inputs if "Midi Through" in n), inputs[0])
+        print(f"   -> Fallback: {input_port_name}")
+
+    return input_port_name
+
+
+# --- CONNECT INPUT ---
+def make_midi_callback(set_chord):
+    # Callback function for Jam Mode - translates incoming MIDI notes to chord changes
+    def midi_callback(msg):
+        if msg.type == 'note_on' and msg.velocity > 0:
+            root = msg.note % 12
+            new_chord = REGISTRY.jam_roots[root]
+            try:
+                set_chord(new_chord)
+                print(f"🎹 USER: {msg.note} -> \033[93m{REGISTRY.names[new_chord]}\033[0m")
+            except AttributeError:
+                pass  # In case env hasn't been updated yet
+
+    return midi_callback
+
+
+def open_input_port(input_port_name, callback):
+    in_port = None
+    if input_port_name:
+        try:
+            # Open with callback for immediate response
+            in_port = mido.open_input(input_port_name, callback=callback)
+            print(f"✅ CONNECTED INPUT: \033[92m{input_port_name}\033[0m")
+        except Exception as e:
+            print(f"❌ Failed to open input: {e}")
+    else:
+        print("⚠️  No MIDI Input found.")
+    return in_port
+
+
+def render_audio(midi_filename=MIDI_FILENAME, mp3_filename=MP3_FILENAME, soundfont=SOUNDFONT):
+    print("\n--- RENDERING AUDIO ---")
+    if os.path.exists(soundfont):
+        try:
+            # FluidSynth streams straight into the MP3 encoder; identical sessions come from the cache
+            cached = render_mp3(midi_filename, mp3_filename, soundfont)
+            print(f"✅ \033[92mSUCCESS: {mp3_filename} created{' (cached)' if cached else ''}!\033[0m")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+    else:
+        print(f"❌ SoundFont not found.")
+
+
+def make_progressions(corpus=None, endless=False):
+    """
+    Progression source for auto mode: None keeps the env's 8-bar random progressions
+    """
+    if corpus:
+        return StreamProgressions(Corpus(corpus).stream)
+    if endless:
+        return StreamProgressions(lambda rng: random_stream(DEFAULT_CHORDS, rng=rng))
+    return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Play or jam with the JazzMate agent. "
+                                                 "Options left out are asked for interactively.")
+    parser.add_argument("--mode", choices=["auto", "jam"], help="auto: system picks chords, jam: MIDI controller does")
+    parser.add_argument("--style", choices=["simple", "arpeggio"], help="Piano backing style")
+    parser.add_argument("--output-port", help="MIDI output port name (default: auto-detect FluidSynth)")
+    parser.add_argument("--no-output", action="store_true", help="Don't play live, only write files (runs unthrottled)")
+    parser.add_argument("--input-port", help="MIDI input port name for jam mode (default: auto-detect)")
+    parser.add_argument("--bpm", type=float, default=BPM)
+    parser.add_argument("--steps", type=int, default=STEPS_TO_PLAY, help="16th-note steps to play")
+    parser.add_argument("--corpus", help="Auto mode: play over tunes from a corpus index, back to back")
+    parser.add_argument("--endless", action="store_true",
+                        help="Auto mode: one endless random progression instead of a new one every 8 bars")
+    parser.add_argument("--lookahead", type=int, default=LOOKAHEAD, help="Steps predicted ahead (0 = inline)")
+    parser.add_argument("--beam", type=int, default=0,
+                        help="Beam width: pick actions by simulating continuations (0 = sample the model)")
+    parser.add_argument("--beam-depth", type=int, default=BEAM_DEPTH, help="Steps the beam search looks ahead")
+    parser.add_argument("--model", default=MODEL_PATH, help="Model path without extension (.npz or .zip)")
+    parser.add_argument("--watch", nargs="?", const="", metavar="PATH",
+                        help="Hot-reload new models from PATH (a model path or a train.py checkpoint directory; "
+                             "default: --model) at the next bar")
+    parser.add_argument("--midi-out", default=MIDI_FILENAME)
+    parser.add_argument("--mp3-out", default=MP3_FILENAME)
+    parser.add_argument("--soundfont", default=SOUNDFONT)
+    parser.add_argument("--no-render", action="store_true", help="Skip the MP3 render")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every step's phases and save histograms next to the MIDI file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    interactive = args.mode is None or args.style is None
+
+    # --- SETUP ---
+    print(f"Loading Model: {args.model}...")
     try:
-        # Convert MIDI to WAV using FluidSynth, then to MP3
-        subprocess.run(["fluidsynth", "-ni", "-g", "1.5", "-F", WAV_FILENAME, SOUNDFONT, MIDI_FILENAME],
-                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        subprocess.run(["ffmpeg", "-y", "-i", WAV_FILENAME, "-acodec", "libmp3lame", "-q:a", "2", MP3_FILENAME],
-                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        print(f"✅ \033[92mSUCCESS: {MP3_FILENAME} created!\033[0m")
-        os.remove(WAV_FILENAME)
+        model = load_model(args.model)
+        env = make_env(model, make_progressions(args.corpus, args.endless))
     except Exception as e:
-        print(f"❌ Error: {e}")
-else:
-    print(f"❌ SoundFont not found.")
\ No newline at end of file
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    out_port = None if args.no_output else open_output_port(args.output_port)
+
+    # Chord changes go through the session once it exists
+    session = None
+
+    def set_chord(chord):
+        if session:
+            session.set_chord(chord)
+
+    # Auto mode never reads MIDI input, so don't even scan for it
+    in_port = None
+    if args.mode != "auto":
+        input_port_name = args.input_port or find_input_port_name(interactive)
+        in_port = open_input_port(input_port_name, make_midi_callback(set_chord))
+
+    # ==========================================
+    # --- 3. MENU INTERFACE ---
+    # ==========================================
+    if interactive:
+        print("\n" + "=" * 30)
+        print("      JAZZMATE SESSION")
+        print("=" * 30)
+
+    # Question 1: Who controls the chord progression?
+    if args.mode is None:
+        print("\n[1/2] Who selects the chords?")
+        print("  1. System (Random automatic progression)")
+        print("  2. User (Jam Mode with MIDI)")
+        mode_choice = input(">> Choice (1 or 2): ").strip()
+        args.mode = 'jam' if mode_choice == '2' else 'auto'
+
+    manual_control = (args.mode == 'jam')
+
+    if manual_control and not in_port:
+        print("\n⚠️  WARNING: You chose Jam Mode but no controller was found!")
+        print("   Chords will stay stuck on the initial one (Cm7).")
+
+    # Question 2: What backing style?
+    if args.style is None:
+        print("\n[2/2] What backing style (Piano) do you want?")
+        print("  1. Simple (Block Chords)")
+        print("  2. Arpeggio (Rhythmic Arpeggios)")
+        style_choice = input(">> Choice (1 or 2): ").strip()
+        args.style = 'arpeggio' if style_choice == '2' else 'simple'
+
+    style = args.style.upper()
+
+    if not interactive:
+        print(f"\n⚡ Startup: {(time.perf_counter() - _START) * 1000:.0f} ms")
+    print("\n🚀 STARTING SESSION...")
+    if manual_control:
+        print("🎹 Play notes on your controller now!")
+
+    # ==========================================
+    # --- MAIN LOOP ---
+    # ==========================================
+    session = JazzSession(env, model, out_port, style=style, manual_control=manual_control,
+                          bpm=args.bpm, lookahead=args.lookahead, profile=args.profile, beam=args.beam,
+                          beam_depth=args.beam_depth)
+    watcher = None
+    if args.watch is not None:
+        watcher = ModelWatcher(args.watch or args.model, session.offer_model)
+        watcher.start()
+        print(f"👀 Watching {watcher.path} for new models")
+    session.run(args.steps)
+    if watcher: watcher.stop()
+    session.stop()
+
+    if out_port: out_port.close()
+    if in_port: in_port.close()
+
+    os.makedirs(os.path.dirname(args.midi_out) or ".", exist_ok=True)
+    session.save(args.midi_out)
+    print(f"\n✅ MIDI saved to {args.midi_out}")
+
+    if session.profiler:
+        prefix = os.path.splitext(args.midi_out)[0] + "_latency"
+        json_path, csv_path = session.profiler.save(prefix, session.steps_played)
+        print(f"✅ Step latency saved to {json_path} and {csv_path}")
+
+    if not args.no_render:
+        render_audio(args.midi_out, args.mp3_out, args.soundfont)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import random
+from array import array
+import numpy as np
+from chords import REGISTRY
+
+# === PROGRESSION CONFIGURATION ===
+STEPS_PER_BEAT = 4  # 16th-note steps
+STEPS_PER_BAR = 16
+BARS = 8  # Bars in a random progression (one chord per bar)
+PROGRESS_WINDOW = 128  # Steps the step_progress observation counts through on endless progressions
+
+
+class Progression:
+    """
+    A chord progression as (chord ID, duration in steps) segments, read by the env
+    through a segment index. Built from lists, or from a generator whose segments
+    are pulled only when playback reaches them, so it can be endless.
+    """
+
+    def __init__(self, chords=(), durations=(), stream=None):
+        self.chords = array('h', chords)
+        self.durations = array('H', durations)
+        if len(self.chords) != len(self.durations):
+            raise ValueError("Every chord needs a duration")
+        if 0 in self.durations:
+            raise ValueError("Chord durations must be at least one step")
+        self._stream = None if stream is None else iter(stream)
+        self.length = None if stream is not None else sum(self.durations)  # Steps, None while endless
+
+    def segment(self, index):
+        """
+        (chord ID, duration) of segment `index`, or None after the last one
+        """
+        while index >= len(self.chords) and self._stream is not None:
+            try:
+                chord, duration = next(self._stream)
+            except StopIteration:
+                self._stream = None
+                break
+            if duration < 1:
+                raise ValueError("Chord durations must be at least one step")
+            # Earlier segments never change, so saved env states stay valid as the stream grows
+            self.chords.append(REGISTRY.id(chord))
+            self.durations.append(duration)
+        if index >= len(self.chords):
+            return None
+        return self.chords[index], self.durations[index]
+
+    def __iter__(self):
+        index = 0
+        while True:
+            segment = self.segment(index)
+            if segment is None:
+                return
+            yield segment
+            index += 1
+
+
+class RandomProgressions:
+    """
+    The env's default: `bars` random chords of one bar each, drawn from the env's RNG
+    """
+
+    def __init__(self, chords, bars=BARS, steps_per_chord=STEPS_PER_BAR):
+        self.chords = list(chords)
+        self.bars = bars
+        self.steps_per_chord = steps_per_chord
+
+    def sample(self, rng=random):
+        chords = [rng.choice(self.chords) for _ in range(self.bars)]
+        return Progression(chords, [self.steps_per_chord] * self.bars)
+
+
+class StreamProgressions:
+    """
+    One endless (or arbitrarily long) progression per episode, from a generator
+    function make_stream(rng) yielding (chord, duration in steps) pairs.
+
+    Each stream gets its own RNG, seeded from the env's: segments are pulled by
+    whichever copy of the env reaches them first (see JazzImprovisationEnv.clone),
+    so they must not draw from the env's RNG.
+    """
+
+    def __init__(self, make_stream):
+        self.make_stream = make_stream
+
+    def sample(self, rng=random):
+        return Progression(stream=self.make_stream(random.Random(rng.getrandbits(64))))
+
+
+def random_stream(chords, steps_per_chord=STEPS_PER_BAR, rng=random):
+    """
+    Endless random changes, one chord per bar
+    """
+    chords = list(chords)
+    while True:
+        yield rng.choice(chords), steps_per_chord
+
+
+class Corpus:
+    """
+    Tunes from an index written by build_corpus, memory-mapped so a corpus of
+    millions of tunes costs a few bytes per chord on disk and nothing in Python
+    objects until a tune is drawn.
+
+    With `transpose`, every drawn tune is moved to a random key.
+    """
+
+    def __init__(self, path, transpose=False):
+        self.path = path
+        self.transpose = transpose
+        self.chords = np.load(os.path.join(path, "chords.npy"), mmap_mode="r")
+        self.durations = np.load(os.path.join(path, "durations.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")  # Tune i: offsets[i]:offsets[i+1]
+        self.title_bytes = np.load(os.path.join(path, "titles.npy"), mmap_mode="r")
+        self.title_offsets = np.load(os.path.join(path, "title_offsets.npy"), mmap_mode="r")
+
+        # Chord IDs in the index are those of the registry it was built with
+        with open(os.path.join(path, "names.json")) as f:
+            names = json.load(f)
+        unknown = [name for name in names if name not in REGISTRY]
+        if unknown:
+            raise ValueError(f"Corpus {path} uses chords missing from chords.json: {unknown}")
+        self._ids = np.array([REGISTRY.id(name) for name in names], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def title(self, index):
+        start, end = self.title_offsets[index], self.title_offsets[index + 1]
+        return bytes(self.title_bytes[start:end]).decode("utf-8")
+
+    def tune(self, index, semitones=0):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        chords = self._ids[self.chords[start:end]]
+        if semitones:
+            chords = chords - chords % 12 + (chords + semitones) % 12
+        return Progression(chords.tolist(), self.durations[start:end].tolist())
+
+    def sample(self, rng=random):
+        index = rng.randrange(len(self))
+        return self.tune(index, rng.randrange(12) if self.transpose else 0)
+
+    def stream(self, rng=random):
+        """
+        Randomly drawn tunes back to back, forever
+        """
+        while True:
+            yield from self.sample(rng)
+
+
+def parse_tune(line):
+    """
+    "Title | Cm7 F7 BbMaj7:2 Eb7:2" -> (title, [(chord ID, steps)]).
+    A chord lasts one bar unless followed by :<beats>.
+    """
+    title, _, changes = line.rpartition("|")
+    segments = []
+    for token in changes.split():
+        name, _, beats = token.partition(":")
+        if name not in REGISTRY:
+            raise ValueError(f"Unknown chord '{name}'")
+        steps = int(beats) * STEPS_PER_BEAT if beats else STEPS_PER_BAR
+        if steps < 1:
+            raise ValueError(f"Chord '{token}' has no duration")
+        segments.append((REGISTRY.id(name), steps))
+    if not segments:
+        raise ValueError("Tune has no chords")
+    return title.strip(), segments
+
+
+def build_corpus(text_path, out_dir):
+    """
+    Compiles a text corpus (one tune per line, see parse_tune; '#' starts a comment)
+    into the memory-mapped index read by Corpus. Returns (tunes, segments).
+    """
+    chords, durations, offsets = array('h'), array('H'), array('q', [0])
+    titles, title_offsets = bytearray(), array('q', [0])
+    with open(text_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                title, segments = parse_tune(line)
+            except ValueError as e:
+                raise ValueError(f"{text_path}:{line_number}: {e}") from None
+            for chord, steps in segments:
+                chords.append(chord)
+                durations.append(steps)
+            offsets.append(len(chords))
+            titles.extend(title.encode("utf-8"))
+            title_offsets.append(len(titles))
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "chords.npy"), np.frombuffer(chords, dtype=np.int16))
+    np.save(os.path.join(out_dir, "durations.npy"), np.frombuffer(durations, dtype=np.uint16))
+    np.save(os.path.join(out_dir, "offsets.npy"), np.frombuffer(offsets, dtype=np.int64))
+    np.save(os.path.join(out_dir, "titles.npy"), np.frombuffer(bytes(titles), dtype=np.uint8))
+    np.save(os.path.join(out_dir, "title_offsets.npy"), np.frombuffer(title_offsets, dtype=np.int64))
+    with open(os.path.join(out_dir, "names.json"), "w") as f:
+        json.dump(REGISTRY.names, f)
+    return len(offsets) - 1, len(chords)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a text corpus of chord progressions into a "
+                                                 "memory-mapped index")
+    parser.add_argument("corpus", help="Text file, one tune per line: Title | Cm7 F7 BbMaj7:2 Eb7:2")
+    parser.add_argument("out_dir", help="Index directory (pass it to --corpus)")
+    args = parser.parse_args()
+
+    tunes, segments = build_corpus(args.corpus, args.out_dir)
+    print(f"✅ {tunes:,} tunes ({segments:,} chords) indexed in {args.out_dir}")
@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# === RENDER CONFIGURATION ===
+SOUNDFONT = "/usr/share/soundfonts/FluidR3_GM.sf2"
+GAIN = 1.5
+SAMPLE_RATE = 44100
+CACHE_DIR = "output/render_cache"
+WORKERS = os.cpu_count()  # Each render runs one fluidsynth and one ffmpeg process
+
+# Soundfonts are large, so each one is hashed once per process (keyed by path, size and mtime)
+_soundfont_hashes = {}
+
+
+def _soundfont_hash(soundfont):
+    stat = os.stat(soundfont)
+    key = (os.path.abspath(soundfont), stat.st_size, stat.st_mtime_ns)
+    if key not in _soundfont_hashes:
+        digest = hashlib.sha256()
+        with open(soundfont, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _soundfont_hashes[key] = digest.hexdigest()
+    return _soundfont_hashes[key]
+
+
+def render_key(midi_path, soundfont=SOUNDFONT, gain=GAIN):
+    """
+    Content hash of everything that decides the rendered audio: the MIDI bytes,
+    the soundfont and the gain
+    """
+    digest = hashlib.sha256()
+    with open(midi_path, "rb") as f:
+        digest.update(f.read())
+    digest.update(_soundfont_hash(soundfont).encode())
+    digest.update(f"{gain}:{SAMPLE_RATE}".encode())
+    return digest.hexdigest()
+
+
+def _encode(midi_path, mp3_path, soundfont, gain):
+    """
+    Pipes fluidsynth's raw PCM straight into ffmpeg, so no WAV is written and
+    both tools run at the same time
+    """
+    synth = subprocess.Popen(
+        ["fluidsynth", "-ni", "-q", "-g", str(gain), "-r", str(SAMPLE_RATE), "-O", "s16", "-T", "raw",
+         "-F", "-", soundfont, midi_path],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        encoder = subprocess.Popen(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "2",
+             "-i", "pipe:0", "-acodec", "libmp3lame", "-q:a", "2", "-f", "mp3", mp3_path],
+            stdin=synth.stdout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception:
+        synth.kill()
+        raise
+    finally:
+        # Only the encoder holds the read end now, so fluidsynth sees a broken pipe if it dies
+        synth.stdout.close()
+
+    encoder_code = encoder.wait()
+    synth_code = synth.wait()
+    if synth_code != 0:
+        raise subprocess.CalledProcessError(synth_code, "fluidsynth")
+    if encoder_code != 0:
+        raise subprocess.CalledProcessError(encoder_code, "ffmpeg")
+
+
+def render_mp3(midi_path, mp3_path, soundfont=SOUNDFONT, gain=GAIN, cache_dir=CACHE_DIR):
+    """
+    Renders one MIDI file to MP3, reusing the cached render of identical input.
+    Returns True if it came from the cache.
+    """
+    os.makedirs(os.path.dirname(mp3_path) or ".", exist_ok=True)
+    target = mp3_path
+    if cache_dir is not None:
+        target = os.path.join(cache_dir, render_key(midi_path, soundfont, gain) + ".mp3")
+        if os.path.exists(target):
+            shutil.copyfile(target, mp3_path)
+            return True
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # Write under a private name so a concurrent reader never sees half a file
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        _encode(midi_path, tmp_path, soundfont, gain)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    if target != mp3_path:
+        shutil.copyfile(target, mp3_path)
+    return False
+
+
+def render_many(jobs, workers=WORKERS, soundfont=SOUNDFONT, gain=GAIN, cache_dir=CACHE_DIR):
+    """
+    Renders (midi_path, mp3_path) pairs over a bounded pool of worker threads
+    (the work itself happens in the fluidsynth/ffmpeg processes). Jobs with the
+    same content are rendered once. Returns (rendered, cached, failed) counts.
+    """
+    groups = {}
+    for midi_path, mp3_path in jobs:
+        key = render_key(midi_path, soundfont, gain) if cache_dir else midi_path
+        groups.setdefault(key, []).append((midi_path, mp3_path))
+
+    def run(group):
+        midi_path, mp3_path = group[0]
+        hit = render_mp3(midi_path, mp3_path, soundfont, gain, cache_dir)
+        for _, duplicate_path in group[1:]:
+            os.makedirs(os.path.dirname(duplicate_path) or ".", exist_ok=True)
+            shutil.copyfile(mp3_path, duplicate_path)
+        return hit
+
+    rendered = cached = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers or 1)) as pool:
+        futures = [(pool.submit(run, group), group) for group in groups.values()]
+        for future, group in futures:
+            try:
+                hit = future.result()
+            except Exception as e:
+                print(f"❌ Error rendering {group[0][0]}: {e}")
+                failed += len(group)
+                continue
+            if hit:
+                cached += len(group)
+            else:
+                rendered += 1
+                cached += len(group) - 1
+    return rendered, cached, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render MIDI files to MP3 with FluidSynth and FFmpeg")
+    parser.add_argument("midi", nargs="+", help="MIDI files to render")
+    parser.add_argument("--out-dir", help="Where to write the MP3s (default: next to each MIDI file)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Concurrent renders (default: all cores)")
+    parser.add_argument("--soundfont", default=SOUNDFONT)
+    parser.add_argument("--gain", type=float, default=GAIN)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="Always render, don't read or fill the cache")
+    args = parser.parse_args()
+    if not os.path.exists(args.soundfont):
+        raise SystemExit(f"❌ SoundFont not found: {args.soundfont}")
+
+    jobs = []
+    for midi_path in args.midi:
+        mp3_name = os.path.splitext(os.path.basename(midi_path))[0] + ".mp3"
+        jobs.append((midi_path, os.path.join(args.out_dir or os.path.dirname(midi_path), mp3_name)))
+
+    start = time.perf_counter()
+    rendered, cached, failed = render_many(jobs, args.workers, args.soundfont, args.gain,
+                                           None if args.no_cache else args.cache_dir)
+    print(f"✅ {rendered} rendered, {cached} from cache, {failed} failed "
+          f"in {time.perf_counter() - start:.1f}s")
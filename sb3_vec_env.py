@@ -0,0 +1,92 @@
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+from jazz_env import CHORD_NAMES, HISTORY_LENGTH
+from jazz_vec_env import PER_ENV_ATTRS, READ_ONLY_ATTRS, BatchJazzEnv
+
+
+class JazzVecEnv(VecEnv):
+    """
+    Stable-Baselines3 VecEnv backed by BatchJazzEnv, so DQN can consume the
+    batched env directly. Finished episodes are reset automatically.
+    """
+
+    def __init__(self, num_envs, history_length=HISTORY_LENGTH, loop_penalties=None, chords=None, mask_actions=False):
+        self.batch = BatchJazzEnv(num_envs, history_length, loop_penalties, chords, mask_actions=mask_actions)
+        super(JazzVecEnv, self).__init__(num_envs, self.batch.observation_space, self.batch.action_space)
+        self.actions = None
+
+    def reset(self):
+        obs, _ = self.batch.reset(seed=self._seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+        return obs
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        obs, rewards, terminated, truncated, info = self.batch.step(self.actions)
+        dones = terminated | truncated
+        infos = [{"chord": CHORD_NAMES[c], "TimeLimit.truncated": False} for c in info["chord"]]
+
+        done_idx = np.flatnonzero(dones)
+        if len(done_idx):
+            for i in done_idx:
+                infos[i]["terminal_observation"] = {key: value[i].copy() for key, value in obs.items()}
+            reset_obs, _ = self.batch.reset(indices=done_idx)
+            for key in obs:
+                obs[key][done_idx] = reset_obs[key][done_idx]
+        return obs, rewards.astype(np.float32), dones, infos
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        """
+        The attribute of each env: its entry of a per-env batch array, or a value all envs share
+        """
+        indices = self._get_indices(indices)
+        if attr_name in PER_ENV_ATTRS:
+            values = getattr(self.batch, PER_ENV_ATTRS[attr_name])
+            return [values[i] for i in indices]
+        if attr_name.startswith("_") or not hasattr(self.batch, attr_name):
+            raise AttributeError(f"BatchJazzEnv envs have no attribute '{attr_name}'")
+        value = getattr(self.batch, attr_name)
+        return [value for _ in indices]
+
+    def set_attr(self, attr_name, value, indices=None):
+        """
+        Sets the attribute of the given envs. Shared attributes can only be set for all of them.
+        """
+        indices = list(self._get_indices(indices))
+        if attr_name in READ_ONLY_ATTRS:
+            raise AttributeError(f"'{attr_name}' is derived from the batch state and can't be set")
+        if attr_name in PER_ENV_ATTRS:
+            values = getattr(self.batch, PER_ENV_ATTRS[attr_name])
+            for i in indices:
+                values[i] = value
+            return
+        if attr_name.startswith("_"):
+            raise AttributeError(f"BatchJazzEnv envs have no attribute '{attr_name}'")
+        if sorted(indices) != list(range(self.num_envs)):
+            raise ValueError(f"'{attr_name}' is shared by all envs of the batch and can only be set for all of them")
+        setattr(self.batch, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """
+        Calls a JazzImprovisationEnv method on the given envs. Only methods that read or
+        reseed a single env are supported; the batch steps and resets all of them together.
+        """
+        indices = self._get_indices(indices)
+        if method_name == "action_masks":
+            masks = self.batch.action_masks()
+            return [masks[i] for i in indices]
+        if method_name == "seed":
+            # Like env.reset(seed=...): the env's next progression and style seeds come from it
+            for i in indices:
+                self.batch.rngs[i].seed(*method_args, **method_kwargs)
+            return [None for _ in indices]
+        raise AttributeError(f"JazzVecEnv can't call '{method_name}' on single envs of the batch")
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
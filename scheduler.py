@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import time
+import numpy as np
+
+# === SCHEDULER CONFIGURATION ===
+SWING_LONG = 1.3  # Long 16th on the beat; the short one gets 2 - SWING_LONG
+SPIN_THRESHOLD = 0.002  # Sleep until this close to a deadline, then busy-wait
+LATE_THRESHOLD = 0.005  # Steps starting later than this (seconds) count as late
+START_DELAY = 0.1  # Head start so the first prediction fits before step 0
+
+
+def swing_offset(step, base_step_duration, swing_long=SWING_LONG):
+    """
+    Time of `step` from session start. Every pair of steps (long + short) lasts
+    exactly two straight 16ths, so the offset is computed directly and never drifts.
+    """
+    pairs, odd = divmod(step, 2)
+    return base_step_duration * (2 * pairs + (swing_long if odd else 0.0))
+
+
+class StepScheduler:
+    """
+    Clock-driven step scheduler. Deadlines are absolute times from session start,
+    so time spent on prediction, printing and MIDI sends is absorbed instead of
+    being added to every step. Records how late each step actually started.
+    """
+
+    def __init__(self, bpm, swing_long=SWING_LONG, spin_threshold=SPIN_THRESHOLD,
+                 late_threshold=LATE_THRESHOLD, clock=time.perf_counter, sleep=time.sleep):
+        self.bpm = bpm
+        self.base_step_duration = 60 / bpm / 4
+        self.swing_long = swing_long
+        self.spin_threshold = spin_threshold
+        self.late_threshold = late_threshold
+        self.clock = clock
+        self.sleep = sleep
+        self.start_time = None
+        self.lateness = []
+        self.late_steps = []
+
+    def start(self, delay=START_DELAY, start_time=None):
+        """
+        Starts the clock `delay` seconds from now, or at `start_time` so several schedulers share deadlines
+        """
+        self.start_time = self.clock() + delay if start_time is None else start_time
+        self.lateness = []
+        self.late_steps = []
+
+    def deadline(self, step):
+        return self.start_time + swing_offset(step, self.base_step_duration, self.swing_long)
+
+    def step_duration(self, step):
+        return self.deadline(step + 1) - self.deadline(step)
+
+    def wait(self, step):
+        """
+        Blocks until the deadline of `step` and returns how late we got there (seconds)
+        """
+        deadline = self.deadline(step)
+        remaining = deadline - self.clock()
+        if remaining > self.spin_threshold:
+            self.sleep(remaining - self.spin_threshold)
+        now = self.clock()
+        while now < deadline:
+            now = self.clock()
+        return self._record(step, now - deadline)
+
+    async def wait_async(self, step):
+        """
+        Like wait(), but sleeps on the asyncio event loop (no busy-wait), so other tasks run meanwhile
+        """
+        deadline = self.deadline(step)
+        remaining = deadline - self.clock()
+        while remaining > 0:
+            await asyncio.sleep(remaining)
+            remaining = deadline - self.clock()
+        return self._record(step, -remaining)
+
+    def _record(self, step, late):
+        self.lateness.append(late)
+        if late > self.late_threshold:
+            self.late_steps.append(step)
+        return late
+
+    def report(self):
+        """
+        Jitter statistics (ms) and the tempo actually played
+        """
+        if not self.lateness:
+            return {}
+        late_ms = np.array(self.lateness) * 1000
+        steps = len(late_ms)
+        report = {
+            "steps": steps,
+            "late_steps": len(self.late_steps),
+            "jitter_mean_ms": float(late_ms.mean()),
+            "jitter_p50_ms": float(np.percentile(late_ms, 50)),
+            "jitter_p99_ms": float(np.percentile(late_ms, 99)),
+            "jitter_max_ms": float(late_ms.max()),
+            "target_bpm": self.bpm,
+            "effective_bpm": float(self.bpm)
+        }
+        if steps > 1:
+            # Tempo from the first and last step actually played
+            expected = self.deadline(steps - 1) - self.deadline(0)
+            actual = expected + (self.lateness[-1] - self.lateness[0])
+            report["effective_bpm"] = self.bpm * expected / actual
+        return report
+
+
+def print_report(report):
+    if not report:
+        return
+    print(f"\n⏱️  Timing: {report['effective_bpm']:.2f} BPM (target {report['target_bpm']}), "
+          f"jitter p50 {report['jitter_p50_ms']:.2f} ms / p99 {report['jitter_p99_ms']:.2f} ms / "
+          f"max {report['jitter_max_ms']:.2f} ms, {report['late_steps']}/{report['steps']} late steps")
+
+
+def measure_jitter(bpm=90, steps=128, load_ms=0.0):
+    """
+    Runs the scheduler on its own, with `load_ms` of busy work per step standing in
+    for prediction and MIDI output, and returns its report
+    """
+    scheduler = StepScheduler(bpm)
+    scheduler.start()
+    for step in range(steps):
+        scheduler.wait(step)
+        busy_until = time.perf_counter() + load_ms / 1000
+        while time.perf_counter() < busy_until:
+            pass
+    return scheduler.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure step scheduler jitter on this host")
+    parser.add_argument("--bpm", type=float, default=90)
+    parser.add_argument("--steps", type=int, default=128)
+    parser.add_argument("--load-ms", type=float, default=3.0, help="Simulated work per step")
+    args = parser.parse_args()
+    print_report(measure_jitter(args.bpm, args.steps, args.load_ms))
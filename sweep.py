@@ -0,0 +1,259 @@
+import argparse
+import inspect
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager, Value
+import numpy as np
+import torch
+from stable_baselines3 import DQN
+from stable_baselines3.common.callbacks import BaseCallback
+from evaluate import evaluate_model
+from jazz_env import JazzImprovisationEnv
+
+# === SWEEP CONFIGURATION ===
+RESULTS_PATH = "sweep_results.jsonl"
+TRIALS = 32
+TIMESTEPS = 50000  # Per trial
+CORES_PER_TRIAL = 1
+EVAL_EPISODES = 32
+EVAL_SEED = 1_000_000  # Held-out progressions: far from the training seeds (seed + trial)
+RUNGS = (0.25, 0.5, 0.75)  # Fractions of training after which a trial can be pruned
+PRUNE_PERCENTILE = 25  # Pruned if below this percentile of the other trials at the same rung
+MIN_TRIALS_TO_PRUNE = 4  # Other trials needed at a rung before it prunes anything
+
+# Each parameter is a list of choices or a {"low", "high", "log", "int"} range
+SEARCH_SPACE = {
+    "learning_rate": {"low": 1e-5, "high": 1e-3, "log": True},
+    "buffer_size": [10000, 50000, 200000],
+    "exploration_fraction": {"low": 0.1, "high": 0.6},
+    "exploration_final_eps": [0.01, 0.05, 0.1],
+    "gamma": [0.9, 0.95, 0.99],
+    "batch_size": [32, 64, 128]
+}
+
+# Fixed settings from train.py that the space doesn't override
+BASE_PARAMS = dict(learning_rate=1e-4, buffer_size=50000, exploration_fraction=0.4, exploration_final_eps=0.05)
+DQN_PARAMS = set(inspect.signature(DQN.__init__).parameters) - {"self", "policy", "env"}
+
+
+def load_space(path):
+    with open(path) as f:
+        space = json.load(f)
+    unknown = sorted(set(space) - DQN_PARAMS)
+    if unknown:
+        raise ValueError(f"Not DQN parameters: {unknown}")
+    return space
+
+
+def sample_params(space, rng):
+    params = {}
+    for name, spec in space.items():
+        if isinstance(spec, list):
+            value = spec[rng.integers(len(spec))]
+        elif spec.get("log"):
+            value = math.exp(rng.uniform(math.log(spec["low"]), math.log(spec["high"])))
+        else:
+            value = rng.uniform(spec["low"], spec["high"])
+        if isinstance(spec, dict) and spec.get("int"):
+            value = int(round(value))
+        params[name] = value.item() if isinstance(value, np.generic) else value
+    return params
+
+
+def evaluate(model, episodes=EVAL_EPISODES, seed=EVAL_SEED, chords=None):
+    """
+    Mean episode reward of the greedy policy on `episodes` fixed progressions
+    (one lockstep batch of the evaluation harness; training isn't disturbed)
+    """
+    return evaluate_model(model, episodes, seed, chords, batch_size=episodes)["reward"]["mean"]
+
+
+class Pruner:
+    """
+    Rung scores of every trial, shared between the pool processes through a
+    Manager. A trial is pruned at a rung when enough other trials got there
+    and it scores below PRUNE_PERCENTILE of them.
+    """
+
+    def __init__(self, scores, lock, percentile=PRUNE_PERCENTILE, min_trials=MIN_TRIALS_TO_PRUNE):
+        self.scores = scores  # rung -> {trial: score}
+        self.lock = lock
+        self.percentile = percentile
+        self.min_trials = min_trials
+
+    def report(self, trial, rung, score):
+        """
+        Records the score and returns True if the trial should stop
+        """
+        with self.lock:
+            rung_scores = dict(self.scores.get(rung, {}))
+            others = [s for t, s in rung_scores.items() if t != trial]
+            rung_scores[trial] = score
+            self.scores[rung] = rung_scores  # Manager dicts only see reassignment
+        if len(others) < self.min_trials:
+            return False
+        return score < np.percentile(others, self.percentile)
+
+
+class RungCallback(BaseCallback):
+    """
+    Evaluates the model at every rung and stops training if the pruner says so
+    """
+
+    def __init__(self, trial, rung_steps, pruner, eval_episodes, chords):
+        super(RungCallback, self).__init__()
+        self.trial = trial
+        self.rung_steps = list(rung_steps)
+        self.pruner = pruner
+        self.eval_episodes = eval_episodes
+        self.chords = chords
+        self.rung_scores = {}
+        self.pruned = False
+
+    def _on_step(self):
+        if not self.rung_steps or self.num_timesteps < self.rung_steps[0]:
+            return True
+        rung = self.rung_steps.pop(0)
+        score = evaluate(self.model, self.eval_episodes, chords=self.chords)
+        self.rung_scores[rung] = score
+        if self.pruner is not None and self.pruner.report(self.trial, rung, score):
+            self.pruned = True
+            return False
+        return True
+
+
+# Set once per worker process
+_pruner = None
+
+
+def _init_worker(cores, slot_counter, scores, lock, percentile, min_trials):
+    """
+    Gives the worker its core budget: torch threads and, where supported,
+    pinning to its own block of cores
+    """
+    global _pruner
+    _pruner = Pruner(scores, lock, percentile, min_trials)
+    torch.set_num_threads(cores)
+    with slot_counter.get_lock():
+        slot = slot_counter.value
+        slot_counter.value += 1
+    if hasattr(os, "sched_setaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+        block = [available[(slot * cores + i) % len(available)] for i in range(cores)]
+        os.sched_setaffinity(0, block)
+
+
+def run_trial(trial, params, timesteps, seed, eval_episodes=EVAL_EPISODES, rungs=RUNGS, chords=None,
+              pruner=None):
+    """
+    Trains one DQN with `params` on top of BASE_PARAMS and scores it on the held-out progressions
+    """
+    pruner = pruner or _pruner
+    start = time.perf_counter()
+    trial_seed = seed + trial
+    env = JazzImprovisationEnv(chords=chords, seed=trial_seed)
+    model = DQN("MultiInputPolicy", env, verbose=0, seed=trial_seed, **{**BASE_PARAMS, **params})
+
+    callback = RungCallback(trial, [int(timesteps * r) for r in rungs], pruner, eval_episodes, chords)
+    model.learn(total_timesteps=timesteps, callback=callback)
+    score = (evaluate(model, eval_episodes, chords=chords) if not callback.pruned
+             else callback.rung_scores[max(callback.rung_scores)])
+    return {
+        "trial": trial,
+        "params": params,
+        "status": "pruned" if callback.pruned else "complete",
+        "score": score,
+        "steps": int(model.num_timesteps),
+        "rung_scores": {str(step): s for step, s in callback.rung_scores.items()},
+        "seconds": round(time.perf_counter() - start, 2)
+    }
+
+
+def read_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def sweep(space=None, trials=TRIALS, timesteps=TIMESTEPS, cores_per_trial=CORES_PER_TRIAL, workers=None,
+          seed=0, eval_episodes=EVAL_EPISODES, results_path=RESULTS_PATH, chords=None,
+          percentile=PRUNE_PERCENTILE, min_trials=MIN_TRIALS_TO_PRUNE):
+    """
+    Runs `trials` sampled configurations over a process pool, appending one JSON
+    line per finished trial to `results_path`. Trial i's parameters only depend
+    on `seed`, so rerunning the same sweep skips the trials already in the file.
+    """
+    space = SEARCH_SPACE if space is None else space
+    workers = workers or max(1, (os.cpu_count() or 1) // cores_per_trial)
+    rng = np.random.default_rng(seed)
+    all_params = [sample_params(space, rng) for _ in range(trials)]
+
+    done = {r["trial"]: r for r in read_results(results_path) if r.get("status") in ("complete", "pruned")}
+    todo = [i for i in range(trials) if i not in done]
+    print(f"🔍 {len(todo)} of {trials} trials to run ({len(done)} already in {results_path}), "
+          f"{workers} at a time with {cores_per_trial} core(s) each")
+
+    with Manager() as manager:
+        # Earlier results still count towards pruning
+        scores = manager.dict()
+        for r in done.values():
+            for step, score in r["rung_scores"].items():
+                scores[int(step)] = {**scores.get(int(step), {}), r["trial"]: score}
+        slot_counter = Value("i", 0)  # Hands each worker its own block of cores
+
+        initargs = (cores_per_trial, slot_counter, scores, manager.Lock(), percentile, min_trials)
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool, \
+                open(results_path, "a") as out:
+            futures = {pool.submit(run_trial, i, all_params[i], timesteps, seed, eval_episodes, RUNGS, chords): i
+                       for i in todo}
+            for future in as_completed(futures):
+                trial = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"trial": trial, "params": all_params[trial], "status": "failed", "error": repr(e)}
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                done[trial] = result
+                score = f"{result['score']:8.2f}" if "score" in result else "       -"
+                print(f"   trial {trial:3d} {result['status']:8s} {score}  {result['params']}")
+    return sorted(done.values(), key=lambda r: r["trial"])
+
+
+def print_leaderboard(results, top=5):
+    # Pruned trials were scored after less training, so they rank below every complete one
+    scored = sorted((r for r in results if "score" in r), key=lambda r: (r["status"] == "complete", r["score"]),
+                    reverse=True)
+    counts = {status: sum(r["status"] == status for r in results) for status in ("complete", "pruned", "failed")}
+    print(f"\n🏆 {counts['complete']} complete, {counts['pruned']} pruned, {counts['failed']} failed")
+    for rank, r in enumerate(scored[:top], 1):
+        print(f"   {rank}. trial {r['trial']:3d} {r['score']:8.2f} ({r['status']}, {r['steps']:,} steps)  {r['params']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel DQN hyperparameter sweep with early pruning")
+    parser.add_argument("--space", help="JSON search space: {param: [choices] or {low, high, log, int}}")
+    parser.add_argument("--trials", type=int, default=TRIALS)
+    parser.add_argument("--timesteps", type=int, default=TIMESTEPS, help="Training steps per trial")
+    parser.add_argument("--cores-per-trial", type=int, default=CORES_PER_TRIAL)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Trials run at once (default: cores / cores per trial)")
+    parser.add_argument("--eval-episodes", type=int, default=EVAL_EPISODES)
+    parser.add_argument("--chords", type=lambda value: value.split(","), default=None,
+                        help="Comma-separated chord vocabulary (default: the 14-chord vocabulary from chords.json)")
+    parser.add_argument("--prune-percentile", type=float, default=PRUNE_PERCENTILE)
+    parser.add_argument("--min-trials-to-prune", type=int, default=MIN_TRIALS_TO_PRUNE)
+    parser.add_argument("--seed", type=int, default=0, help="Decides the sampled trials and their training seeds")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = sweep(load_space(args.space) if args.space else None, args.trials, args.timesteps,
+                    args.cores_per_trial, args.workers, args.seed, args.eval_episodes, args.results,
+                    args.chords, args.prune_percentile, args.min_trials_to_prune)
+    print_leaderboard(results)
+    print(f"\n✅ Results in {args.results} ({time.perf_counter() - start:.1f}s)")
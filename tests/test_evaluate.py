@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from evaluate import LOOP_LENGTHS, episode_counts
+from jazz_env import JazzImprovisationEnv
+
+# A few notes, rests and holds, so loops, repeats and fatigue all come up
+ACTIONS = [0, 2, 4, 36, 37]
+
+
+def env_counts(episodes, seed):
+    """
+    Seeded rollout with the counts the env's own reward terms see, plus its action and chord matrices
+    """
+    env = JazzImprovisationEnv()
+    rng = np.random.default_rng(seed)
+    counts = {"exact_repeats": 0, "double_repeats": 0, "fatigue_notes": 0, "loop_steps": 0,
+              "loops": {str(w): 0 for w in LOOP_LENGTHS}}
+    actions, chords = [], []
+    for episode in range(episodes):
+        env.reset(seed=seed + episode)
+        episode_actions, episode_chords, done = [], [], False
+        while not done:
+            action = int(rng.choice(ACTIONS))
+            # What the reward reads, before the step updates it
+            loops = env.history.loops()
+            for w in loops:
+                counts["loops"][str(w)] += 1
+            counts["loop_steps"] += bool(loops)
+            counts["fatigue_notes"] += action < 36 and env.consecutive_notes > 8
+            episode_chords.append(env.current_chord)
+            episode_actions.append(action)
+            _, _, done, _, _ = env.step(action)
+            counts["exact_repeats"] += env.exact_note_repeats >= 1
+            counts["double_repeats"] += env.exact_note_repeats >= 2
+        actions.append(episode_actions)
+        chords.append(episode_chords)
+    return counts, np.array(actions), np.array(chords)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_episode_counts_match_env_counters(seed):
+    expected, actions, chords = env_counts(16, seed)
+    counts = episode_counts(actions, chords, np.full(len(actions), actions.shape[1]))
+    for key, value in expected.items():
+        assert counts[key] == value, key
+    # The rollout has to exercise every counter
+    assert all(expected["loops"].values()) and expected["fatigue_notes"] and expected["double_repeats"]
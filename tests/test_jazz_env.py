@@ -0,0 +1,215 @@
+import random
+import numpy as np
+import pytest
+from jazz_env import JazzImprovisationEnv
+
+# === FROZEN BASELINE ===
+# The env as it was before the precomputed tables, ring buffer and chord registry,
+# kept verbatim except that it draws from its own RNG instead of the `random` module.
+# The rewrites have to reproduce its rewards bit for bit.
+
+CHORD_MAPPING = {
+    "Cm7": [0, 3, 7, 10], "F7": [5, 9, 0, 3],
+    "BbMaj7": [10, 2, 5, 9], "EbMaj7": [3, 7, 10, 2],
+    "Am7b5": [9, 0, 3, 7], "D7": [2, 6, 9, 0],
+    "Gm": [7, 10, 2, 5], "Dm7": [2, 5, 9, 0],
+    "G7": [7, 11, 2, 5], "CMaj7": [0, 4, 7, 11],
+    "C7b9": [0, 4, 7, 10, 1], "Fdim7": [5, 8, 11, 2],
+    "Bb6": [10, 2, 5, 7], "E7alt": [4, 8, 0, 2]
+}
+
+
+class BaselineJazzEnv:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def reset(self):
+        available_chords = list(CHORD_MAPPING.keys())
+        self.progression = []
+        for _ in range(8):
+            chord = self.rng.choice(available_chords)
+            self.progression.extend([chord] * 16)
+        self.steps_per_episode = len(self.progression)
+
+        self.current_step = 0
+        self.last_action = 36
+        self.consecutive_notes = 0
+        self.exact_note_repeats = 0
+        self.last_note_played = 36
+        self.consecutive_varied_notes = 0
+        self.current_action_duration = 0
+        self.history = [36] * 16
+        self.current_chord_name = self.progression[0]
+        self.current_style = self.rng.random()
+        return self._get_obs()
+
+    def _get_obs(self):
+        if self.current_step < len(self.progression):
+            prev_chord = self.current_chord_name
+            self.current_chord_name = self.progression[self.current_step]
+            if self.current_chord_name != prev_chord:
+                self.current_style = self.rng.random()
+
+        chord_vector = np.zeros(12, dtype=np.int8)
+        for note in CHORD_MAPPING[self.current_chord_name]:
+            chord_vector[note % 12] = 1
+
+        progress = np.array([self.current_step / self.steps_per_episode], dtype=np.float32)
+        duration = np.array([self.current_action_duration], dtype=np.float32)
+        style = np.array([self.current_style], dtype=np.float32)
+        return {
+            "chord_tones": chord_vector, "step_progress": progress,
+            "last_action": self.last_action, "held_duration": duration, "style_seed": style
+        }
+
+    def step(self, action):
+        is_hold = (action == 37)
+        if is_hold:
+            self.current_action_duration += 1
+        elif action == self.last_action and action == 36:
+            self.current_action_duration += 1
+        else:
+            self.current_action_duration = 1
+
+        reward = self._calculate_reward(action)
+
+        if action < 36:
+            self.consecutive_notes += 1
+            if action == self.last_note_played:
+                self.exact_note_repeats += 1
+                self.consecutive_varied_notes = 1
+            else:
+                self.exact_note_repeats = 0
+                self.consecutive_varied_notes += 1
+            self.last_note_played = action
+        else:
+            self.consecutive_notes = 0
+            self.exact_note_repeats = 0
+            self.consecutive_varied_notes = 0
+
+        self.history.append(action)
+        if len(self.history) > 16: self.history.pop(0)
+
+        self.last_action = action
+        self.current_step += 1
+        terminated = self.current_step >= self.steps_per_episode
+        return self._get_obs(), reward, terminated
+
+    def _calculate_reward(self, action):
+        reward = 0.0
+        chord_notes = CHORD_MAPPING[self.current_chord_name]
+        chord_notes_set = set(n % 12 for n in chord_notes)
+        is_note = action < 36
+        is_rest = action == 36
+        is_hold = action == 37
+        prev1 = self.history[-2]
+
+        # === HARMONY ===
+        if is_note:
+            if (action % 12) in chord_notes_set:
+                reward += 1.0
+            else:
+                reward -= 0.6
+
+        # === MELODIC FLOW ===
+        if is_note and prev1 < 36:
+            interval = abs(action - prev1)
+            if 1 <= interval <= 2:
+                reward += 0.8
+            elif 3 <= interval <= 5:
+                reward += 0.4
+            elif interval > 9:
+                reward -= 1.5
+
+        # === ANTI-SPAM ===
+        if is_note:
+            if self.exact_note_repeats == 1:
+                reward -= 2.0
+            elif self.exact_note_repeats >= 2:
+                reward -= 10.0
+
+        # === PHRASE LOOPS ===
+        if len(self.history) >= 4 and self.history[-2:] == self.history[-4:-2]:
+            reward -= 5.0
+        if len(self.history) >= 6 and self.history[-3:] == self.history[-6:-3]:
+            reward -= 10.0
+        if len(self.history) >= 8 and self.history[-4:] == self.history[-8:-4]:
+            reward -= 15.0
+
+        # === FATIGUE ===
+        if is_note:
+            if self.consecutive_notes > 8:
+                reward -= (self.consecutive_notes * 0.4)
+
+        # === DYNAMIC HOLD ===
+        if is_hold:
+            last_played = next((a for a in reversed(self.history[:-1]) if a < 36), -1)
+            if last_played != -1 and (last_played % 12) in chord_notes_set:
+                if self.current_action_duration <= 4:
+                    reward += 1.2
+                elif self.current_action_duration <= 8:
+                    reward += 0.5
+                else:
+                    reward -= 1.0
+            else:
+                reward -= 1.0
+
+        # === REST ===
+        if is_rest:
+            if self.consecutive_varied_notes >= 4:
+                reward += 3.0
+            elif self.consecutive_notes >= 4:
+                reward += 2.0
+            elif self.consecutive_notes == 1:
+                reward -= 0.8
+            elif self.current_action_duration > 6:
+                reward -= 1.0
+            else:
+                reward -= 0.1
+
+        # === RIFF BONUS ===
+        if self.consecutive_varied_notes == 4:
+            reward += 2.5
+        elif self.consecutive_varied_notes >= 5:
+            reward += 4.0
+
+        return reward
+
+
+def assert_same_obs(obs, expected):
+    for key, value in expected.items():
+        np.testing.assert_array_equal(np.asarray(obs[key]), np.asarray(value), err_msg=key)
+
+
+def random_actions(rng, steps):
+    """
+    Uniform actions mixed with short repeated motifs, so the loop, anti-spam and hold terms all fire
+    """
+    actions = []
+    while len(actions) < steps:
+        if rng.random() < 0.3:
+            motif = [rng.randrange(38) for _ in range(rng.randint(1, 4))]
+            actions.extend(motif * rng.randint(2, 3))
+        else:
+            actions.append(rng.randrange(38))
+    return actions[:steps]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rewards_match_baseline(seed):
+    env = JazzImprovisationEnv(seed=seed)
+    baseline = BaselineJazzEnv(seed)
+    obs, _ = env.reset(seed=seed)
+    assert_same_obs(obs, baseline.reset())
+
+    rng = random.Random(seed)
+    for episode in range(5):
+        for action in random_actions(rng, 128):
+            obs, reward, terminated, truncated, _ = env.step(action)
+            expected_obs, expected_reward, expected_done = baseline.step(action)
+            assert reward == expected_reward  # Bit-identical, not just close
+            assert terminated == expected_done and not truncated
+            assert_same_obs(obs, expected_obs)
+        assert terminated
+        obs, _ = env.reset()
+        assert_same_obs(obs, baseline.reset())
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from jazz_env import JazzImprovisationEnv
+from jazz_vec_env import BatchJazzEnv
+from numpy_policy import ACTION_MASK, sample_allowed
+from sb3_vec_env import JazzVecEnv
+
+NUM_ENVS = 4
+SEED = 7
+
+
+def assert_obs_equal(batch_obs, i, obs):
+    assert batch_obs.keys() == obs.keys()
+    for key, value in obs.items():
+        np.testing.assert_array_equal(batch_obs[key][i], np.asarray(value), err_msg=key)
+
+
+def choose_actions(rng, batch_obs, masked):
+    if masked:
+        return np.array([int(sample_allowed(mask, rng)[0]) for mask in batch_obs[ACTION_MASK]])
+    return rng.integers(0, 38, NUM_ENVS)
+
+
+@pytest.mark.parametrize("masked", [False, True])
+@pytest.mark.parametrize("history_length", [16, 64])
+def test_batch_matches_scalar_envs(masked, history_length):
+    batch = BatchJazzEnv(NUM_ENVS, history_length, mask_actions=masked)
+    envs = [JazzImprovisationEnv(history_length, mask_actions=masked) for _ in range(NUM_ENVS)]
+    rng = np.random.default_rng(SEED)
+
+    batch_obs, _ = batch.reset(seed=SEED)
+    for i, env in enumerate(envs):
+        assert_obs_equal(batch_obs, i, env.reset(seed=SEED + i)[0])
+    # Three episodes each, the later ones drawn from the RNGs the first reset seeded
+    for _ in range(3):
+        done = False
+        while not done:
+            actions = choose_actions(rng, batch_obs, masked)
+            batch_obs, rewards, terminated, truncated, _ = batch.step(actions)
+            for i, env in enumerate(envs):
+                obs, reward, env_terminated, env_truncated, _ = env.step(int(actions[i]))
+                assert rewards[i] == reward
+                assert (terminated[i], truncated[i]) == (env_terminated, env_truncated)
+                assert_obs_equal(batch_obs, i, obs)
+            done = terminated.all()
+        batch_obs, _ = batch.reset()
+        for i, env in enumerate(envs):
+            assert_obs_equal(batch_obs, i, env.reset()[0])
+
+
+@pytest.mark.parametrize("masked", [False, True])
+def test_vec_env_matches_scalar_envs(masked):
+    vec_env = JazzVecEnv(NUM_ENVS, mask_actions=masked)
+    envs = [JazzImprovisationEnv(mask_actions=masked) for _ in range(NUM_ENVS)]
+    rng = np.random.default_rng(SEED)
+
+    vec_env.seed(SEED)
+    vec_obs = vec_env.reset()
+    for i, env in enumerate(envs):
+        assert_obs_equal(vec_obs, i, env.reset(seed=SEED + i)[0])
+    # Past the end of the first episode, which the vec env resets by itself
+    for _ in range(200):
+        actions = choose_actions(rng, vec_obs, masked)
+        vec_obs, rewards, dones, infos = vec_env.step(actions)
+        for i, env in enumerate(envs):
+            obs, reward, terminated, _, info = env.step(int(actions[i]))
+            assert rewards[i] == np.float32(reward)
+            assert dones[i] == terminated
+            assert infos[i]["chord"] == info["chord"]
+            if terminated:
+                assert_obs_equal({key: value[None] for key, value in infos[i]["terminal_observation"].items()},
+                                 0, obs)
+                obs, _ = env.reset()
+            assert_obs_equal(vec_obs, i, obs)
+
+        for name in ("current_step", "current_chord_name", "last_note_played", "exact_note_repeats"):
+            assert vec_env.get_attr(name) == [getattr(env, name) for env in envs]
+        assert [list(h) for h in vec_env.get_attr("history")] == [list(env.history) for env in envs]
+        np.testing.assert_array_equal(vec_env.env_method("action_masks"), [env.action_masks() for env in envs])
+
+
+def test_vec_env_attributes():
+    vec_env = JazzVecEnv(NUM_ENVS)
+    vec_env.seed(SEED)
+    vec_env.reset()
+
+    # Per-env attributes read and write single envs
+    assert vec_env.get_attr("current_step", indices=[1, 2]) == [0, 0]
+    vec_env.set_attr("current_style", 0.25, indices=[2])
+    assert vec_env.get_attr("current_style") == [vec_env.batch.current_style[0], vec_env.batch.current_style[1],
+                                                 0.25, vec_env.batch.current_style[3]]
+    assert vec_env.get_attr("rng", indices=0)[0] is vec_env.batch.rngs[0]
+
+    # Shared attributes are the same for every env and can only be set for all of them
+    assert vec_env.get_attr("steps_per_episode") == [128] * NUM_ENVS
+    with pytest.raises(ValueError):
+        vec_env.set_attr("steps_per_episode", 64, indices=[0])
+    vec_env.set_attr("steps_per_episode", 64)
+    assert vec_env.batch.steps_per_episode == 64
+
+    # Derived, private and unknown attributes
+    with pytest.raises(AttributeError):
+        vec_env.set_attr("history", None)
+    with pytest.raises(AttributeError):
+        vec_env.get_attr("_pos")
+    with pytest.raises(AttributeError):
+        vec_env.get_attr("no_such_attribute")
+
+    # seed reseeds the next reset of the given envs only, like env.reset(seed=...)
+    rngs = vec_env.get_attr("rng")
+    states = [rng.getstate() for rng in rngs]
+    vec_env.env_method("seed", 123, indices=[3])
+    assert [rng.getstate() for rng in rngs[:3]] == states[:3]
+    obs, _ = vec_env.batch.reset(indices=[3])
+    assert_obs_equal(obs, 3, JazzImprovisationEnv().reset(seed=123)[0])
+    with pytest.raises(AttributeError):
+        vec_env.env_method("step", 0)
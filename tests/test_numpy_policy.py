@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import torch
+from stable_baselines3 import DQN
+from jazz_env import JazzImprovisationEnv
+from masked_dqn import MaskedDQN, MaskedDQNPolicy
+from numpy_policy import ACTION_MASK, MASKED_Q, NumpyDQNPolicy, export_policy, sample_allowed
+
+
+def make_model(masked, seed=0):
+    env = JazzImprovisationEnv(seed=seed, mask_actions=masked)
+    algorithm, policy = (MaskedDQN, MaskedDQNPolicy) if masked else (DQN, "MultiInputPolicy")
+    model = algorithm(policy, env, seed=seed, device="cpu")
+    # Wider weights than the initialisation, so the greedy actions aren't near-ties
+    torch.manual_seed(seed)
+    with torch.no_grad():
+        for param in model.policy.q_net.parameters():
+            param.normal_(0.0, 0.3)
+    return model
+
+
+def rollout_observations(masked, steps=512, seed=0):
+    """
+    Batched observations from a seeded rollout with random (allowed) actions
+    """
+    env = JazzImprovisationEnv(seed=seed, mask_actions=masked)
+    rng = np.random.default_rng(seed)
+    obs, _ = env.reset(seed=seed)
+    observations = []
+    for _ in range(steps):
+        observations.append({key: np.array(value) for key, value in obs.items()})
+        action = int(sample_allowed(obs[ACTION_MASK], rng)[0]) if masked else int(rng.integers(0, 38))
+        obs, _, terminated, _, _ = env.step(action)
+        if terminated:
+            obs, _ = env.reset()
+    return {key: np.stack([o[key] for o in observations]) for key in observations[0]}
+
+
+def sb3_q_values(model, obs):
+    obs_tensor, _ = model.policy.obs_to_tensor(obs)
+    with torch.no_grad():
+        return model.q_net(obs_tensor).cpu().numpy()
+
+
+@pytest.mark.parametrize("masked", [False, True])
+def test_q_values_match_sb3(masked, tmp_path):
+    model = make_model(masked)
+    export_policy(model, str(tmp_path / "policy.npz"))
+    policy = NumpyDQNPolicy.load(str(tmp_path / "policy.npz"))
+    obs = rollout_observations(masked)
+
+    expected = sb3_q_values(model, obs)
+    q = policy.q_values(obs)
+    # Equal within float32 rounding: the matrix products may sum in a different order
+    np.testing.assert_allclose(q, expected, rtol=1e-6, atol=1e-6)
+    np.testing.assert_array_equal(q.argmax(axis=1), expected.argmax(axis=1))
+    if masked:
+        assert np.all((q == MASKED_Q) == (obs[ACTION_MASK] == 0))
+
+    # Greedy predict() agrees batched and for single observations
+    actions, _ = policy.predict(obs, deterministic=True)
+    np.testing.assert_array_equal(actions, model.predict(obs, deterministic=True)[0])
+    for i in range(0, len(actions), 64):
+        single = {key: value[i] for key, value in obs.items()}
+        assert policy.predict(single, deterministic=True)[0] == actions[i]
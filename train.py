@@ -1,83 +1,448 @@
 import gymnasium as gym
 from stable_baselines3 import DQN
+from stable_baselines3.common.buffers import DictReplayBuffer
+from stable_baselines3.common.callbacks import BaseCallback
 from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common import results_plotter
-import matplotlib.pyplot as plt
+from stable_baselines3.common.vec_env import SubprocVecEnv
 import numpy as np
+import argparse
+import glob
+import json
 import os
+import time
 from jazz_env import JazzImprovisationEnv
+from evaluate import evaluate_model
+from masked_dqn import MaskedDQN, MaskedDQNPolicy
+from numpy_policy import NumpyDQNPolicy, export_policy
+from packed_obs import PackedObservation, PackedObsExtractor
+from progressions import Corpus
+from training_monitor import REFRESH_INTERVAL, TrainingMonitor
 
 # === TRAINING CONFIGURATION ===
 MODEL_NAME = "jazz_model"
 LOG_DIR = "training_logs/"
 TIMESTEPS = 200000  # About 1500 episodes worth of training
+LEARNING_RATE = 1e-4  # Slow and steady learning
+BUFFER_SIZE = 50000  # Remember 50k past experiences
+MERGED_MONITOR = "monitor_merged.csv"
+CHECKPOINT_DIR = "checkpoints/"
+CHECKPOINT_FREQ = 20000  # Environment steps between checkpoints (0 = off)
+WARM_START_EPS = 0.2  # Initial exploration when fine-tuning an existing model
 
-os.makedirs(LOG_DIR, exist_ok=True)
 
-# === SETUP ENVIRONMENT ===
-# Monitor wrapper tracks episode rewards for analysis
-env = JazzImprovisationEnv()
-env = Monitor(env, LOG_DIR)
+def monitor_path(log_dir, rank=None, resumed_at=0):
+    """
+    Monitor log prefix for a worker (None = the single env). A resumed run writes
+    new logs named after its starting step; each log's header holds its own start time.
+    """
+    name = "" if rank is None else str(rank)
+    if resumed_at:
+        name = f"{name}.resume_{resumed_at}" if name else f"resume_{resumed_at}"
+    return os.path.join(log_dir, name)
+
+
+def make_env(rank, seed, log_dir, packed_obs=False, chords=None, resumed_at=0, corpus=None, transpose=False,
+             mask_actions=False):
+    """
+    Returns a factory for worker `rank`. It runs inside the worker process, so each
+    worker builds its own env (seeded with seed + rank) and writes its own Monitor log.
+    """
+    def _init():
+        env = build_env(chords, corpus, transpose, seed + rank, mask_actions)
+        if packed_obs:
+            env = PackedObservation(env)
+        return Monitor(env, monitor_path(log_dir, rank, resumed_at))
+
+    return _init
+
+
+def build_env(chords=None, corpus=None, transpose=False, seed=None, mask_actions=False):
+    """
+    The training env: random progressions over `chords`, or tunes from a corpus index.
+    The corpus is memory-mapped, so every worker shares its pages.
+    """
+    progressions = Corpus(corpus, transpose) if corpus else None
+    return JazzImprovisationEnv(chords=chords, progressions=progressions, seed=seed, mask_actions=mask_actions)
+
+
+def monitor_line_counts(log_dir):
+    """
+    Complete lines in every Monitor log, so a resumed run can drop episodes logged after its checkpoint
+    """
+    counts = {}
+    for path in glob.glob(os.path.join(log_dir, "*monitor.csv")):
+        with open(path, "rb") as f:
+            counts[os.path.basename(path)] = f.read().count(b"\n")
+    return counts
+
+
+def restore_monitor_logs(log_dir, line_counts):
+    """
+    Cuts every Monitor log back to its length at checkpoint time; logs started after it are removed
+    """
+    for path in glob.glob(os.path.join(log_dir, "*monitor.csv")):
+        keep = line_counts.get(os.path.basename(path))
+        if keep is None:
+            os.remove(path)
+            continue
+        with open(path, "rb") as f:
+            lines = f.readlines()[:keep]
+        with open(path, "wb") as f:
+            f.writelines(lines)
+
+
+class CheckpointSaver(BaseCallback):
+    """
+    Every `save_freq` environment steps, saves the model (and optionally the
+    replay buffer) with a JSON record of the run arguments and the Monitor log
+    lengths, which is everything --resume needs to continue the run
+    """
+
+    def __init__(self, save_freq, checkpoint_dir, name, log_dir, run_args, save_replay_buffer=False,
+                 eval_episodes=0):
+        super(CheckpointSaver, self).__init__()
+        self.save_freq = save_freq
+        self.checkpoint_dir = checkpoint_dir
+        self.name = name
+        self.log_dir = log_dir
+        self.run_args = run_args
+        self.save_replay_buffer = save_replay_buffer
+        self.eval_episodes = eval_episodes
+        self._next_save = save_freq
+
+    def _on_training_start(self):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self._next_save = (self.num_timesteps // self.save_freq + 1) * self.save_freq
+
+    def _on_step(self):
+        if self.num_timesteps >= self._next_save:
+            self.save()
+            while self._next_save <= self.num_timesteps:
+                self._next_save += self.save_freq
+        return True
+
+    def save(self):
+        steps = self.num_timesteps
+        prefix = os.path.join(self.checkpoint_dir, f"{self.name}_{steps}_steps")
+        self.model.save(prefix)
+        record = {
+            "num_timesteps": steps,
+            "model": f"{prefix}.zip",
+            "replay_buffer": None,
+            "monitor_lines": monitor_line_counts(self.log_dir),
+            "args": self.run_args
+        }
+        if self.save_replay_buffer:
+            record["replay_buffer"] = f"{prefix}_replay_buffer.pkl"
+            self.model.save_replay_buffer(record["replay_buffer"])
+
+        if self.eval_episodes:
+            # Evaluated through the NumPy export, which also reads packed-observation models
+            export_policy(self.model, f"{prefix}.npz")
+            record["eval"] = evaluate_model(NumpyDQNPolicy.load(f"{prefix}.npz"), self.eval_episodes,
+                                            chords=self.run_args.get("chords"), corpus=self.run_args.get("corpus"))
+            print(f"📊 {steps:,} steps: reward {record['eval']['reward']['mean']:.1f}, "
+                  f"chord tones {record['eval']['chord_tone_hit_rate']:.1%}, "
+                  f"loops {record['eval']['phrase_loop_rate']:.1%}")
+
+        # The record is written last, so only complete checkpoints are ever resumed from
+        with open(f"{prefix}.json.tmp", "w") as f:
+            json.dump(record, f, indent=2)
+        os.replace(f"{prefix}.json.tmp", f"{prefix}.json")
+
+        # Replay buffers are large, so only the newest one is kept. The older ones go only
+        # now that this checkpoint is complete, so a crash above leaves the previous one resumable.
+        if self.save_replay_buffer:
+            for path in glob.glob(os.path.join(self.checkpoint_dir, f"{self.name}_*_replay_buffer.pkl")):
+                if path != record["replay_buffer"]:
+                    os.remove(path)
+        print(f"💾 Checkpoint saved at {steps:,} steps")
+
+
+class MetricsRefresher(BaseCallback):
+    """
+    Every `interval` seconds, reads the episodes the Monitor logs gained and rewrites
+    the learning curve PNG and JSON summary in the log directory (training_monitor.py)
+    """
+
+    def __init__(self, monitor, interval=REFRESH_INTERVAL):
+        super(MetricsRefresher, self).__init__()
+        self.monitor = monitor
+        self.interval = interval
+        self._next_refresh = 0.0
+
+    def _on_training_start(self):
+        self._next_refresh = time.perf_counter() + self.interval
+
+    def _on_step(self):
+        now = time.perf_counter()
+        if now >= self._next_refresh:
+            self.monitor.refresh()
+            self._next_refresh = now + self.interval
+        return True
+
+    def _on_training_end(self):
+        self.monitor.refresh()
+
+
+def latest_checkpoint(checkpoint_dir, name):
+    records = []
+    for path in glob.glob(os.path.join(checkpoint_dir, f"{name}_*_steps.json")):
+        with open(path) as f:
+            records.append(json.load(f))
+    return max(records, key=lambda record: record["num_timesteps"]) if records else None
+
+
+def merge_monitor_logs(log_dir, out_name=MERGED_MONITOR):
+    """
+    Merges the per-worker Monitor logs into one CSV ordered by wall-clock time
+    """
+    rows = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "*monitor.csv"))):
+        worker = os.path.basename(path).split(".")[0]
+        with open(path) as f:
+            header = json.loads(f.readline()[1:])
+            f.readline()  # Column names
+            for line in f:
+                r, l, t = line.strip().split(",")[:3]
+                rows.append((header["t_start"] + float(t), float(r), int(l), worker))
+
+    if not rows:
+        return None
+    rows.sort()
+    t0 = rows[0][0]
+    out_path = os.path.join(log_dir, out_name)
+    with open(out_path, "w") as f:
+        f.write("r,l,t,worker\n")
+        for t, r, l, worker in rows:
+            f.write(f"{r},{l},{t - t0:.6f},{worker}\n")
+    return out_path
+
+
+def replay_bytes_per_transition(buffer):
+    """
+    Bytes a replay buffer allocates per stored transition (observations, actions, rewards, flags)
+    """
+    total = 0
+    for value in vars(buffer).values():
+        arrays = value.values() if isinstance(value, dict) else [value]
+        total += sum(array.nbytes for array in arrays if isinstance(array, np.ndarray))
+    return total / (buffer.buffer_size * buffer.n_envs)
+
+
+def report_replay_memory(model, packed_obs):
+    """
+    Prints the replay buffer's size next to what Dict observations would need
+    """
+    dict_env = JazzImprovisationEnv()
+    dict_buffer = DictReplayBuffer(1, dict_env.observation_space, dict_env.action_space, n_envs=model.n_envs)
+    dict_bytes = replay_bytes_per_transition(dict_buffer)
+    used_bytes = replay_bytes_per_transition(model.replay_buffer)
+    transitions = model.replay_buffer.buffer_size * model.n_envs
+    print(f"💾 Replay buffer: {transitions:,} transitions x {used_bytes:.0f} B = "
+          f"{transitions * used_bytes / 2 ** 20:.1f} MB", end="")
+    if packed_obs:
+        print(f" ({dict_bytes / used_bytes:.1f}x smaller than Dict observations: "
+              f"{transitions * dict_bytes / 2 ** 20:.1f} MB)")
+    else:
+        print(" (use --packed-obs to shrink it)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the JazzMate DQN agent")
+    parser.add_argument("--timesteps", type=int, default=TIMESTEPS, help="Total environment steps (all workers)")
+    parser.add_argument("--learning-rate", type=float, default=LEARNING_RATE)
+    parser.add_argument("--buffer-size", type=int, default=BUFFER_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="Environments run in parallel worker processes")
+    parser.add_argument("--gradient-steps", type=int, default=1,
+                        help="Gradient steps per update (-1 = one per collected transition)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--packed-obs", action="store_true",
+                        help="Store observations packed into 7 uint16 (several times more replay per MB)")
+    parser.add_argument("--chords", type=lambda value: value.split(","), default=None,
+                        help="Comma-separated chord vocabulary for the progressions, e.g. Cm7,F7,BbMaj7 or all "
+                             "(default: the chords.json vocabulary)")
+    parser.add_argument("--corpus", help="Train on tunes from a corpus index built with progressions.py")
+    parser.add_argument("--transpose-corpus", action="store_true", help="Move every corpus tune to a random key")
+    parser.add_argument("--mask-actions", action="store_true",
+                        help="Never explore or choose big leaps, immediate repeats or holds with nothing to "
+                             "sustain (see action_masks)")
+    parser.add_argument("--model-name", default=MODEL_NAME)
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    parser.add_argument("--checkpoint-freq", type=int, default=CHECKPOINT_FREQ,
+                        help="Save a checkpoint every N environment steps (0 = off)")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--save-replay-buffer", action="store_true",
+                        help="Also checkpoint the replay buffer (only the newest is kept)")
+    parser.add_argument("--metrics-interval", type=float, default=REFRESH_INTERVAL,
+                        help="Seconds between refreshes of the learning curve and metrics.json in the log "
+                             "directory while training (0 = off)")
+    parser.add_argument("--eval-episodes", type=int, default=0,
+                        help="Evaluate every checkpoint on this many seeded episodes (see evaluate.py)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the run from its newest checkpoint (its arguments are the defaults)")
+    parser.add_argument("--warm-start", metavar="MODEL",
+                        help="Fine-tune the weights of an existing model (e.g. on a new --chords vocabulary)")
+    parser.add_argument("--exploration-initial-eps", type=float, default=None,
+                        help=f"Default: 1.0, or {WARM_START_EPS} with --warm-start")
+    args = parser.parse_args(argv)
+    if args.mask_actions and args.packed_obs:
+        parser.error("--mask-actions needs Dict observations, it can't be combined with --packed-obs")
+
+    if args.resume:
+        if args.warm_start:
+            parser.error("--resume and --warm-start can't be combined")
+        record = latest_checkpoint(args.checkpoint_dir, args.model_name)
+        if record is None:
+            parser.error(f"No checkpoint of '{args.model_name}' in {args.checkpoint_dir}")
+        # Arguments given now override the ones the run was started with
+        parser.set_defaults(**record["args"])
+        args = parser.parse_args(argv)
+        args.checkpoint = record
+    return args
+
+
+def run_arguments(args):
+    """
+    Arguments a checkpoint records to resume the run with
+    """
+    excluded = ("resume", "warm_start", "checkpoint")
+    return {key: value for key, value in vars(args).items() if key not in excluded}
+
+
+def main():
+    args = parse_args()
+    if args.exploration_initial_eps is None:
+        args.exploration_initial_eps = WARM_START_EPS if args.warm_start else 1.0
+    os.makedirs(args.log_dir, exist_ok=True)
+
+    resumed_at = 0
+    if args.resume:
+        resumed_at = args.checkpoint["num_timesteps"]
+        # Episodes logged after the checkpoint are played again, so drop them
+        restore_monitor_logs(args.log_dir, args.checkpoint["monitor_lines"])
+        print(f"Resuming from {args.checkpoint['model']} ({resumed_at:,} of {args.timesteps:,} steps).")
+    else:
+        # Old Monitor logs would be merged into this run's curve
+        for path in glob.glob(os.path.join(args.log_dir, "*monitor.csv")):
+            os.remove(path)
+
+    # === SETUP ENVIRONMENT ===
+    # Monitor wrapper tracks episode rewards for analysis. A resumed run reseeds
+    # with its starting step so it doesn't replay the same progressions.
+    seed = args.seed + resumed_at
+    if args.workers > 1:
+        env = SubprocVecEnv([make_env(rank, seed, args.log_dir, args.packed_obs, args.chords, resumed_at,
+                                      args.corpus, args.transpose_corpus, args.mask_actions)
+                             for rank in range(args.workers)])
+        print(f"Running {args.workers} environments in worker processes.")
+    else:
+        env = build_env(args.chords, args.corpus, args.transpose_corpus, seed, args.mask_actions)
+        if args.packed_obs:
+            env = PackedObservation(env)
+        env = Monitor(env, monitor_path(args.log_dir, resumed_at=resumed_at))
+
+    # Start fresh - remove any existing model
+    if not args.resume:
+        if os.path.exists(f"{args.model_name}.zip"):
+            os.remove(f"{args.model_name}.zip")
+            print("Deleted old model to start fresh.")
+        if os.path.exists(f"{args.model_name}.npz"):
+            os.remove(f"{args.model_name}.npz")
+
+    # === INITIALIZE MODEL ===
+    # Packed observations go through a plain Box replay buffer that stores each
+    # observation once (next_obs is read from the following slot). The env never
+    # truncates, so timeout handling isn't needed.
+    packed_kwargs = {}
+    if args.packed_obs:
+        packed_kwargs = dict(
+            policy_kwargs=dict(features_extractor_class=PackedObsExtractor),
+            optimize_memory_usage=True,
+            replay_buffer_kwargs=dict(handle_timeout_termination=False)
+        )
+
+    # Masked actions get no exploration, no greedy picks and no say in the TD target (masked_dqn.py)
+    algorithm = MaskedDQN if args.mask_actions else DQN
+    policy = MaskedDQNPolicy if args.mask_actions else "MlpPolicy" if args.packed_obs else "MultiInputPolicy"
+
+    if args.resume:
+        # Weights, optimizer, step count and exploration schedule come from the checkpoint
+        model = algorithm.load(args.checkpoint["model"], env=env)
+        model.set_random_seed(seed)
+        buffer_path = args.checkpoint["replay_buffer"]
+        if buffer_path and os.path.exists(buffer_path):
+            model.load_replay_buffer(buffer_path)
+            # size() counts slots, each holding one transition per env
+            transitions = model.replay_buffer.size() * model.replay_buffer.n_envs
+            print(f"Restored {transitions:,} transitions from {buffer_path}")
+        else:
+            print("⚠️ No replay buffer in the checkpoint, it starts empty.")
+    else:
+        # DQN is good for discrete action spaces (our 38 possible actions)
+        model = algorithm(
+            policy,
+            env,
+            verbose=1,
+            learning_rate=args.learning_rate,
+            buffer_size=args.buffer_size,
+            exploration_fraction=0.4,  # Explore for first 40% of training
+            exploration_initial_eps=args.exploration_initial_eps,
+            exploration_final_eps=0.05,  # Always keep 5% randomness
+            gradient_steps=args.gradient_steps,
+            seed=args.seed,
+            **packed_kwargs
+        )
+        if args.warm_start:
+            # Only the network weights: optimizer, buffer and schedule start fresh for fine-tuning
+            pretrained = DQN.load(args.warm_start, device=model.device)
+            model.policy.load_state_dict(pretrained.policy.state_dict())
+            print(f"Warm start from {args.warm_start} (exploration from {args.exploration_initial_eps}).")
+    report_replay_memory(model, args.packed_obs)
+
+    callbacks = []
+    if args.checkpoint_freq > 0:
+        callbacks.append(CheckpointSaver(args.checkpoint_freq, args.checkpoint_dir, args.model_name, args.log_dir,
+                                         run_arguments(args), args.save_replay_buffer, args.eval_episodes))
+    # Created after the resume cut the logs back, so it starts from the logs as they are now
+    monitor = TrainingMonitor(args.log_dir)
+    if args.metrics_interval > 0:
+        callbacks.append(MetricsRefresher(monitor, args.metrics_interval))
 
-# Start fresh - remove any existing model
-if os.path.exists(f"{MODEL_NAME}.zip"):
-    os.remove(f"{MODEL_NAME}.zip")
-    print("Deleted old model to start fresh.")
+    # === TRAIN ===
+    # Resuming counts on from the checkpoint, so the exploration schedule continues where it stopped
+    remaining = max(0, args.timesteps - model.num_timesteps)
+    print(f"Starting Training for {remaining} steps...")
+    start = time.perf_counter()
+    model.learn(total_timesteps=remaining, callback=callbacks or None, reset_num_timesteps=not args.resume)
+    elapsed = time.perf_counter() - start
+    print(f"Training Finished in {elapsed:.1f}s ({remaining / elapsed:,.0f} steps/sec).")
+    env.close()
 
-# === INITIALIZE MODEL ===
-# DQN is good for discrete action spaces (our 38 possible actions)
-model = DQN(
-    "MultiInputPolicy",
-    env,
-    verbose=1,
-    learning_rate=1e-4,  # Slow and steady learning
-    buffer_size=50000,  # Remember 50k past experiences
-    exploration_fraction=0.4,  # Explore for first 40% of training
-    exploration_final_eps=0.05  # Always keep 5% randomness
-)
+    model.save(args.model_name)
+    export_policy(model, f"{args.model_name}.npz")
+    print(f"Model Saved (NumPy policy for playback: {args.model_name}.npz).")
 
-# === TRAIN ===
-print(f"Starting Training for {TIMESTEPS} steps...")
-model.learn(total_timesteps=TIMESTEPS)
-print("Training Finished!")
+    if args.workers > 1:
+        merged = merge_monitor_logs(args.log_dir)
+        if merged:
+            print(f"Merged worker logs into {merged}")
 
-model.save(MODEL_NAME)
-print("Model Saved.")
+    plot_results(args.log_dir, monitor)
 
 
 # === GENERATE TRAINING GRAPH ===
-def plot_results(log_folder, title='JazzMate Learning Curve'):
+def plot_results(log_folder, monitor=None):
     """
-    Reads the monitor.csv and creates a learning curve visualization
+    Creates the learning curve visualization from the Monitor logs. A TrainingMonitor
+    that followed the run only reads the episodes it hasn't seen yet.
     """
     try:
-        # Load training data from Monitor logs
-        results = results_plotter.load_results(log_folder)
-        x, y = results_plotter.ts2xy(results, 'timesteps')
-
-        if len(x) > 0:
-            plt.figure(figsize=(12, 6))
-
-            # Raw episode rewards (faded gray)
-            plt.plot(x, y, alpha=0.3, color='gray', label='Episode Reward (Raw)')
-
-            # Moving average to show the trend
-            window = 100
-            if len(y) > window:
-                y_smoothed = np.convolve(y, np.ones(window) / window, mode='valid')
-                x_smoothed = x[len(x) - len(y_smoothed):]
-                plt.plot(x_smoothed, y_smoothed, linewidth=2, color='blue', label=f'Moving Average ({window} eps)')
-
-            plt.xlabel('Timesteps (Notes Played)')
-            plt.ylabel('Reward')
-            plt.title(title)
-            plt.legend()
-            plt.grid(True, linestyle='--', alpha=0.6)
-
-            # Save the graph
-            plt.savefig("training_graph.png")
+        monitor = monitor or TrainingMonitor(log_folder)
+        if monitor.refresh():
+            monitor.plot("training_graph.png")
             print("\n✅ Graph saved as 'training_graph.png'")
-            # plt.show()  # Uncomment if running with a display
+            print(f"✅ Metrics summary saved as '{monitor.summary_path}'")
         else:
             print("⚠️ Not enough data to plot.")
 
@@ -85,4 +450,5 @@ def plot_results(log_folder, title='JazzMate Learning Curve'):
         print(f"❌ Error plotting graph: {e}")
 
 
-plot_results(LOG_DIR)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
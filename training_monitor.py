@@ -0,0 +1,274 @@
+import argparse
+import glob
+import json
+import os
+import time
+from collections import deque
+import matplotlib.pyplot as plt
+import numpy as np
+
+# === MONITOR CONFIGURATION ===
+WINDOW = 100  # Episodes in the rolling statistics and the curve's moving average
+REFRESH_INTERVAL = 30.0  # Seconds between refreshes of the learning curve and summary
+MAX_POINTS = 2000  # Points kept per curve; when full, neighbours are merged pairwise
+PLOT_NAME = "learning_curve.png"
+SUMMARY_NAME = "metrics.json"
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class MonitorTail:
+    """
+    Reads the episodes appended to one Monitor CSV since the last read. A line still
+    being written is left for the next read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.t_start = None  # From the JSON header line
+
+    def read(self):
+        """
+        New (wall-clock time, reward, length) rows, or None if the file got shorter
+        (a resumed run cut it back to its checkpoint)
+        """
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            return None
+        if size == self.offset:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+
+        rows = []
+        for line in data[:end].decode().splitlines():
+            if line.startswith("#"):
+                self.t_start = json.loads(line[1:])["t_start"]
+            elif line and not line.startswith("r,"):  # Skip the column names
+                r, l, t = line.split(",")[:3]
+                rows.append((self.t_start + float(t), float(r), int(l)))
+        return rows
+
+
+class RollingStats:
+    """
+    Statistics of the last `window` episodes. add() is O(1) (ring buffers and running
+    sums); only summary() sorts the window for its percentiles.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.rewards = deque(maxlen=window)
+        self.lengths = deque(maxlen=window)
+        self.times = deque(maxlen=window)
+        self.reward_sum = 0.0
+        self.length_sum = 0
+
+    def __len__(self):
+        return len(self.rewards)
+
+    def add(self, t, reward, length):
+        if len(self.rewards) == self.window:
+            self.reward_sum -= self.rewards[0]
+            self.length_sum -= self.lengths[0]
+        self.rewards.append(reward)
+        self.lengths.append(length)
+        self.times.append(t)
+        self.reward_sum += reward
+        self.length_sum += length
+
+    @property
+    def mean(self):
+        return self.reward_sum / len(self.rewards)
+
+    def summary(self):
+        rewards = np.array(self.rewards)
+        # Rates over the window's time span: every episode but the first finished inside it
+        span = self.times[-1] - self.times[0]
+        return {
+            "episodes": len(rewards),
+            "reward_mean": self.mean,
+            "reward_std": float(rewards.std()),
+            **{f"reward_p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(rewards, PERCENTILES))},
+            "length_mean": self.length_sum / len(rewards),
+            "episodes_per_sec": (len(rewards) - 1) / span if span > 0 else 0.0,
+            "steps_per_sec": (self.length_sum - self.lengths[0]) / span if span > 0 else 0.0
+        }
+
+
+class Curve:
+    """
+    (x, y) points for plotting, at most `max_points` of them: each point averages
+    `bin` consecutive values, and the bin doubles whenever the points fill up.
+    """
+
+    def __init__(self, max_points=MAX_POINTS):
+        self.max_points = max_points - max_points % 2
+        self.x = []
+        self.y = []
+        self.bin = 1
+        self._count = 0
+        self._sum = 0.0
+
+    def add(self, x, y):
+        self._count += 1
+        self._sum += y
+        if self._count < self.bin:
+            return
+        self.x.append(x)
+        self.y.append(self._sum / self.bin)
+        self._count, self._sum = 0, 0.0
+        if len(self.x) == self.max_points:
+            self.x = self.x[1::2]
+            self.y = [(a + b) / 2 for a, b in zip(self.y[::2], self.y[1::2])]
+            self.bin *= 2
+
+
+class TrainingMonitor:
+    """
+    Follows the Monitor logs of a run in `log_dir` (one per worker, plus the logs of
+    resumed runs) while it trains. Every update() only reads the lines appended since
+    the last one, so its cost doesn't grow with the length of the run; refresh() also
+    rewrites the learning curve PNG and a JSON summary.
+    """
+
+    def __init__(self, log_dir, window=WINDOW, plot_path=None, summary_path=None,
+                 title='JazzMate Learning Curve'):
+        self.log_dir = log_dir
+        self.window = window
+        self.plot_path = plot_path or os.path.join(log_dir, PLOT_NAME)
+        self.summary_path = summary_path or os.path.join(log_dir, SUMMARY_NAME)
+        self.title = title
+        self.reset()
+
+    def reset(self):
+        self.tails = {}
+        self.stats = RollingStats(self.window)
+        self.raw = Curve()
+        self.smoothed = Curve()
+        self.episodes = 0
+        self.timesteps = 0
+        self.last_time = None
+        self.best_mean = None
+
+    def update(self):
+        """
+        Adds the episodes logged since the last update and returns how many there were
+        """
+        rows = []
+        for path in sorted(glob.glob(os.path.join(self.log_dir, "*monitor.csv"))):
+            if path not in self.tails:
+                self.tails[path] = MonitorTail(path)
+            tail = self.tails[path]
+            try:
+                new_rows = tail.read()
+            except OSError:
+                continue  # Removed since the glob
+            if new_rows is None:
+                # Episodes already counted were dropped, so count everything again
+                self.reset()
+                return self.update()
+            rows.extend(new_rows)
+
+        # Workers finish episodes in between each other, so merge them by wall-clock time
+        rows.sort()
+        for t, reward, length in rows:
+            self.episodes += 1
+            self.timesteps += length
+            self.last_time = t
+            self.stats.add(t, reward, length)
+            self.raw.add(self.timesteps, reward)
+            if len(self.stats) == self.window:
+                mean = self.stats.mean
+                self.smoothed.add(self.timesteps, mean)
+                if self.best_mean is None or mean > self.best_mean:
+                    self.best_mean = mean
+        return len(rows)
+
+    def summary(self):
+        start = min(tail.t_start for tail in self.tails.values() if tail.t_start is not None)
+        elapsed = self.last_time - start
+        return {
+            "episodes": self.episodes,
+            "timesteps": self.timesteps,
+            "elapsed_sec": elapsed,
+            "episodes_per_sec": self.episodes / elapsed if elapsed > 0 else 0.0,
+            "steps_per_sec": self.timesteps / elapsed if elapsed > 0 else 0.0,
+            "best_mean_reward": self.best_mean,
+            "window": self.stats.summary(),
+            "updated": time.time()
+        }
+
+    def plot(self, path=None):
+        path = path or self.plot_path
+        fig = plt.figure(figsize=(12, 6))
+
+        # Raw episode rewards (faded gray)
+        label = 'Episode Reward (Raw)' if self.raw.bin == 1 else f'Episode Reward (Mean of {self.raw.bin})'
+        plt.plot(self.raw.x, self.raw.y, alpha=0.3, color='gray', label=label)
+
+        # Moving average to show the trend
+        if self.smoothed.x:
+            plt.plot(self.smoothed.x, self.smoothed.y, linewidth=2, color='blue',
+                     label=f'Moving Average ({self.window} eps)')
+
+        plt.xlabel('Timesteps (Notes Played)')
+        plt.ylabel('Reward')
+        plt.title(self.title)
+        plt.legend()
+        plt.grid(True, linestyle='--', alpha=0.6)
+
+        # Replaced in one go, so nothing ever reads a half-written image
+        plt.savefig(f"{path}.tmp", format="png")
+        plt.close(fig)
+        os.replace(f"{path}.tmp", path)
+
+    def write_summary(self, path=None):
+        path = path or self.summary_path
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def refresh(self):
+        """
+        update(), then rewrites the PNG and the JSON summary. Returns False while no episode has finished.
+        """
+        self.update()
+        if not self.episodes:
+            return False
+        self.plot()
+        self.write_summary()
+        return True
+
+
+def print_status(summary):
+    window = summary["window"]
+    print(f"📈 {summary['episodes']:,} episodes / {summary['timesteps']:,} steps | "
+          f"last {window['episodes']}: reward {window['reward_mean']:.1f} "
+          f"(p5 {window['reward_p5']:.1f}, p50 {window['reward_p50']:.1f}, p95 {window['reward_p95']:.1f}) | "
+          f"{window['episodes_per_sec']:.1f} eps/s, {window['steps_per_sec']:,.0f} steps/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Follow a training run's Monitor logs and keep its learning "
+                                                 "curve and metrics summary up to date")
+    parser.add_argument("log_dir", nargs="?", default="training_logs/")
+    parser.add_argument("--interval", type=float, default=REFRESH_INTERVAL, help="Seconds between refreshes")
+    parser.add_argument("--window", type=int, default=WINDOW, help="Episodes in the rolling statistics")
+    parser.add_argument("--once", action="store_true", help="Refresh once and exit")
+    args = parser.parse_args()
+
+    monitor = TrainingMonitor(args.log_dir, args.window)
+    try:
+        while True:
+            if monitor.refresh():
+                print_status(monitor.summary())
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    print(f"✅ Learning curve: {monitor.plot_path}, summary: {monitor.summary_path}")